@@ -1,3 +1,21 @@
-
+import os
 
 format_time = "%Y-%m-%d %H:%M:%S"
+
+# Planning jobs (see jobs.JobQueue): workers of the pool, executor ("process" or "thread"), maximum number of waiting
+# and running jobs in total and per depot
+planning_workers = int(os.environ.get("PLANNING_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+planning_executor = os.environ.get("PLANNING_EXECUTOR", "process")
+planning_max_jobs = int(os.environ.get("PLANNING_MAX_JOBS", 100))
+planning_max_jobs_per_depot = int(os.environ.get("PLANNING_MAX_JOBS_PER_DEPOT", 10))
+
+# Plan cache (see planner.plan_cache): "memory" (in-process), "redis://host:port/db" (shared by the API processes) or
+# "none", time to live of the plans [s] and maximum number of plans of the in-process cache
+plan_cache = os.environ.get("PLAN_CACHE", "memory")
+plan_cache_ttl = float(os.environ.get("PLAN_CACHE_TTL", 3600))
+plan_cache_max_entries = int(os.environ.get("PLAN_CACHE_MAX_ENTRIES", 256))
+
+# Compression of the responses (gzip, if accepted by the client): minimum size of the compressed responses [bytes]
+# and compression level (5 compresses plans almost as well as 9, several times faster)
+gzip_minimum_size = int(os.environ.get("GZIP_MINIMUM_SIZE", 1024))
+gzip_level = int(os.environ.get("GZIP_LEVEL", 5))
@@ -0,0 +1,145 @@
+# encoding.py
+# Encodings of the charging plans of the API: records (default) or columnar, chosen by content negotiation
+import base64
+import importlib.util
+import json
+from typing import Dict, List
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+RECORDS_JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.smartcharging.columnar+json"
+MSGPACK = "application/msgpack"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+# Media types of the plans and the package they require (None: standard library)
+MEDIA_TYPES = {RECORDS_JSON: None, COLUMNAR_JSON: None, MSGPACK: "msgpack", ARROW_STREAM: "pyarrow"}
+POWER_ENCODINGS = ("base64", "list")
+
+
+def compact_plans(power_profiles, **metadata) -> Dict:
+    """
+    Compact form of the charging plans, as computed by the workers, cached and encoded per request (see
+    encode_plans): vehicle ids and a (vehicles, time steps) power array, instead of one dictionary per time step
+
+    :param power_profiles: power profiles of the vehicles [kW], (time steps, vehicles) array or records
+    :param metadata: other fields of the plans (creation_date, algorithm)
+    :return: metadata, vehicle_ids and power (vehicles, time steps) array [kW]
+    """
+
+    profiles = pd.DataFrame(power_profiles)
+    return {**metadata, "vehicle_ids": profiles.columns.tolist(), "power": profiles.to_numpy(dtype=float).T}
+
+
+def records_plans(plans: Dict) -> Dict:
+    """
+    :param plans: compact plans (see compact_plans)
+    :return: plans of ChargingPlanData: one record per time step, with the power of each vehicle
+    """
+
+    records = [dict(zip(plans["vehicle_ids"], row)) for row in plans["power"].T.tolist()]
+    return {k: v for k, v in plans.items() if k not in ("vehicle_ids", "power")} | {"plans": records}
+
+
+def columnar_plans(plans: Dict, power_encoding: str = "base64") -> Dict:
+    """
+    Columnar plans: vehicle ids, time index and the power of all vehicles as one flat float32 array, vehicle after
+    vehicle (power[v * len(time_index) + t] is the power of vehicle v at time step t)
+
+    :param plans: compact plans (see compact_plans)
+    :param power_encoding: "base64" (base64 string of the little-endian float32 buffer) or "list"
+    :return: columnar plans, JSON serializable
+    """
+
+    assert power_encoding in POWER_ENCODINGS, f"Invalid power encoding {power_encoding}, must be in {POWER_ENCODINGS}"
+    power = np.ascontiguousarray(plans["power"], dtype="<f4")
+    return {k: v for k, v in plans.items() if k not in ("vehicle_ids", "power")} | {
+        "vehicle_ids": plans["vehicle_ids"],
+        "time_index": list(range(power.shape[1])),
+        "dtype": "float32",
+        "power_encoding": power_encoding,
+        "power": base64.b64encode(power.tobytes()).decode() if power_encoding == "base64" else power.ravel().tolist(),
+    }
+
+
+def _dumps(content) -> bytes:
+    # Fast JSON (orjson) if installed
+    try:
+        import orjson
+    except ImportError:
+        return json.dumps(content, separators=(",", ":")).encode()
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _arrow_stream(plans: Dict) -> bytes:
+    import pyarrow as pa
+
+    power = np.asarray(plans["power"], dtype=np.float32)
+    columns = {"time_index": pa.array(np.arange(power.shape[1], dtype=np.int32))}
+    columns.update({str(vehicle_id): pa.array(power[v]) for v, vehicle_id in enumerate(plans["vehicle_ids"])})
+    metadata = {k: str(v) for k, v in plans.items() if k not in ("vehicle_ids", "power")}
+    table = pa.table(columns).replace_schema_metadata(metadata)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def negotiate(accept: str | None) -> str:
+    """
+    Media type of the plans from the Accept header of a request: the acceptable media type of highest quality
+    whose package is installed, records JSON for */* or no header
+
+    :param accept: Accept header
+    :return: media type (see MEDIA_TYPES), HTTP 406 if none is acceptable
+    """
+
+    ranges: List[tuple[float, int, str]] = []
+    for position, item in enumerate((accept or "*/*").split(",")):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        quality = next((float(p[2:]) for p in params if p.startswith("q=")), 1.)
+        if quality > 0:
+            ranges.append((-quality, position, media_type.lower()))
+
+    for _, _, media_type in sorted(ranges):
+        if media_type in ("*/*", "application/*"):
+            return RECORDS_JSON
+        package = MEDIA_TYPES.get(media_type, "")
+        if package is None or (package and importlib.util.find_spec(package) is not None):
+            return media_type
+
+    raise HTTPException(status_code=406, detail=f"Plans are available as {', '.join(available_media_types())}")
+
+
+def available_media_types() -> List[str]:
+    return [t for t, package in MEDIA_TYPES.items() if package is None or importlib.util.find_spec(package)]
+
+
+def encode_plans(plans: Dict, media_type: str, power_encoding: str = "base64") -> Response:
+    """
+    Response of charging plans
+
+    :param plans: compact plans (see compact_plans)
+    :param media_type: media type (see negotiate)
+    :param power_encoding: encoding of the power of the columnar JSON (see columnar_plans)
+    :return: response
+    """
+
+    if media_type == RECORDS_JSON:
+        content = _dumps(records_plans(plans))
+    elif media_type == COLUMNAR_JSON:
+        content = _dumps(columnar_plans(plans, power_encoding))
+    elif media_type == MSGPACK:
+        import msgpack
+
+        columnar = columnar_plans(plans, "base64")
+        columnar["power"] = np.ascontiguousarray(plans["power"], dtype="<f4").tobytes()
+        columnar["power_encoding"] = "bytes"
+        content = msgpack.packb(columnar, use_bin_type=True)
+    else:
+        content = _arrow_stream(plans)
+
+    return Response(content=content, media_type=media_type, headers={"Vary": "Accept"})
@@ -0,0 +1,289 @@
+# jobs.py
+# Planning jobs of the API: a bounded queue of jobs, dispatched fairly between depots to a pool of workers
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict
+from core.utility.logger.custom_loggers import setup_logger
+
+logger = setup_logger(__name__)
+
+JOB_STATUSES = ("queued", "running", "done", "failed", "cancelled")
+
+
+class QueueFull(Exception):
+    """
+    The queue (or the share of the queue of a depot) is full, the job is rejected
+    """
+
+
+class JobCancelled(Exception):
+    """
+    The job was cancelled before its result was available
+    """
+
+
+class JobQueue:
+    """
+    Queue of planning jobs executed by a pool of workers (processes by default, so that the solves do not block the
+    event loop of the API and run in parallel). Jobs wait in one queue per depot and are dispatched to the pool in
+    round-robin between depots, at most max_workers at a time: a depot submitting many jobs delays its own jobs,
+    not the jobs of the other depots. The number of waiting and running jobs is bounded, in total and per depot.
+    Identical jobs (same key) are coalesced: while a job is waiting or running, a job submitted with the same key
+    attaches to it and gets its result, without a new solve (single flight). The pool is created at the first job.
+    """
+
+    def __init__(
+            self, max_workers: int = 2, executor: str = "process", max_jobs: int = 100, max_jobs_per_depot: int = 10,
+            max_finished: int = 1000
+    ):
+        """
+        :param max_workers: number of workers of the pool, i.e. of jobs running at the same time
+        :param executor: "process" (process pool) or "thread" (thread pool, for planners that release the GIL or
+            for tests)
+        :param max_jobs: maximum number of waiting and running jobs
+        :param max_jobs_per_depot: maximum number of waiting and running jobs of a depot
+        :param max_finished: number of finished jobs kept for polling (the oldest are forgotten first)
+        """
+
+        assert executor in ("process", "thread"), f"Invalid executor {executor}, must be process or thread"
+        self.max_workers = max_workers
+        self.executor_type = executor
+        self.max_jobs = max_jobs
+        self.max_jobs_per_depot = max_jobs_per_depot
+
+        self.jobs: Dict[str, Dict] = {}
+        self._queues: OrderedDict[str, deque] = OrderedDict()      # Waiting job ids of each depot, in dispatch order
+        self._active: Dict[str, int] = {}                            # Waiting and running jobs of each depot
+        self._running = 0
+        self._inflight: Dict[str, str] = {}         # Key -> id of the waiting or running job of this key
+        self.coalesced = 0                           # Submissions attached to a job in flight
+        self._finished = deque(maxlen=max_finished)
+        self._executor: Executor | None = None
+        # Reentrant: the callback of a job finished before add_done_callback runs in the dispatching thread
+        self._lock = threading.RLock()
+
+    def _pool(self) -> Executor:
+        if self._executor is None:
+            pool = ProcessPoolExecutor if self.executor_type == "process" else ThreadPoolExecutor
+            self._executor = pool(max_workers=self.max_workers)
+        return self._executor
+
+    def submit(self, function: Callable, depot: str = "default", key: str = None, **kwargs) -> Dict:
+        """
+        Queue a job, or attach to the job in flight with the same key
+
+        :param function: function executed by a worker (picklable for a process pool)
+        :param depot: depot (or client) of the job, the unit of fairness and of the per-depot limit
+        :param key: key of the job (e.g. hash of the request, see planner.plan_cache.plan_key), jobs of same key have
+            the same result. No coalescing if None.
+        :param kwargs: arguments of the function
+        :return: job (see status)
+        """
+
+        with self._lock:
+            if key in self._inflight:
+                job = self.jobs[self._inflight[key]]
+                job["waiters"] += 1
+                self.coalesced += 1
+                logger.info(f"Job of depot {depot} coalesced with job {job['job_id']}")
+                return self.status(job["job_id"])
+
+            if sum(self._active.values()) >= self.max_jobs:
+                raise QueueFull(f"Planning queue full ({self.max_jobs} jobs)")
+            if self._active.get(depot, 0) >= self.max_jobs_per_depot:
+                raise QueueFull(f"Planning queue full for depot {depot} ({self.max_jobs_per_depot} jobs)")
+
+            job = {
+                "job_id": uuid.uuid4().hex, "depot": depot, "status": "queued", "created": time.time(),
+                "started": None, "finished": None, "error": None, "result": None,
+                "function": function, "kwargs": kwargs, "future": Future(), "worker_future": None,
+                "key": key, "waiters": 1,
+            }
+            self.jobs[job["job_id"]] = job
+            if key is not None:
+                self._inflight[key] = job["job_id"]
+            self._queues.setdefault(depot, deque()).append(job["job_id"])
+            self._active[depot] = self._active.get(depot, 0) + 1
+            self._dispatch()
+
+        logger.info(f"Job {job['job_id']} of depot {depot} queued")
+        return self.status(job["job_id"])
+
+    def add_done(self, result, depot: str = "default") -> Dict:
+        """
+        Record a job whose result is already known (e.g. plans served from a cache), polled like the other jobs. It
+        does not use a worker and does not count in the queue.
+
+        :param result: result of the job
+        :param depot: depot of the job
+        :return: job (see status)
+        """
+
+        with self._lock:
+            now = time.time()
+            job = {
+                "job_id": uuid.uuid4().hex, "depot": depot, "status": "done", "created": now, "started": now,
+                "finished": now, "error": None, "result": result, "future": Future(), "worker_future": None,
+            }
+            job["future"].set_result(result)
+            self.jobs[job["job_id"]] = job
+            self._keep(job)
+
+        return self.status(job["job_id"])
+
+    def _dispatch(self) -> None:
+        # Start waiting jobs while workers are free, one depot after the other (called with the lock held)
+        while self._running < self.max_workers and self._queues:
+            depot, job_ids = self._queues.popitem(last=False)
+            job = self.jobs[job_ids.popleft()]
+            if job_ids:
+                self._queues[depot] = job_ids
+
+            job["status"], job["started"] = "running", time.time()
+            try:
+                worker_future = self._pool().submit(job["function"], **job["kwargs"])
+            except Exception as error:
+                # Broken pool (a worker process died): the job fails, the pool is shut down (its management thread
+                # and surviving workers) and created again for the next job
+                logger.error(f"Job {job['job_id']} not started: {error!r}")
+                self.shutdown(wait=False)
+                self._release(job)
+                job["status"], job["error"], job["finished"] = "failed", repr(error), time.time()
+                job["future"].set_exception(error)
+                continue
+
+            self._running += 1
+            job.pop("kwargs")
+            job["worker_future"] = worker_future
+            worker_future.add_done_callback(lambda future, job_id=job["job_id"]: self._finish(job_id, future))
+
+    def _finish(self, job_id: str, future: Future) -> None:
+        with self._lock:
+            job = self.jobs[job_id]
+            self._running -= 1
+            self._release(job)
+            job["finished"] = time.time()
+
+            if job["status"] == "cancelled":
+                pass
+            elif future.cancelled():
+                self._cancelled(job)
+            elif future.exception() is not None:
+                job["status"], job["error"] = "failed", repr(future.exception())
+                job["future"].set_exception(future.exception())
+                logger.error(f"Job {job_id} failed: {job['error']}")
+            else:
+                job["status"], job["result"] = "done", future.result()
+                job["future"].set_result(job["result"])
+            self._dispatch()
+
+    def _release(self, job: Dict) -> None:
+        # The job no longer counts in the queue, it is kept for polling (called with the lock held)
+        self._active[job["depot"]] -= 1
+        if self._active[job["depot"]] == 0:
+            del self._active[job["depot"]]
+        job.pop("function", None)
+        job.pop("kwargs", None)
+        self._land(job)
+        self._keep(job)
+
+    def _land(self, job: Dict) -> None:
+        # The job is no longer in flight, later jobs of its key start a new solve (called with the lock held)
+        if job.get("key") is not None and self._inflight.get(job["key"]) == job["job_id"]:
+            del self._inflight[job["key"]]
+
+    def _keep(self, job: Dict) -> None:
+        # Keep a finished job for polling, forgetting the oldest one (called with the lock held)
+        if len(self._finished) == self._finished.maxlen:
+            self.jobs.pop(self._finished.popleft(), None)
+        self._finished.append(job["job_id"])
+
+    def _cancelled(self, job: Dict) -> None:
+        self._land(job)
+        job["status"] = "cancelled"
+        job["future"].set_exception(JobCancelled(f"Job {job['job_id']} cancelled"))
+        logger.info(f"Job {job['job_id']} cancelled")
+
+    def cancel(self, job_id: str) -> Dict:
+        """
+        Cancel a job, for all its submitters (see submit). A waiting job is removed from the queue. A running job
+        cannot be interrupted: its result is discarded, and its worker is free when the solve ends (bounded by the
+        time limit of the solver).
+
+        :param job_id: job id
+        :return: job (see status)
+        """
+
+        with self._lock:
+            job = self.jobs[job_id]
+            if job["status"] == "queued":
+                self._queues[job["depot"]].remove(job_id)
+                if not self._queues[job["depot"]]:
+                    del self._queues[job["depot"]]
+                self._release(job)
+                job["finished"] = time.time()
+            if job["status"] in ("queued", "running"):
+                self._cancelled(job)
+
+            return self.status(job_id)
+
+    def status(self, job_id: str) -> Dict:
+        """
+        Status of a job
+
+        :param job_id: job id
+        :return: job id, depot, status (see JOB_STATUSES), creation, start and end times [s since epoch], error
+            and result of the function (if done)
+        """
+
+        with self._lock:
+            job = self.jobs[job_id]
+            return {
+                k: job[k] for k in ("job_id", "depot", "status", "created", "started", "finished", "error", "result")
+            }
+
+    def stats(self) -> Dict:
+        """
+        :return: number of waiting jobs, of running jobs, of active (waiting or running) jobs of each depot and of
+            coalesced submissions (see submit)
+        """
+
+        with self._lock:
+            return {
+                "queued": sum(len(job_ids) for job_ids in self._queues.values()), "running": self._running,
+                "depots": dict(self._active), "coalesced": self.coalesced,
+            }
+
+    async def run(self, function: Callable, depot: str = "default", key: str = None, **kwargs):
+        """
+        Queue a job (or attach to the job in flight with the same key) and wait for its result without blocking the
+        event loop. The job is cancelled if all the callers waiting for it are cancelled (e.g. the clients
+        disconnect).
+
+        :param function: function executed by a worker
+        :param depot: depot of the job
+        :param key: key of the job (see submit)
+        :param kwargs: arguments of the function
+        :return: result of the function (JobCancelled is raised if the job is cancelled)
+        """
+
+        job_id = self.submit(function, depot=depot, key=key, **kwargs)["job_id"]
+        job = self.jobs[job_id]
+        try:
+            # Shielded: the future of the job is shared by its callers, cancelling one caller must not cancel it
+            return await asyncio.shield(asyncio.wrap_future(job["future"]))
+        except asyncio.CancelledError:
+            with self._lock:
+                job["waiters"] -= 1
+                if job["waiters"] == 0:
+                    self.cancel(job_id)
+            raise
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
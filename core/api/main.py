@@ -1,6 +1,9 @@
+from contextlib import asynccontextmanager
 from typing import Dict
 import uvicorn
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from core.api import config
 from core.api.routers import cpo
 
 description = """
@@ -9,9 +12,18 @@ First API endpoints for day-ahead planning. 🚀
 * **Author**: Van-Lap NGO
 """
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    cpo.job_queue.shutdown(wait=False)
+
+
 app = FastAPI(
-    title='SmartChargingAPI', description=description, version='0.1', docs_url='/docs', redoc_url='/redocs'
+    title='SmartChargingAPI', description=description, version='0.1', docs_url='/docs', redoc_url='/redocs',
+    lifespan=lifespan
 )
+app.add_middleware(GZipMiddleware, minimum_size=config.gzip_minimum_size, compresslevel=config.gzip_level)
 app.include_router(cpo.router, tags=["cpo"])
 
 
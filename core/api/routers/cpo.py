@@ -1,16 +1,36 @@
+import asyncio
+from concurrent.futures import Future
 from datetime import datetime
-from typing import Literal
+from typing import Dict, List, Literal, Set
 import pandas as pd
-from fastapi import HTTPException, APIRouter
+from fastapi import HTTPException, APIRouter, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+from core.api import config
 from core.api.config import format_time
+from core.api.encoding import MEDIA_TYPES, compact_plans, encode_plans, negotiate, records_plans
+from core.api.jobs import JobCancelled, JobQueue, QueueFull
 from core.planner.day_ahead_planner import create_charging_plans
-import cvxpy as cp
-from core.schemas.cpo import DemandData, ChargingPlanData, PlanningParameters
+from core.planner.plan_cache import plan_cache_from_url, plan_key
+from core.planner.solver_selection import DEFAULT_SOLVER_OPTIONS
+from core.schemas.cpo import DemandData, ChargingPlanData, PlanningJob, PlanningJobRequest, PlanningParameters
 from core.utility.data.data_processor import generate_demand_data, prepare_planning_data
 
 
 router = APIRouter(prefix="/cpo", tags=["cpo"])
 
+# Planning requests are solved by a pool of workers, so that a long solve does not block the event loop
+job_queue = JobQueue(
+    max_workers=config.planning_workers, executor=config.planning_executor, max_jobs=config.planning_max_jobs,
+    max_jobs_per_depot=config.planning_max_jobs_per_depot
+)
+# Plans of identical requests are served from the cache, without queueing a job. The cache is accessed in threads,
+# and the tasks caching the plans of the jobs are kept until they end
+plan_cache = plan_cache_from_url(
+    config.plan_cache, ttl=config.plan_cache_ttl, max_entries=config.plan_cache_max_entries
+)
+cache_tasks: Set[asyncio.Task] = set()
+
 
 @router.get("/predict-charging-demand/{source}")
 async def predict_charging_demand(
@@ -31,37 +51,169 @@ async def predict_charging_demand(
         return DemandData(creation_date=created_at, source="from_file", demand=[])
 
 
-@router.post("/charging-plan/{algorithm}", )
+def plan_charging(algorithm: str, demand: List[Dict], planning_params: Dict) -> Dict:
+    """
+    Charging plans of a planning request, computed by a worker of the job queue
+
+    :param algorithm: "milp" or "lp"
+    :param demand: demand records (see DemandData)
+    :param planning_params: planning parameters (see PlanningParameters)
+    :return: compact charging plans (see encoding.compact_plans), encoded per request
+    """
+
+    _, powerVehicles, _ = create_charging_plans(
+        data_demand=pd.DataFrame.from_records(demand),
+        horizon_length=planning_params["horizon_length"],
+        time_step=planning_params["time_step"],
+        nbr_vehicle=planning_params["nbr_vehicles"],
+        capacity_grid=planning_params["pmax_infrastructure"],
+        n_sols=0,
+        formulation=algorithm,
+        backend="auto",
+        solver_options=DEFAULT_SOLVER_OPTIONS
+    )
+
+    return compact_plans(powerVehicles, creation_date=datetime.now().strftime(format_time), algorithm=algorithm)
+
+
+def planning_request_key(algorithm: str, demand: List[Dict], planning_params: Dict) -> str:
+    """
+    Key of a planning request in the plan cache: everything plan_charging depends on
+
+    :param algorithm: "milp" or "lp"
+    :param demand: demand records (see DemandData)
+    :param planning_params: planning parameters (see PlanningParameters)
+    :return: key (see plan_cache.plan_key)
+    """
+
+    return plan_key(
+        formulation=algorithm, demand=demand, planning_params=planning_params, backend="auto",
+        solver_options=DEFAULT_SOLVER_OPTIONS
+    )
+
+
+async def cached_plans(key: str) -> Dict | None:
+    # Plans of the cache, read in a thread: a slow or unreachable cache server does not block the event loop
+    return None if plan_cache is None else await run_in_threadpool(plan_cache.get, key)
+
+
+async def cache_plans(key: str, plans: Dict) -> None:
+    if plan_cache is not None:
+        await run_in_threadpool(plan_cache.set, key, plans)
+
+
+async def cache_job_plans(key: str, future: Future) -> None:
+    # Task caching the plans of a job when it succeeds (shielded: the job is not cancelled with the task)
+    try:
+        plans = await asyncio.shield(asyncio.wrap_future(future))
+    except Exception:
+        return
+    await cache_plans(key, plans)
+
+
+def planning_job(job: Dict) -> PlanningJob:
+    return PlanningJob(**job | {"result": records_plans(job["result"]) if job["result"] is not None else None})
+
+
+# Media types of the plans, chosen with the Accept header (see encoding.negotiate)
+plans_responses = {200: {"content": {media_type: {} for media_type in MEDIA_TYPES}}, 406: {}}
+
+
+@router.post("/charging-plan/{algorithm}", response_model=ChargingPlanData, responses=plans_responses)
 async def get_charging_plans(
+        request: Request,
         algorithm: Literal["milp", "lp"],
         demand: DemandData,
-        planning_params: PlanningParameters
-) -> ChargingPlanData:
-
-    demand_df = pd.DataFrame.from_records(demand.demand)
-
-    if algorithm == "milp" or "lp":
-
-        _, powerVehicles, _ = create_charging_plans(
-            data_demand=demand_df,
-            horizon_length=planning_params.horizon_length,
-            time_step=planning_params.time_step,
-            nbr_vehicle=planning_params.nbr_vehicles,
-            capacity_grid=planning_params.pmax_infrastructure,
-            n_sols=0,
-            formulation=algorithm,
-            solver_options={
-                "solver": cp.SCIPY if algorithm == "milp" else cp.CLARABEL,
-                "time_limit": 60.0, "verbose": False, "warm_start": False
-            }
+        planning_params: PlanningParameters,
+        depot: str = "default",
+        power_encoding: Literal["base64", "list"] = "base64"
+) -> Response:
+    """
+    Charging plans, served from the plan cache or computed by the job queue: the event loop is free during the solve.
+    Identical requests received during the solve wait for the same job (see jobs.JobQueue.submit). The plans are
+    records (application/json) or columnar, as requested by the Accept header (see encoding.encode_plans).
+    """
+
+    media_type = negotiate(request.headers.get("accept"))
+    key = planning_request_key(algorithm, demand.demand, planning_params.model_dump())
+    charging_plans = await cached_plans(key)
+    if charging_plans is not None:
+        return encode_plans(charging_plans, media_type, power_encoding)
+
+    try:
+        charging_plans = await job_queue.run(
+            plan_charging, depot=depot, key=key, algorithm=algorithm, demand=demand.demand,
+            planning_params=planning_params.model_dump()
         )
+    except QueueFull as error:
+        raise HTTPException(status_code=429, detail=str(error))
+    except JobCancelled as error:
+        raise HTTPException(status_code=409, detail=str(error))
 
-    else:
-        raise HTTPException(status_code=500, detail=f"Invalid algorithm {algorithm}, must be milp or lp")
+    await cache_plans(key, charging_plans)
+    return encode_plans(charging_plans, media_type, power_encoding)
 
-    charging_plans = ChargingPlanData(
-        creation_date=datetime.now().strftime(format_time),
-        algorithm=algorithm,
-        plans=pd.DataFrame(powerVehicles).to_dict("records")
-    )
-    return charging_plans
+
+@router.post("/jobs", status_code=202)
+async def submit_planning_job(request: PlanningJobRequest) -> PlanningJob:
+    """
+    Queue a planning job, its plans are polled with GET /cpo/jobs/{job_id}. If the plans of the request are cached,
+    the job is done at once.
+    """
+
+    planning_params = request.planning_params.model_dump()
+    key = planning_request_key(request.algorithm, request.demand.demand, planning_params)
+    charging_plans = await cached_plans(key)
+    if charging_plans is not None:
+        return planning_job(job_queue.add_done(charging_plans, depot=request.depot))
+
+    try:
+        job = job_queue.submit(
+            plan_charging, depot=request.depot, key=key, algorithm=request.algorithm, demand=request.demand.demand,
+            planning_params=planning_params
+        )
+    except QueueFull as error:
+        raise HTTPException(status_code=429, detail=str(error))
+
+    task = asyncio.create_task(cache_job_plans(key, job_queue.jobs[job["job_id"]]["future"]))
+    cache_tasks.add(task)
+    task.add_done_callback(cache_tasks.discard)
+    return planning_job(job)
+
+
+@router.get("/jobs")
+async def planning_queue_stats() -> Dict:
+    return job_queue.stats()
+
+
+@router.get("/jobs/{job_id}")
+async def get_planning_job(job_id: str) -> PlanningJob:
+
+    if job_id not in job_queue.jobs:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return planning_job(job_queue.status(job_id))
+
+
+@router.get("/jobs/{job_id}/plans", response_model=ChargingPlanData, responses=plans_responses)
+async def get_planning_job_plans(
+        request: Request, job_id: str, power_encoding: Literal["base64", "list"] = "base64"
+) -> Response:
+    """
+    Charging plans of a done job, records or columnar as requested by the Accept header (see get_charging_plans)
+    """
+
+    if job_id not in job_queue.jobs:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    media_type = negotiate(request.headers.get("accept"))
+    job = job_queue.status(job_id)
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job {job_id} {job['status']}")
+    return encode_plans(job["result"], media_type, power_encoding)
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_planning_job(job_id: str) -> PlanningJob:
+
+    if job_id not in job_queue.jobs:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return planning_job(job_queue.cancel(job_id))
@@ -0,0 +1,20 @@
+import pytest
+from core.api.jobs import JobQueue
+from core.planner.plan_cache import MemoryCache
+
+
+@pytest.fixture(autouse=True)
+def job_queue(monkeypatch) -> JobQueue:
+    # Thread workers: the planners patched by the tests are the ones called by the jobs
+    queue = JobQueue(max_workers=2, executor="thread", max_jobs=4, max_jobs_per_depot=2)
+    monkeypatch.setattr("core.api.routers.cpo.job_queue", queue)
+    yield queue
+    queue.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def plan_cache(monkeypatch) -> MemoryCache:
+    # Empty cache for each test: the plans of the planners patched by a test are not served to the others
+    cache = MemoryCache()
+    monkeypatch.setattr("core.api.routers.cpo.plan_cache", cache)
+    return cache
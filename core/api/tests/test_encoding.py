@@ -0,0 +1,83 @@
+import base64
+import json
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from core.api.encoding import ARROW_STREAM, COLUMNAR_JSON, MSGPACK, RECORDS_JSON, compact_plans, encode_plans, \
+    negotiate, records_plans
+from core.api.main import app
+
+client = TestClient(app)
+
+planning_request = {
+    "demand": {"demand": [{"vehicle_id": 1, "demand": 10}]},
+    "planning_params": {"horizon_length": 3, "time_step": 1, "nbr_vehicles": 2, "pmax_infrastructure": 100},
+}
+
+
+@pytest.fixture
+def plans() -> dict:
+    # Power profiles of 2 vehicles over 3 time steps, (time steps, vehicles) as returned by the planners
+    return compact_plans(np.array([[0., 7.], [11., 7.], [11., 3.5]]), creation_date="2025-01-01", algorithm="lp")
+
+
+def test_negotiate(monkeypatch):
+
+    assert negotiate(None) == negotiate("*/*") == negotiate("text/html, */*;q=0.8") == RECORDS_JSON
+    assert negotiate(f"{RECORDS_JSON};q=0.5, {COLUMNAR_JSON}") == COLUMNAR_JSON
+
+    # Media types whose package is not installed are skipped
+    monkeypatch.setattr("core.api.encoding.importlib.util.find_spec", lambda name: None)
+    assert negotiate(f"{MSGPACK}, {COLUMNAR_JSON};q=0.9") == COLUMNAR_JSON
+    with pytest.raises(HTTPException) as error:
+        negotiate(f"{ARROW_STREAM}, text/csv")
+    assert error.value.status_code == 406
+
+
+def test_columnar_plans(plans):
+
+    assert records_plans(plans)["plans"] == [{0: 0., 1: 7.}, {0: 11., 1: 7.}, {0: 11., 1: 3.5}]
+
+    columnar = json.loads(encode_plans(plans, COLUMNAR_JSON).body)
+    power = np.frombuffer(base64.b64decode(columnar["power"]), dtype="<f4").reshape(2, 3)
+    assert columnar["vehicle_ids"] == [0, 1] and columnar["time_index"] == [0, 1, 2]
+    np.testing.assert_array_equal(power, plans["power"])
+
+
+def test_msgpack_plans(plans):
+
+    msgpack = pytest.importorskip("msgpack")
+    content = msgpack.unpackb(encode_plans(plans, MSGPACK).body)
+
+    np.testing.assert_array_equal(np.frombuffer(content["power"], dtype="<f4").reshape(2, 3), plans["power"])
+
+
+def test_arrow_plans(plans):
+
+    pa = pytest.importorskip("pyarrow")
+    table = pa.ipc.open_stream(encode_plans(plans, ARROW_STREAM).body).read_all()
+
+    assert table.column_names == ["time_index", "0", "1"]
+    np.testing.assert_array_equal(table.column("1").to_numpy(), plans["power"][1])
+
+
+def test_charging_plans_endpoint_formats(monkeypatch):
+
+    power = np.tile([0., 7., 11., 22.], (2000, 24)).T     # 96 time steps, 2000 vehicles
+    monkeypatch.setattr("core.api.routers.cpo.create_charging_plans", lambda **kwargs: (None, power, None))
+
+    records = client.post("/cpo/charging-plan/lp", json=planning_request)
+    assert records.headers["content-type"] == RECORDS_JSON and len(records.json()["plans"]) == 96
+
+    # Served from the plan cache, in the other format
+    columnar = client.post(
+        "/cpo/charging-plan/lp", json=planning_request, params={"power_encoding": "list"},
+        headers={"Accept": COLUMNAR_JSON, "Accept-Encoding": "gzip"}
+    )
+    assert columnar.headers["content-type"] == COLUMNAR_JSON and columnar.headers["content-encoding"] == "gzip"
+    assert int(columnar.headers["content-length"]) < len(records.content) / 50
+    np.testing.assert_array_equal(np.reshape(columnar.json()["power"], (2000, 96)), power.T)
+
+    response = client.post("/cpo/charging-plan/lp", json=planning_request, headers={"Accept": "text/csv"})
+    assert response.status_code == 406
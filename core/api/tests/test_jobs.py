@@ -0,0 +1,238 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+from fastapi.testclient import TestClient
+from core.api.jobs import JobCancelled, JobQueue, QueueFull
+from core.api.main import app
+from core.planner.plan_cache import MemoryCache
+
+client = TestClient(app)
+
+planning_request = {
+    "algorithm": "lp",
+    "depot": "depot-a",
+    "demand": {"demand": [{"vehicle_id": 1, "demand": 10}]},
+    "planning_params": {"horizon_length": 1, "time_step": 1, "nbr_vehicles": 1, "pmax_infrastructure": 100},
+}
+
+
+def wait_for(queue: JobQueue, job_id: str, status: str, timeout: float = 5.) -> dict:
+
+    deadline = time.time() + timeout
+    while queue.status(job_id)["status"] != status and time.time() < deadline:
+        time.sleep(0.01)
+    return queue.status(job_id)
+
+
+def test_jobs_dispatched_round_robin_between_depots():
+
+    queue = JobQueue(max_workers=1, executor="thread", max_jobs=10, max_jobs_per_depot=10)
+    release = threading.Event()
+    started = []
+
+    def job(name):
+        started.append(name)
+        release.wait(5)
+        return name
+
+    job_ids = [queue.submit(job, depot=depot, name=name)["job_id"] for depot, name in (
+        ("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1")
+    )]
+    release.set()
+    for job_id in job_ids:
+        wait_for(queue, job_id, "done")
+    queue.shutdown()
+
+    # The job of depot b does not wait for all the jobs of depot a
+    assert started == ["a1", "a2", "b1", "a3"]
+
+
+def test_queue_limits_and_cancellation():
+
+    queue = JobQueue(max_workers=1, executor="thread", max_jobs=3, max_jobs_per_depot=2)
+    release = threading.Event()
+
+    running = queue.submit(release.wait, depot="a", timeout=5)["job_id"]
+    queued = queue.submit(release.wait, depot="a", timeout=5)["job_id"]
+    with pytest.raises(QueueFull):
+        queue.submit(release.wait, depot="a", timeout=5)
+
+    assert queue.cancel(queued)["status"] == "cancelled"
+    assert queue.stats() == {"queued": 0, "running": 1, "depots": {"a": 1}, "coalesced": 0}
+    with pytest.raises(JobCancelled):
+        queue.jobs[queued]["future"].result()
+
+    release.set()
+    assert wait_for(queue, running, "done")["result"] is True
+    queue.shutdown()
+
+
+def test_process_pool_job():
+
+    queue = JobQueue(max_workers=1, executor="process")
+    result = asyncio.run(queue.run(pow, base=2, exp=10))
+    queue.shutdown()
+
+    assert result == 1024
+
+
+def test_broken_pool_shut_down():
+
+    class BrokenPool:
+        shutdowns = []
+
+        def submit(self, function, **kwargs):
+            raise BrokenProcessPool("A worker process died")
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            self.shutdowns.append((wait, cancel_futures))
+
+    queue = JobQueue(max_workers=1, executor="thread")
+    queue._executor = broken = BrokenPool()
+    job = queue.submit(pow, base=2, exp=10)
+
+    # The job fails, the broken pool is shut down without waiting and a new pool runs the next job
+    assert job["status"] == "failed" and broken.shutdowns == [(False, True)]
+    assert asyncio.run(queue.run(pow, base=2, exp=10)) == 1024
+    queue.shutdown()
+
+
+def test_planning_job_endpoints(job_queue, monkeypatch):
+
+    release = threading.Event()
+
+    def fake_create_charging_plans(**kwargs):
+        release.wait(5)
+        return None, [{"vehicle_id": 1, "power": 5}], None
+
+    monkeypatch.setattr("core.api.routers.cpo.create_charging_plans", fake_create_charging_plans)
+
+    response = client.post("/cpo/jobs", json=planning_request)
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    # The event loop is free while the job is running
+    assert client.get("/").status_code == 200
+    assert client.get(f"/cpo/jobs/{job_id}").json()["status"] == "running"
+
+    release.set()
+    wait_for(job_queue, job_id, "done")
+    job = client.get(f"/cpo/jobs/{job_id}").json()
+    assert job["depot"] == "depot-a"
+    assert job["result"]["plans"] == [{"vehicle_id": 1, "power": 5}]
+
+    assert client.get("/cpo/jobs/unknown").status_code == 404
+    assert client.delete("/cpo/jobs/unknown").status_code == 404
+
+
+def test_planning_jobs_rejected_when_depot_queue_full(job_queue, monkeypatch):
+
+    release = threading.Event()
+    monkeypatch.setattr(
+        "core.api.routers.cpo.create_charging_plans", lambda **kwargs: (release.wait(5), [], None)
+    )
+
+    # Different requests (identical ones are coalesced)
+    requests = [{**planning_request, "demand": {"demand": [{"vehicle_id": i, "demand": 10}]}} for i in range(4)]
+    job_ids = [client.post("/cpo/jobs", json=request).json()["job_id"] for request in requests[:2]]
+    assert client.post("/cpo/jobs", json=requests[2]).status_code == 429
+    assert client.post("/cpo/jobs", json={**requests[3], "depot": "depot-b"}).status_code == 202
+
+    assert client.delete(f"/cpo/jobs/{job_ids[1]}").json()["status"] == "cancelled"
+    release.set()
+
+
+def test_plans_served_from_cache(plan_cache, monkeypatch):
+
+    calls = []
+
+    def fake_create_charging_plans(**kwargs):
+        calls.append(kwargs)
+        return None, [{"vehicle_id": 1, "power": 5}], None
+
+    monkeypatch.setattr("core.api.routers.cpo.create_charging_plans", fake_create_charging_plans)
+    body = {k: planning_request[k] for k in ("demand", "planning_params")}
+
+    plans = client.post("/cpo/charging-plan/lp", json=body).json()
+    start = time.perf_counter()
+    assert client.post("/cpo/charging-plan/lp", json=body).json() == plans
+    assert time.perf_counter() - start < 0.05
+
+    # The job of the same request is done at once, a different request is planned
+    job = client.post("/cpo/jobs", json=planning_request).json()
+    assert job["status"] == "done" and job["result"]["plans"] == plans["plans"]
+    assert client.post("/cpo/charging-plan/milp", json=body).status_code == 200
+    assert len(calls) == 2 and plan_cache.hits == 2
+
+
+def test_identical_requests_coalesced(job_queue, monkeypatch):
+
+    release = threading.Event()
+    calls = []
+
+    def fake_create_charging_plans(**kwargs):
+        calls.append(kwargs)
+        release.wait(5)
+        return None, [{"vehicle_id": 1, "power": 5}], None
+
+    monkeypatch.setattr("core.api.routers.cpo.create_charging_plans", fake_create_charging_plans)
+    body = {k: planning_request[k] for k in ("demand", "planning_params")}
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        responses = [pool.submit(client.post, "/cpo/charging-plan/lp", json=body) for _ in range(3)]
+        job = client.post("/cpo/jobs", json=planning_request).json()
+        deadline = time.time() + 5
+        while job_queue.stats()["coalesced"] < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        release.set()
+        plans = [response.result().json() for response in responses]
+
+    # One solve for the four requests
+    assert len(calls) == 1
+    assert all(plan == plans[0] for plan in plans)
+    assert client.get("/cpo/jobs").json()["coalesced"] == 3
+    assert client.get(f"/cpo/jobs/{job['job_id']}").json()["result"] == plans[0]
+
+
+def test_coalesced_job_not_cancelled_by_one_caller():
+
+    queue = JobQueue(max_workers=1, executor="thread")
+    release = threading.Event()
+
+    async def callers():
+        first = asyncio.ensure_future(queue.run(release.wait, key="same", timeout=5))
+        second = asyncio.ensure_future(queue.run(release.wait, key="same", timeout=5))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        await asyncio.sleep(0.05)
+        release.set()
+        return await second
+
+    assert asyncio.run(callers()) is True
+    assert queue.stats()["coalesced"] == 1
+    queue.shutdown()
+
+
+def test_slow_plan_cache_does_not_block_event_loop(monkeypatch):
+
+    class SlowCache(MemoryCache):
+        # A slow cache server (e.g. Redis timing out)
+
+        def get(self, key):
+            time.sleep(1.)
+            return super().get(key)
+
+    monkeypatch.setattr("core.api.routers.cpo.plan_cache", SlowCache())
+    monkeypatch.setattr("core.api.routers.cpo.create_charging_plans", lambda **kwargs: (None, [{"power": 5}], None))
+    body = {k: planning_request[k] for k in ("demand", "planning_params")}
+
+    with TestClient(app) as shared_client, ThreadPoolExecutor(max_workers=1) as pool:
+        response = pool.submit(shared_client.post, "/cpo/charging-plan/lp", json=body)
+        time.sleep(0.2)
+        start = time.perf_counter()
+        assert shared_client.get("/").status_code == 200
+        assert time.perf_counter() - start < 0.5
+        assert response.result().status_code == 200
@@ -0,0 +1,400 @@
+# planner_benchmark.py
+# Reproducible benchmark of the day-ahead planner: fleet size x horizon / time step x planner, with regression check
+#
+#   python -m core.benchmarks.planner_benchmark run --sweep quick --output results.json
+#   python -m core.benchmarks.planner_benchmark compare baseline.json results.json
+import argparse
+import datetime
+import itertools
+import json
+import multiprocessing as mp
+import os
+import platform
+import queue
+import resource
+import sys
+import time
+from functools import partial
+from typing import Dict, List
+import cvxpy as cp
+import numpy as np
+import scipy
+from core.planner.day_ahead_planner import demand_inputs, plan_vehicles
+from core.planner.decomposition import result_summary, solve_blocks
+from core.planner.optimization import evcsp_parameter_values
+from core.planner.scaling import condition_diagnostics
+from core.planner.solver_selection import CANDIDATES, DEFAULT_SOLVER_OPTIONS
+from core.utility.data.data_processor import generate_demand_data, prepare_planning_data
+from core.utility.logger.custom_loggers import setup_logger
+
+logger = setup_logger(__name__)
+
+# Planners of the benchmark: the candidates of the automatic selection, and the other engines
+PLANNERS = {
+    **CANDIDATES,
+    "flow": {"formulation": "flow", "backend": "cvxpy"},
+    "admm": {"formulation": "admm", "backend": "cvxpy"},
+    "aggregate": {"formulation": "aggregate", "backend": "cvxpy", "solver": cp.CLARABEL},
+    "milp_relaxed": {"formulation": "milp_relaxed", "backend": "cvxpy", "solver": cp.CLARABEL},
+}
+
+PHASES = ("input", "build", "canonicalization", "solve", "extraction", "total")
+
+# Horizons of one day: (horizon_length [time steps], time_step [seconds])
+SWEEPS = {
+    "quick": {
+        "nbr_vehicles": [10, 100], "horizons": [(24, 3600), (96, 900)], "seeds": [0],
+        "planners": ["cvxpy_clarabel_lp", "cvxpy_highs_milp", "highs_lp", "highs_milp", "heuristic"],
+    },
+    "full": {
+        "nbr_vehicles": [10, 100, 1000, 10000], "horizons": [(24, 3600), (96, 900), (288, 300)], "seeds": [0, 1, 2],
+        "planners": list(PLANNERS),
+    },
+}
+
+
+def benchmark_demand(nbr_vehicle: int, horizon_length: int, time_step: int, seed: int):
+    """
+    Synthetic demand of a benchmark case (see generate_demand_data), reproducible for a given seed
+
+    :param nbr_vehicle: number of vehicles
+    :param horizon_length: horizon length [time steps]
+    :param time_step: time step [seconds]
+    :param seed: seed of the demand
+    :return: planning data (arrivalTime and departureTime as time step indices)
+    """
+
+    np.random.seed(seed)
+    horizon_start = np.datetime64("2025-01-01")
+    demand = generate_demand_data(
+        nbr_vehicles=nbr_vehicle, horizon_length=horizon_length, time_step=time_step, horizon_start=horizon_start
+    )
+    return prepare_planning_data(data_demand=demand, time_step=time_step, horizon_start=horizon_start)
+
+
+def _run_cvxpy(planner: Dict, inputs: Dict, solver_options: Dict) -> tuple[Dict, Dict]:
+    """
+    LP / MILP of the CVXPY backend, solved by plan_vehicles as in production (problem cache, scaling unless
+    solver_options["scaling"] is None, repair of the plan): the time of each phase is the one of the telemetry of
+    the result (see telemetry.PhaseTimer). In an isolated case (see run_isolated), the problem is compiled in the
+    canonicalization phase; in a case run after another of the same size, only its parameters are updated.
+    """
+
+    start_time = time.perf_counter()
+    _, _, result = plan_vehicles(
+        formulation=planner["formulation"], backend=planner["backend"], **inputs, solver_options=solver_options
+    )
+    times = {phase: result.telemetry.get(phase) for phase in PHASES}
+    times["total"] = time.perf_counter() - start_time
+
+    # Coefficient ranges of the solved problem: scaled (see scaling.condition_diagnostics) or of the input values
+    scaling = result.solve_report.get("scaling")
+    if scaling is not None:
+        conditioning = scaling["after"]
+    else:
+        parameter_values = evcsp_parameter_values(**{k: v for k, v in inputs.items() if k != "nbr_vehicle"})
+        conditioning = condition_diagnostics(parameter_values, planner["formulation"])
+
+    stats = {
+        "status": result.status, "gap": result.gap, "objective": result.objective, "iterations": result.iterations,
+        "variables": result.variables, "constraints": result.constraints, "conditioning": conditioning,
+    }
+    return times, stats
+
+
+def _run_planner(planner: Dict, inputs: Dict, solver_options: Dict) -> tuple[Dict, Dict]:
+    """
+    Other planners, timed as a whole: the solve time is the one reported by the planner, if any
+    """
+
+    start_time = time.perf_counter()
+    if planner.get("n_jobs", 1) != 1:
+        _, _, result = solve_blocks(
+            solve=partial(plan_vehicles, formulation=planner["formulation"], backend=planner["backend"]),
+            n_jobs=planner["n_jobs"], **inputs, solver_options=solver_options
+        )
+    else:
+        _, _, result = plan_vehicles(
+            formulation=planner["formulation"], backend=planner["backend"], **inputs, solver_options=solver_options
+        )
+    total = time.perf_counter() - start_time
+
+    summary = result_summary(result)
+    solve = result.get("elapsed", summary["solve_time"]) if isinstance(result, dict) else summary["solve_time"]
+    times = {phase: None for phase in PHASES}
+    times.update({"solve": solve, "total": total})
+
+    return times, {"status": summary["status"], "objective": summary["objective"]}
+
+
+def run_case(case: Dict) -> Dict:
+    """
+    Run a benchmark case
+
+    :param case: planner name, nbr_vehicle, horizon_length, time_step, seed, capacity per vehicle [kW] and
+        solver options
+    :return: case, status, objective, time of each phase [s] (None if the phase is not measured) and the peak
+        resident memory of the process during the case [MB]
+    """
+
+    planner = PLANNERS[case["planner"]]
+    demand = benchmark_demand(case["nbr_vehicle"], case["horizon_length"], case["time_step"], case["seed"])
+    inputs = {
+        "nbr_vehicle": case["nbr_vehicle"], "horizon_length": case["horizon_length"], "time_step": case["time_step"],
+        "p_max_infra": case["capacity_per_vehicle"] * case["nbr_vehicle"], **demand_inputs(demand),
+    }
+    solver_options = dict(case["solver_options"])
+    if "solver" in planner:
+        solver_options["solver"] = planner["solver"]
+
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if planner["backend"] == "cvxpy" and planner["formulation"] in ("lp", "milp"):
+        times, stats = _run_cvxpy(planner, inputs, solver_options)
+    else:
+        times, stats = _run_planner(planner, inputs, solver_options)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {
+        **{k: v for k, v in case.items() if k != "solver_options"}, **stats, "times": times,
+        # ru_maxrss is in kB on Linux
+        "peak_memory_mb": (peak_rss - baseline_rss) / 1024, "peak_rss_mb": peak_rss / 1024,
+    }
+
+
+def _case_worker(results: mp.Queue, case: Dict) -> None:
+    results.put(run_case(case))
+
+
+def run_isolated(case: Dict, timeout: float) -> Dict:
+    """
+    Run a benchmark case in a new process (cold start, own peak memory), stopped after timeout seconds
+
+    :param case: benchmark case (see run_case)
+    :param timeout: maximum time of the case [s]
+    :return: result of the case, with the status "timeout" or "error" if it did not finish
+    """
+
+    context = mp.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_case_worker, args=(results, case), daemon=True)
+    process.start()
+    try:
+        result = results.get(timeout=timeout)
+    except queue.Empty:
+        status = "timeout" if process.is_alive() else "error"
+        result = {**{k: v for k, v in case.items() if k != "solver_options"}, "status": status, "objective": None,
+                  "times": {phase: None for phase in PHASES}, "peak_memory_mb": None, "peak_rss_mb": None}
+    finally:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+
+    return result
+
+
+def case_id(result: Dict) -> str:
+    return (f"{result['planner']}-v{result['nbr_vehicle']}-t{result['horizon_length']}-dt{result['time_step']}"
+            f"-s{result['seed']}")
+
+
+def run_benchmark(
+        nbr_vehicles: List[int], horizons: List[tuple[int, int]], planners: List[str], seeds: List[int],
+        capacity_per_vehicle: float = 5., solver_options: dict = None, timeout: float = 600., isolate: bool = True
+) -> Dict:
+    """
+    Run the benchmark cases of a sweep: all combinations of fleet size, horizon, planner and seed
+
+    :param nbr_vehicles: numbers of vehicles
+    :param horizons: (horizon_length, time_step) pairs
+    :param planners: names of the planners (see PLANNERS)
+    :param seeds: seeds of the synthetic demands
+    :param capacity_per_vehicle: station capacity per vehicle [kW]
+    :param solver_options: options of the planners, default DEFAULT_SOLVER_OPTIONS
+    :param timeout: maximum time of a case [s], only if isolate is True
+    :param isolate: run each case in a new process (see run_isolated), otherwise in this process
+    :return: metadata (versions, platform, date) and the result of each case (see run_case)
+    """
+
+    results = []
+    for nbr_vehicle, (horizon_length, time_step), planner, seed in itertools.product(
+            nbr_vehicles, horizons, planners, seeds
+    ):
+        case = {
+            "planner": planner, "nbr_vehicle": nbr_vehicle, "horizon_length": horizon_length,
+            "time_step": time_step, "seed": seed, "capacity_per_vehicle": capacity_per_vehicle,
+            "solver_options": solver_options or DEFAULT_SOLVER_OPTIONS,
+        }
+        result = run_isolated(case, timeout=timeout) if isolate else run_case(case)
+        result["case"] = case_id(result)
+        results.append(result)
+        logger.info(f"Benchmark {result['case']}: {result['status']}, {result['times']['total']} s")
+
+    return {
+        "metadata": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+            "platform": platform.platform(), "cpu_count": os.cpu_count(), "numpy": np.__version__,
+            "scipy": scipy.__version__, "cvxpy": cp.__version__,
+        },
+        "results": results,
+    }
+
+
+def save_results(results: Dict, path: str) -> None:
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2, default=float)
+
+
+def load_results(path: str) -> Dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare_results(
+        baseline: Dict, current: Dict, threshold: float = 0.25, min_time: float = 0.05, min_memory: float = 20.,
+        objective_tolerance: float = 1e-4
+) -> List[Dict]:
+    """
+    Regressions of current results with respect to a baseline, case by case: slower phase (relative increase above
+    threshold and absolute increase above min_time), higher peak memory (same rule with min_memory), lost status
+    or different objective
+
+    :param baseline: baseline results (see run_benchmark)
+    :param current: current results
+    :param threshold: relative increase of a time / memory flagged as a regression
+    :param min_time: absolute time increase under which a regression is not flagged [s]
+    :param min_memory: absolute memory increase under which a regression is not flagged [MB]
+    :param objective_tolerance: relative objective change flagged as a regression
+    :return: regressions, with the case, the metric and the baseline / current values
+    """
+
+    baseline_results = {result["case"]: result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        reference = baseline_results.get(result["case"])
+        if reference is None:
+            continue
+
+        def flag(metric, before, after):
+            regressions.append({"case": result["case"], "metric": metric, "baseline": before, "current": after})
+
+        if reference["status"] != result["status"]:
+            flag("status", reference["status"], result["status"])
+        for phase in PHASES:
+            before, after = reference["times"].get(phase), result["times"].get(phase)
+            if before is not None and after is not None and after > before * (1 + threshold) \
+                    and after - before > min_time:
+                flag(f"time_{phase}", before, after)
+        before, after = reference.get("peak_memory_mb"), result.get("peak_memory_mb")
+        if before is not None and after is not None and after > before * (1 + threshold) \
+                and after - before > min_memory:
+            flag("peak_memory_mb", before, after)
+        before, after = reference["objective"], result["objective"]
+        if before is not None and after is not None \
+                and abs(after - before) > objective_tolerance * max(abs(before), 1.):
+            flag("objective", before, after)
+
+    return regressions
+
+
+def compare_scaling(
+        nbr_vehicles: List[int], horizons: List[tuple[int, int]], seeds: List[int], planner: str = "cvxpy_clarabel_lp",
+        capacity_per_vehicle: float = 5., solver_options: dict = None, timeout: float = 600.
+) -> List[Dict]:
+    """
+    Iterations and solving time of a CVXPY planner with and without the automatic scaling (see scaling), on the
+    cases of a sweep
+
+    :param nbr_vehicles: numbers of vehicles
+    :param horizons: (horizon_length, time_step) pairs
+    :param seeds: seeds of the synthetic demands
+    :param planner: name of a CVXPY "lp" or "milp" planner (see PLANNERS)
+    :param capacity_per_vehicle: station capacity per vehicle [kW]
+    :param solver_options: options of the planner, default DEFAULT_SOLVER_OPTIONS
+    :param timeout: maximum time of a case [s]
+    :return: for each case, the status, objective, iterations, solving time [s] and coefficient ranges (see
+        scaling.condition_diagnostics) of the unscaled and of the scaled problem
+    """
+
+    comparisons = []
+    for nbr_vehicle, (horizon_length, time_step), seed in itertools.product(nbr_vehicles, horizons, seeds):
+        runs = {}
+        for name, scaling in (("unscaled", None), ("scaled", "auto")):
+            case = {
+                "planner": planner, "nbr_vehicle": nbr_vehicle, "horizon_length": horizon_length,
+                "time_step": time_step, "seed": seed, "capacity_per_vehicle": capacity_per_vehicle,
+                "solver_options": {**(solver_options or DEFAULT_SOLVER_OPTIONS), "scaling": scaling},
+            }
+            result = run_isolated(case, timeout=timeout)
+            runs[name] = {k: result.get(k) for k in ("status", "objective", "iterations", "conditioning")}
+            runs[name]["solve_time"] = result["times"]["solve"]
+
+        comparison = {"case": case_id({**case, "planner": planner}), **runs}
+        logger.info(
+            f"Scaling {comparison['case']}: {runs['unscaled']['iterations']} -> {runs['scaled']['iterations']} "
+            f"iterations, {runs['unscaled']['solve_time']} -> {runs['scaled']['solve_time']} s"
+        )
+        comparisons.append(comparison)
+
+    return comparisons
+
+
+def main(argv: List[str] = None) -> int:
+
+    parser = argparse.ArgumentParser(description="Benchmark of the day-ahead planner")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run a sweep and write the results")
+    run.add_argument("--sweep", choices=list(SWEEPS), default="quick")
+    run.add_argument("--planners", nargs="+", choices=list(PLANNERS), help="override the planners of the sweep")
+    run.add_argument("--output", default="benchmark_results.json")
+    run.add_argument("--timeout", type=float, default=600.)
+    run.add_argument("--baseline", help="compare the results to this baseline")
+
+    compare = commands.add_parser("compare", help="compare results to a baseline")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+
+    scaling = commands.add_parser("scaling", help="compare the CVXPY LP with and without automatic scaling")
+    scaling.add_argument("--sweep", choices=list(SWEEPS), default="quick")
+    scaling.add_argument("--output", default="scaling_results.json")
+    scaling.add_argument("--timeout", type=float, default=600.)
+
+    for command in (run, compare):
+        command.add_argument("--threshold", type=float, default=0.25)
+        command.add_argument("--min-time", type=float, default=0.05)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "scaling":
+        sweep = SWEEPS[args.sweep]
+        comparisons = compare_scaling(sweep["nbr_vehicles"], sweep["horizons"], sweep["seeds"], timeout=args.timeout)
+        save_results({"results": comparisons}, args.output)
+        for comparison in comparisons:
+            unscaled, scaled = comparison["unscaled"], comparison["scaled"]
+            print(f"{comparison['case']}: iterations {unscaled['iterations']} -> {scaled['iterations']}, "
+                  f"solve {unscaled['solve_time']:.4f} -> {scaled['solve_time']:.4f} s, objective range "
+                  f"{unscaled['conditioning']['objective']['orders']:.1f} -> "
+                  f"{scaled['conditioning']['objective']['orders']:.1f} orders")
+        return 0
+
+    if args.command == "run":
+        sweep = {**SWEEPS[args.sweep], **({"planners": args.planners} if args.planners else {})}
+        current = run_benchmark(**sweep, timeout=args.timeout)
+        save_results(current, args.output)
+        if args.baseline is None:
+            return 0
+        baseline = load_results(args.baseline)
+    else:
+        baseline, current = load_results(args.baseline), load_results(args.current)
+
+    regressions = compare_results(baseline, current, threshold=args.threshold, min_time=args.min_time)
+    for regression in regressions:
+        print(f"REGRESSION {regression['case']} {regression['metric']}: "
+              f"{regression['baseline']} -> {regression['current']}")
+    print(f"{len(regressions)} regressions")
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
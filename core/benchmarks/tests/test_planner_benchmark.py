@@ -0,0 +1,67 @@
+import copy
+import pytest
+from core.benchmarks.planner_benchmark import PHASES, benchmark_demand, compare_results, load_results, main, \
+    run_benchmark, run_isolated, save_results
+
+
+def test_benchmark_demand_reproducible():
+
+    demand = benchmark_demand(nbr_vehicle=20, horizon_length=288, time_step=300, seed=3)
+
+    assert demand.equals(benchmark_demand(nbr_vehicle=20, horizon_length=288, time_step=300, seed=3))
+    assert not demand.equals(benchmark_demand(nbr_vehicle=20, horizon_length=288, time_step=300, seed=4))
+    assert (demand["departureTime"] <= 288).all()
+
+
+@pytest.fixture(scope="module")
+def results():
+    return run_benchmark(
+        nbr_vehicles=[10], horizons=[(24, 3600), (96, 900)], planners=["cvxpy_clarabel_lp", "highs_milp"],
+        seeds=[0], isolate=False
+    )
+
+
+def test_run_benchmark(results, tmp_path):
+
+    assert len(results["results"]) == 4
+    for result in results["results"]:
+        assert result["status"] == "optimal"
+        assert set(result["times"]) == set(PHASES)
+        assert result["times"]["total"] >= result["times"]["solve"] > 0
+
+    cvxpy_result = results["results"][0]
+    assert cvxpy_result["case"] == "cvxpy_clarabel_lp-v10-t24-dt3600-s0"
+    assert all(cvxpy_result["times"][phase] is not None for phase in PHASES)
+    assert cvxpy_result["iterations"] > 0 and cvxpy_result["variables"] > 0 and cvxpy_result["conditioning"]
+
+    save_results(results, tmp_path / "results.json")
+    assert load_results(tmp_path / "results.json")["results"][0]["case"] == cvxpy_result["case"]
+
+
+def test_compare_results(results, tmp_path):
+
+    assert compare_results(results, results) == []
+
+    current = copy.deepcopy(results)
+    current["results"][0]["times"]["solve"] += 10.
+    current["results"][1]["objective"] *= 2
+    current["results"][2]["times"]["total"] *= 1.01
+    regressions = compare_results(results, current)
+
+    assert [(r["case"], r["metric"]) for r in regressions] == [
+        (results["results"][0]["case"], "time_solve"), (results["results"][1]["case"], "objective")
+    ]
+
+    save_results(results, tmp_path / "baseline.json")
+    save_results(current, tmp_path / "current.json")
+    assert main(["compare", str(tmp_path / "baseline.json"), str(tmp_path / "current.json")]) == 1
+    assert main(["compare", str(tmp_path / "baseline.json"), str(tmp_path / "baseline.json")]) == 0
+
+
+def test_run_isolated_timeout():
+
+    case = {
+        "planner": "cvxpy_clarabel_lp", "nbr_vehicle": 10, "horizon_length": 24, "time_step": 3600, "seed": 0,
+        "capacity_per_vehicle": 5., "solver_options": {}
+    }
+    assert run_isolated(case, timeout=0.01)["status"] == "timeout"
@@ -7,13 +7,14 @@ from typing import List, Dict
 import numpy as np
 from dash import Dash, dcc, Input, Output, State
 import pandas as pd
-import cvxpy as cp
 import dash_bootstrap_components as dbc
 from core.dashboard.markups import generate_fig_station_power, generate_fig_station_kpi, \
     generate_fig_heatmap_power, generate_fig_stackedplot_power
 from core.dashboard.pages.layouts import create_station_layout
 from core.schemas.cpo import Station, PlanningParameters
+from core.planner.capacity_sweep import capacity_frontier, frontier_plan
 from core.planner.day_ahead_planner import create_charging_plans
+from core.planner.solver_selection import DEFAULT_SOLVER_OPTIONS
 from core.utility.data.data_processor import generate_demand_data, prepare_planning_data, create_time_horizon
 from core.utility.kpi.eval_performance import compute_energetic_kpi
 import plotly.graph_objects as go
@@ -33,9 +34,11 @@ station: Station = Station(
     )
 )
 
-# Solver options: for LP formulation, CLARABEL performs much better in terms of time than SCIPY (HiGHs)
-solver_options = {"solver": cp.CLARABEL, "time_limit": 60.0, "verbose": False, "warm_start": False}
-# solver_options = {"solver": cp.SCIPY, "time_limit": 60.0, "verbose": False, "warm_start": False}
+# Solver options: the solver is selected from the cost model of the planner (see solver_selection)
+solver_options = {**DEFAULT_SOLVER_OPTIONS, "solver": "auto"}
+
+# Capacity levels of the frontier, matching the steps of slider-pgrid (see pages/layouts.py)
+capacity_levels = np.r_[np.arange(50, 400, 20), 400]
 
 # Charging demand
 charging_demand = generate_demand_data(
@@ -98,19 +101,29 @@ def run_planner(demand: List[Dict], pmax: List | np.array) -> tuple[go.Figure, g
 
     nbr_vehicles = len(demand_df)
 
-    _, powerProfiles, evcsp = create_charging_plans(demand_df,
-                                                    horizon_length=station.planning_parameters.horizon_length,
-                                                    time_step=station.planning_parameters.time_step,
-                                                    nbr_vehicle=nbr_vehicles, capacity_grid=pmax, n_sols=10,
-                                                    formulation="lp", solver_options=solver_options)
-
-    # KPI COMPUTATION
-    kpi_station, kpi_per_ev = compute_energetic_kpi(
-        power_profiles=powerProfiles,
-        power_grid=pmax,
-        planning_input=demand_df,
-        time_step=station.planning_parameters.time_step
+    # Slider moves are served from the frontier of the demand, swept once for all capacity levels
+    frontier = capacity_frontier(
+        demand_df, capacities=capacity_levels, horizon_length=station.planning_parameters.horizon_length,
+        time_step=station.planning_parameters.time_step, formulation="lp", solver_options=solver_options
     )
+    plan = frontier_plan(frontier, pmax)
+
+    if plan is not None:
+        _, powerProfiles, kpi_station = plan
+    else:
+        _, powerProfiles, evcsp = create_charging_plans(demand_df,
+                                                        horizon_length=station.planning_parameters.horizon_length,
+                                                        time_step=station.planning_parameters.time_step,
+                                                        nbr_vehicle=nbr_vehicles, capacity_grid=pmax, n_sols=1,
+                                                        formulation="lp", solver_options=solver_options)
+
+        # KPI COMPUTATION
+        kpi_station, kpi_per_ev = compute_energetic_kpi(
+            power_profiles=powerProfiles,
+            power_grid=pmax,
+            planning_input=demand_df,
+            time_step=station.planning_parameters.time_step
+        )
 
     # VISUALIZATION
     horizon_start = np.datetime64('today')
@@ -1,7 +1,6 @@
 import json
 import pprint
 
-import cvxpy_debug
 import numpy as np
 from matplotlib import pyplot as plt
 import pandas as pd
@@ -9,6 +8,7 @@ import cvxpy as cp
 
 from core.dashboard.markups import generate_fig_heatmap_power, generate_fig_stackedplot_power
 from core.planner.day_ahead_planner import create_charging_plans
+from core.planner.solver_selection import DEFAULT_SOLVER_OPTIONS
 from core.utility.data.data_processor import generate_demand_data, prepare_planning_data, create_time_horizon
 from core.utility.kpi.eval_performance import compute_energetic_kpi, compute_other_optim_kpi
 import plotly.graph_objects as go
@@ -24,9 +24,8 @@ def simple_cpo_fixed_capacity():
     time_step = 900         # [Seconds]
     horizon_length = 96     # [Time Step]
     capacity = 200          # [kW] grid capacity
-    n_sols = 250
-    solver_options_1 = {"solver": cp.CLARABEL, "time_limit": 60.0, "verbose": False, "warm_start": False}
-    solver_options_2 = {"solver": cp.SCIPY, "time_limit": 60.0, "verbose": False, "warm_start": False}
+    n_sols = 1
+    solver_options = {**DEFAULT_SOLVER_OPTIONS, "solver": "auto"}
 
     # Data Preparation
     data_planning = generate_demand_data(nbr_vehicles=nVE, horizon_length=horizon_length, time_step=time_step)
@@ -36,7 +35,7 @@ def simple_cpo_fixed_capacity():
     _, powerProfiles, evcsp = create_charging_plans(
         data_planning, horizon_length=horizon_length, time_step=time_step,
         nbr_vehicle=nVE, capacity_grid=capacity, n_sols=n_sols,
-        formulation="milp", solver_options=solver_options_2,
+        formulation="milp", solver_options=solver_options,
         vehicle_data = {"efficiency_charging": 0.85}
     )
 
@@ -48,7 +47,7 @@ def simple_cpo_fixed_capacity():
         time_step=time_step
     )
 
-    print(evcsp.solver_stats)
+    print(evcsp)
     print(kpi_station)
 
     # Visualization
@@ -72,14 +71,14 @@ def simple_cpo_variable_capacity() -> cp.Problem:
     time_step = 900         # [Seconds]
     horizon_length = 96     # [Time Step]
     capacity = 200          # [kW] grid capacity
-    n_sols = 250
+    n_sols = 1
     capacity_grid = np.array([80] * horizon_length)
     capacity_grid[40:57] = 60
     # capacity_grid[0:20] = 0
     # capacity_grid[0:75] = 0
 
-    solver_options = {"solver": cp.CLARABEL, "time_limit": 60.0, "verbose": False, "warm_start": False}
-    # solver_options = {"solver": cp.SCIPY, "time_limit": 60.0, "verbose": False, "warm_start": False}
+    # The CVXPY problem is used below: the solver is selected among the CVXPY solvers
+    solver_options = {**DEFAULT_SOLVER_OPTIONS, "solver": "auto"}
 
     horizon_start = np.datetime64('today')
     horizon_datetime = create_time_horizon(
@@ -111,7 +110,7 @@ def simple_cpo_variable_capacity() -> cp.Problem:
 
     kpi_soc = compute_other_optim_kpi(data_planning=data_planning, horizon_length=horizon_length, evcsp=evcsp)
 
-    pprint.pprint(evcsp.solver_stats)
+    pprint.pprint(evcsp.summary())
     pprint.pprint(pd.DataFrame(data=kpi_station, index=[0]))
     # pprint.pprint(kpi_per_ev)
 
@@ -150,14 +149,14 @@ def simple_cpo_update_peak_as_parameter():
     time_step = 900  # [Seconds]
     horizon_length = 96  # [Time Step]
     capacity = 200  # [kW] grid capacity
-    n_sols = 250
+    n_sols = 1
     capacity_grid = np.array([40] * horizon_length)
     # capacity_grid[40:57] = 60
     # capacity_grid[0:20] = 0
     # capacity_grid[0:75] = 0
 
-    solver_options = {"solver": cp.CLARABEL, "time_limit": 60.0, "verbose": False, "warm_start": False}
-    # solver_options = {"solver": cp.SCIPY, "time_limit": 60.0, "verbose": False, "warm_start": False}
+    # The CVXPY problem is used below: the solver is selected among the CVXPY solvers
+    solver_options = {**DEFAULT_SOLVER_OPTIONS, "solver": "auto"}
 
     horizon_start = np.datetime64('today')
     horizon_datetime = create_time_horizon(
@@ -189,7 +188,7 @@ def simple_cpo_update_peak_as_parameter():
 
     # kpi_soc = compute_other_optim_kpi(data_planning=data_planning, horizon_length=horizon_length, evcsp=evcsp)
 
-    pprint.pprint(evcsp.solver_stats)
+    pprint.pprint(evcsp.summary())
     # pprint.pprint(pd.DataFrame(data=kpi_station, index=[0]))
     pprint.pprint(kpi_station)
     # pprint.pprint(data_planning)
@@ -210,15 +209,20 @@ def simple_cpo_update_peak_as_parameter():
         horizon_datetime=horizon_datetime, power_profiles_vehicles=power_profiles, capacity_grid=capacity_grid)
     fig_stack.show()
 
-    # UPDATE PEAK POWER AND RESOLVE
+    # UPDATE PEAK POWER AND RESOLVE (the cached problem is solved again with the new parameter values)
     new_peak_infra = 30
-    evcsp.param_dict["Peak Power Capacity"].value = horizon_length * [new_peak_infra]
-    evcsp.solve()
+    _, power_profiles, evcsp = create_charging_plans(
+        data_planning, horizon_length=horizon_length, time_step=time_step,
+        nbr_vehicle=nVE, capacity_grid=np.array(horizon_length * [new_peak_infra]), n_sols=n_sols,
+        formulation="lp", solver_options=solver_options,
+        prices_data={"price_energy_buy": 3000, "penalty_unsatisfied": 600000},
+        vehicle_data={"efficiency_charging": 0.85}
+    )
 
     fig_stack = generate_fig_stackedplot_power(
         horizon_datetime=horizon_datetime,
-        power_profiles_vehicles=evcsp.var_dict["Charging Power"].value,
-        capacity_grid=evcsp.param_dict["Peak Power Capacity"].value
+        power_profiles_vehicles=power_profiles,
+        capacity_grid=np.array(horizon_length * [new_peak_infra])
     )
 
     fig_stack.show()
@@ -226,5 +230,5 @@ def simple_cpo_update_peak_as_parameter():
 
 
 if __name__ == '__main__':
-    prob = simple_cpo_update_peak_as_parameter()
-    cvxpy_debug.debug(prob)
+    result = simple_cpo_update_peak_as_parameter()
+    pprint.pprint(result.summary())
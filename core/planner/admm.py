@@ -0,0 +1,266 @@
+# admm.py
+# ADMM (sharing form) planner for very large fleets: the station power limit is relaxed with a price per time step
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List
+import numpy as np
+from core.planner.optimization import evcsp_parameter_values, evcsp_objective
+from core.utility.logger.custom_loggers import setup_logger
+
+logger = setup_logger(__name__)
+
+_WORKER_CHUNKS_ = []
+_WORKER_ARRAYS_ = {}
+_BALANCE_RATIO_ = 10.     # Residual ratio above which rho is adapted (residual balancing)
+_RHO_FACTOR_ = 2.         # Factor of the adaptation of rho
+_BALANCE_INTERVAL_ = 25   # Iterations between two adaptations of rho (more often, the iterates oscillate)
+
+
+def _vehicle_update(
+        target: np.ndarray, cell_vehicle: np.ndarray, cell_power_nom: np.ndarray, slope_low: np.ndarray,
+        slope_high: float, energy_low: np.ndarray, energy_high: np.ndarray, rho: float, n_bisection: int = 40
+) -> np.ndarray:
+    """
+    Vehicle subproblems of the ADMM, vectorized over vehicles. For each vehicle v, with s = sum_t p[t]:
+
+        min_p  h_v(s) + rho / 2 * ||p - target||^2  s.t.  0 <= p <= power_nom
+
+    where h_v is piecewise linear, with slope slope_low[v] for s < energy_low[v] (energy still required), slope_high
+    above, and s <= energy_high[v] (battery capacity). The solution is p = clip(target - theta / rho, 0, power_nom),
+    with theta a subgradient of h_v at s, found by bisection.
+
+    :param target: target of the proximal term, for each parked cell
+    :param cell_vehicle: vehicle of each parked cell
+    :param cell_power_nom: nominal power of the vehicle of each parked cell [kW]
+    :param slope_low: marginal cost of charging while energy is required (energy price - penalty), for each vehicle
+    :param slope_high: marginal cost of charging beyond the required energy (energy price)
+    :param energy_low: required energy, for each vehicle [kW * time steps]
+    :param energy_high: battery headroom, for each vehicle [kW * time steps]
+    :param rho: ADMM penalty
+    :param n_bisection: number of bisection iterations
+    :return: charging power, for each parked cell [kW]
+    """
+
+    n_vehicle = len(energy_low)
+    lo = np.full(n_vehicle, min(slope_low.min(initial=0.), rho * (target - cell_power_nom).min(initial=0.)) - 1.)
+    hi = np.full(n_vehicle, max(slope_high, rho * target.max(initial=0.)) + 1.)
+
+    for _ in range(n_bisection):
+        theta = (lo + hi) / 2
+        charged = np.bincount(
+            cell_vehicle, weights=np.clip(target - theta[cell_vehicle] / rho, 0, cell_power_nom), minlength=n_vehicle
+        )
+        # Energies s at which theta is a subgradient of h_v: [energy_min, energy_max]
+        energy_max = np.where(theta < slope_low, 0., np.where(theta < slope_high, energy_low, energy_high))
+        energy_min = np.where(theta <= slope_low, 0., np.where(theta <= slope_high, energy_low, energy_high))
+        too_low, too_high = charged > energy_max, charged < energy_min
+        lo = np.where(too_high, lo, theta)
+        hi = np.where(too_low, hi, theta)
+
+    theta = (lo + hi) / 2
+    power = np.clip(target - theta[cell_vehicle] / rho, 0, cell_power_nom)
+
+    # Remove the bisection residual above the battery headroom
+    charged = np.bincount(cell_vehicle, weights=power, minlength=n_vehicle)
+    scale = np.where(charged > energy_high, energy_high / np.maximum(charged, 1e-12), 1.)
+
+    return power * scale[cell_vehicle]
+
+
+def _init_worker(chunks: List[Dict], cell_bounds: np.ndarray, target_name: str, power_name: str) -> None:
+    # Chunks of vehicles and shared arrays of the targets and powers of all cells, attached once per worker
+    global _WORKER_CHUNKS_, _WORKER_ARRAYS_
+    _WORKER_CHUNKS_ = chunks
+    memories = [shared_memory.SharedMemory(name=name) for name in (target_name, power_name)]
+    _WORKER_ARRAYS_ = {
+        "memories": memories, "cell_bounds": cell_bounds,
+        "target": np.ndarray((cell_bounds[-1],), dtype=np.float64, buffer=memories[0].buf),
+        "power": np.ndarray((cell_bounds[-1],), dtype=np.float64, buffer=memories[1].buf),
+    }
+
+
+def _update_chunk(chunk: int, rho: float) -> None:
+    # Update of the vehicles of a chunk, reading and writing the shared arrays: only (chunk, rho) is sent per iteration
+    cells = slice(_WORKER_ARRAYS_["cell_bounds"][chunk], _WORKER_ARRAYS_["cell_bounds"][chunk + 1])
+    _WORKER_ARRAYS_["power"][cells] = _vehicle_update(
+        target=_WORKER_ARRAYS_["target"][cells], rho=rho, **_WORKER_CHUNKS_[chunk]
+    )
+
+
+def evcsp_admm(
+        nbr_vehicle: int, arrival_idx: List[int], departure_idx: List[int], power_nom: List[int],
+        required_energy: List[int], capacity_nom: List[float], soe_init: List[float], p_max_infra: float | List[float],
+        horizon_length: int, time_step: int = 900, solver_options: dict = None, prices=None,
+        efficiency_charging: float = 0.9
+) -> tuple[np.ndarray, np.ndarray, Dict]:
+    """
+    EVCSP LP solved by ADMM in sharing form: the station power limit, the only constraint coupling vehicles, is
+    handled by a price per time step (the scaled dual variable), and the vehicle subproblems are solved in closed
+    form up to a bisection, vectorized over vehicles (see _vehicle_update). Vehicles can be split into chunks solved
+    in a process pool (the targets and powers are exchanged through shared memory). The penalty rho is adapted by
+    residual balancing every few iterations. The station power limit is enforced on the last iterate by scaling
+    down the vehicles charging at overloaded time steps: if the residuals are not below the tolerance after max_iter
+    iterations, the status is "max_iter" (a warning is logged) and the plan is this approximate last iterate.
+
+    Residuals at iteration k (with the mean power of vehicles x_bar and the station variable z_bar, per time step):
+        primal residual: nbr_vehicle * ||x_bar - z_bar||        [kW]
+        dual residual: rho * nbr_vehicle * ||z_bar - z_bar_prev||
+
+    :param nbr_vehicle: number of vehicles / terminal considered in the horizon
+    :param arrival_idx: index of arrival time
+    :param departure_idx: index of departure time
+    :param power_nom: nominal power of each vehicle [kW]
+    :param required_energy: energy demand for each vehicle [kWh]
+    :param capacity_nom: nominal capacity for each vehicle [kWh]
+    :param soe_init: Initial SOE of vehicles at arrival [kWh]
+    :param p_max_infra: max power profile for the station [kW]
+    :param horizon_length: horizon length [time steps]
+    :param time_step: [seconds]
+    :param solver_options: "rho" (initial ADMM penalty, default: scaled on the penalty of unsatisfied energy and the
+        nominal powers), "adaptive_rho" (residual balancing, default True), "max_iter" (default 1000), "tolerance"
+        (relative tolerance on the residuals, default 1e-4) and "n_jobs" (number of processes of the vehicle
+        updates, -1 for all cores, default 1)
+    :param prices: contain prices information for the optimization problem
+    :param efficiency_charging: charging efficiency (on the scale of 1, not 100%)
+    :return:
+        activation_profile: charging indicators profile (1 for charging, 0 for not charging)
+        power_profile: power charging profile
+        result: status ("optimal" if converged, "max_iter" otherwise), converged, objective, number of iterations,
+            residuals of each iteration, station prices and solving time
+    """
+
+    if solver_options is None:
+        solver_options = {}
+
+    max_iter = solver_options.get("max_iter", 1000)
+    tolerance = solver_options.get("tolerance", 1e-4)
+    adaptive_rho = solver_options.get("adaptive_rho", True)
+    n_jobs = solver_options.get("n_jobs", 1)
+    n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+
+    start_time = time.time()
+    parameter_values = evcsp_parameter_values(
+        arrival_idx=arrival_idx, departure_idx=departure_idx, power_nom=power_nom, required_energy=required_energy,
+        capacity_nom=capacity_nom, soe_init=soe_init, p_max_infra=p_max_infra, horizon_length=horizon_length,
+        time_step=time_step, prices=prices, efficiency_charging=efficiency_charging
+    )
+
+    factor = parameter_values["Charging Factor"]
+    power_nom = np.asarray(power_nom, dtype=float)
+    p_max = parameter_values["Peak Power Capacity"]
+    headroom = np.clip(np.asarray(capacity_nom, dtype=float) - np.asarray(soe_init, dtype=float), 0, None)
+    energy_low = np.minimum(parameter_values["Required Energy"], headroom) / factor
+    energy_high = headroom / factor
+    slope_high = parameter_values["Energy Price"]
+    slope_low = slope_high - parameter_values["Unsatisfied Weight"] * factor
+
+    rho = solver_options.get(
+        "rho", float(np.median(parameter_values["Unsatisfied Weight"] * factor) / max(np.median(power_nom), 1e-9))
+    ) if nbr_vehicle else 1.
+    logger.info(f"ADMM Formulation with rho {rho:.3g} and {n_jobs} processes")
+
+    # Parked cells, vehicle by vehicle, split into chunks of vehicles
+    v_idx, t_idx = np.nonzero((parameter_values["Parked"] > 0).T)
+    vehicle_bounds = np.linspace(0, nbr_vehicle, max(n_jobs, 1) + 1).astype(int)
+    cell_bounds = np.searchsorted(v_idx, vehicle_bounds)
+    chunks = []
+    for k in range(len(vehicle_bounds) - 1):
+        v_start, v_end = vehicle_bounds[k], vehicle_bounds[k + 1]
+        cells = slice(cell_bounds[k], cell_bounds[k + 1])
+        chunks.append({
+            "cell_vehicle": v_idx[cells] - v_start, "cell_power_nom": power_nom[v_idx[cells]],
+            "slope_low": slope_low[v_start:v_end], "slope_high": slope_high,
+            "energy_low": energy_low[v_start:v_end], "energy_high": energy_high[v_start:v_end],
+        })
+
+    # Process pool: the targets and powers of the cells are exchanged through shared memory, the chunks are sent
+    # once to each worker
+    executor, memories = None, []
+    if n_jobs > 1 and len(t_idx):
+        memories = [shared_memory.SharedMemory(create=True, size=len(t_idx) * 8) for _ in range(2)]
+        shared_target, shared_power = (
+            np.ndarray((len(t_idx),), dtype=np.float64, buffer=memory.buf) for memory in memories
+        )
+        executor = ProcessPoolExecutor(
+            max_workers=n_jobs, initializer=_init_worker,
+            initargs=(chunks, cell_bounds, memories[0].name, memories[1].name)
+        )
+
+    n = max(nbr_vehicle, 1)
+    power = np.zeros(len(t_idx))
+    load, z_bar, u = np.zeros(horizon_length), np.zeros(horizon_length), np.zeros(horizon_length)
+    residuals = []
+    iteration, converged = 0, False
+    primal_residual = dual_residual = np.inf
+    try:
+        while iteration < max_iter:
+            iteration += 1
+            target = power - (load / n - z_bar + u)[t_idx]
+            if executor is None:
+                power = np.concatenate([
+                    _vehicle_update(target=target[cell_bounds[k]:cell_bounds[k + 1]], rho=rho, **chunk)
+                    for k, chunk in enumerate(chunks)
+                ])
+            else:
+                shared_target[:] = target
+                list(executor.map(_update_chunk, range(len(chunks)), [rho] * len(chunks)))
+                power = shared_power.copy()
+
+            load = np.bincount(t_idx, weights=power, minlength=horizon_length)
+            z_bar_prev = z_bar
+            z_bar = np.minimum(u + load / n, p_max / n)
+            u = u + load / n - z_bar
+
+            primal_residual = n * np.linalg.norm(load / n - z_bar)
+            dual_residual = rho * n * np.linalg.norm(z_bar - z_bar_prev)
+            residuals.append({"primal": primal_residual, "dual": dual_residual})
+
+            if (primal_residual <= tolerance * max(np.linalg.norm(load), 1.)
+                    and dual_residual <= tolerance * max(rho * n * np.linalg.norm(u), 1.)):
+                converged = True
+                break
+
+            # Residual balancing: rho is increased if the primal residual is much larger than the dual residual,
+            # decreased in the opposite case. The scaled dual u = y / rho is rescaled accordingly.
+            if adaptive_rho and iteration % _BALANCE_INTERVAL_ == 0:
+                if primal_residual > _BALANCE_RATIO_ * dual_residual:
+                    rho, u = rho * _RHO_FACTOR_, u / _RHO_FACTOR_
+                elif dual_residual > _BALANCE_RATIO_ * primal_residual:
+                    rho, u = rho / _RHO_FACTOR_, u * _RHO_FACTOR_
+    finally:
+        if executor is not None:
+            executor.shutdown()
+            del shared_target, shared_power
+        for memory in memories:
+            memory.close()
+            memory.unlink()
+
+    status = "optimal" if converged else "max_iter"
+    if converged:
+        logger.info(f"ADMM converged after {iteration} iterations")
+    else:
+        logger.warning(
+            f"ADMM not converged after {iteration} iterations (primal residual {primal_residual:.3g} kW, dual "
+            f"residual {dual_residual:.3g}): the plan is the last iterate, cut to the station limit"
+        )
+
+    # Station power limit on the last iterate
+    scale = np.where(load > p_max, np.clip(p_max, 0, None) / np.maximum(load, 1e-12), 1.)
+    power_profile = np.zeros(shape=(horizon_length, nbr_vehicle), dtype=float)
+    power_profile[t_idx, v_idx] = power * scale[t_idx]
+    activation_profile = power_profile > 0
+
+    result = {
+        "status": status,
+        "objective": evcsp_objective(power_profile, parameter_values),
+        "converged": converged,
+        "iterations": iteration,
+        "residuals": residuals,
+        "station_prices": rho * u,
+        "solve_time": time.time() - start_time,
+    }
+    logger.info(f"Measured Solving Time: {round(result['solve_time'], 3)} seconds")
+
+    return activation_profile, power_profile, result
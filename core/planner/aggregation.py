@@ -0,0 +1,321 @@
+# aggregation.py
+# Aggregate-then-disaggregate planner: vehicles clustered into virtual batteries, LP of the clusters, allocation back
+import time
+from typing import Dict, List
+import cvxpy as cp
+import numpy as np
+from core.planner.optimization import build_evcsp_lp, evcsp_lp, evcsp_objective, evcsp_parameter_values, solve_evcsp
+from core.planner.telemetry import PhaseTimer
+from core.utility.logger.custom_loggers import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_N_CLUSTERS = 32
+
+# Options of the aggregation, not passed to the solver
+AGGREGATION_OPTIONS = ("n_clusters", "allocator", "seed")
+
+
+def cluster_vehicles(
+        arrival_idx: List[int], departure_idx: List[int], power_nom: List[int], weight: List[float], n_clusters: int,
+        n_iterations: int = 20, seed: int = 0
+) -> np.ndarray:
+    """
+    Cluster the vehicles by parking window, nominal power and penalty of the unsatisfied energy: weighted k-means
+    (k-means++ initialization) of the distinct (arrival, departure, nominal power, penalty) points, each feature
+    scaled to [0, 1] (arrival and departure on the same scale). Vehicles with the same point are always in the same
+    cluster.
+
+    :param arrival_idx: index of arrival time
+    :param departure_idx: index of departure time
+    :param power_nom: nominal power of each vehicle [kW]
+    :param weight: penalty of the unsatisfied energy of each vehicle [currency/kWh]
+    :param n_clusters: maximum number of clusters
+    :param n_iterations: number of k-means iterations
+    :param seed: seed of the initialization
+    :return: cluster of each vehicle, numbered from 0 without gaps
+    """
+
+    points = np.column_stack([np.asarray(v, dtype=float) for v in (arrival_idx, departure_idx, power_nom, weight)])
+    distinct, inverse, counts = np.unique(points, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+    if len(distinct) <= n_clusters:
+        return inverse
+
+    ranges = [np.ptp(distinct[:, 0:2])] * 2 + [np.ptp(distinct[:, 2]), np.ptp(distinct[:, 3])]
+    x = distinct / np.maximum(ranges, 1e-12)
+    rng = np.random.default_rng(seed)
+
+    centers = [x[rng.choice(len(x), p=counts / counts.sum())]]
+    for _ in range(n_clusters - 1):
+        distance = ((x[:, None, :] - np.array(centers)[None, :, :]) ** 2).sum(axis=2).min(axis=1) * counts
+        if distance.sum() <= 0:
+            break
+        centers.append(x[rng.choice(len(x), p=distance / distance.sum())])
+    centers = np.array(centers)
+
+    for _ in range(n_iterations):
+        label = ((x[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+        size = np.bincount(label, weights=counts, minlength=len(centers))
+        for d in range(x.shape[1]):
+            centers[:, d] = np.bincount(label, weights=counts * x[:, d], minlength=len(centers)) \
+                / np.maximum(size, 1e-12)
+
+    _, label = np.unique(label, return_inverse=True)
+    return label.ravel()[inverse]
+
+
+def build_evcsp_aggregate(nbr_vehicle: int, horizon_length: int) -> tuple[cp.Problem, Dict[str, cp.Parameter]]:
+    """
+    Build the parametrized LP of the virtual batteries: the LP of EVCSP (see build_evcsp_lp), where the SOE is the
+    energy charged since the start of the horizon, with a bound on the energy charged after each time step (see
+    aggregate_parameter_values)
+
+    :param nbr_vehicle: number of virtual batteries
+    :param horizon_length: horizon length [time steps]
+    :return:
+        prob: CVXPY Problem
+        parameters: parameters of the problem, indexed by name
+    """
+
+    prob, parameters = build_evcsp_lp(nbr_vehicle=nbr_vehicle, horizon_length=horizon_length)
+    param_energy_after = cp.Parameter(shape=(horizon_length, nbr_vehicle), nonneg=True, name="Energy After")
+
+    # Energy charged after t = total energy charged - SOE[t], with the total energy charged written with the SOE
+    # dynamics (soe[0] = 0, up to soe[horizon_length - 2]) to keep the constraint sparse
+    soe, power_charging = prob.var_dict["SOE"], prob.var_dict["Charging Power"]
+    energy_end = soe[horizon_length - 2:horizon_length - 1, :] + parameters["Charging Factor"] * cp.sum(
+        power_charging[horizon_length - 2:, :], axis=0, keepdims=True
+    )
+    ctr_energy_after = np.ones((horizon_length, 1)) @ energy_end - soe <= param_energy_after
+
+    prob = cp.Problem(prob.objective, prob.constraints + [ctr_energy_after])
+    parameters = {param.name(): param for param in prob.parameters()}
+
+    return prob, parameters
+
+
+def aggregate_parameter_values(values: Dict, cluster: np.ndarray, energy_room: np.ndarray) -> Dict:
+    """
+    Parameter values of the virtual batteries of the clusters (see build_evcsp_aggregate). The SOE of a virtual
+    battery is the energy charged to its vehicles since the start of the horizon. Its envelope:
+        - power: sum of the maximum powers of the vehicles parked at each time step,
+        - SOE upper bound: sum of the energies the vehicles can have received before each time step (at nominal
+          power since arrival), capped by their required energy and battery headroom,
+        - energy after each time step: sum of the energies the vehicles can still receive (at nominal power until
+          departure), capped in the same way. Without it, the energy of the vehicles leaving early could be charged
+          to the vehicles leaving late,
+        - required energy: sum of the required energies, with the unsatisfied energy penalty of the vehicles
+          averaged (weighted by required energy).
+
+    :param values: parameter values of the vehicles (see evcsp_parameter_values)
+    :param cluster: cluster of each vehicle (see cluster_vehicles)
+    :param energy_room: energy the vehicles can receive: min(required energy, capacity - initial SOE) [kWh]
+    :return: parameter values of the clusters
+    """
+
+    n_clusters = int(cluster.max(initial=-1)) + 1
+    membership = np.zeros((len(cluster), n_clusters))
+    membership[np.arange(len(cluster)), cluster] = 1.
+
+    energy_before = values["Charging Factor"] * (np.cumsum(values["Power Max"], axis=0) - values["Power Max"])
+    energy_after = values["Charging Factor"] * np.cumsum(values["Power Max"][::-1], axis=0)[::-1]
+    required_energy = values["Required Energy"] @ membership
+    weighted_penalty = (values["Unsatisfied Weight"] * values["Required Energy"]) @ membership
+    power_max = values["Power Max"] @ membership
+
+    return {
+        **values,
+        "Parked": (power_max > 0).astype(float),
+        "Power Max": power_max,
+        "SOE Lower": np.zeros_like(power_max),
+        "SOE Upper": np.minimum(energy_before, energy_room[None, :]) @ membership,
+        "Energy After": np.minimum(energy_after, energy_room[None, :]) @ membership,
+        "Required Energy": required_energy,
+        "Unsatisfied Weight": np.where(
+            required_energy > 0, weighted_penalty / np.maximum(required_energy, 1e-12),
+            (values["Unsatisfied Weight"] @ membership) / np.maximum(membership.sum(axis=0), 1.)
+        ),
+    }
+
+
+def disaggregate(
+        cluster_power: np.ndarray, cluster: np.ndarray, power_max: np.ndarray, energy_room: np.ndarray,
+        departure_idx: List[int], charging_factor: float, allocator: str = "llf"
+) -> np.ndarray:
+    """
+    Split the power of each cluster between its vehicles, time step by time step (vectorized over vehicles). A vehicle
+    receives at most its maximum power and the power to charge its remaining energy. The power of a cluster above
+    what its vehicles can receive is dropped.
+
+    :param cluster_power: (horizon_length, n_clusters) power of the clusters [kW]
+    :param cluster: cluster of each vehicle
+    :param power_max: (horizon_length, nbr_vehicle) maximum power of the vehicles (0 outside of the parking window)
+    :param energy_room: energy the vehicles can receive [kWh]
+    :param departure_idx: index of departure time
+    :param charging_factor: charging efficiency * time step [h]
+    :param allocator: "llf" (least laxity first within a cluster), "edf" (earliest departure first) or
+        "proportional" (to the power each vehicle can receive)
+    :return: (horizon_length, nbr_vehicle) power of the vehicles [kW]
+    """
+
+    if allocator not in ("llf", "edf", "proportional"):
+        raise ValueError(f"Invalid allocator {allocator}, must be llf, edf or proportional")
+
+    horizon_length, nbr_vehicle = power_max.shape
+    n_clusters = cluster_power.shape[1]
+    departure = np.asarray(departure_idx, dtype=float)
+    power_nom = np.maximum(power_max.max(axis=0), 1e-12)
+    remaining = np.asarray(energy_room, dtype=float).copy()
+    power = np.zeros((horizon_length, nbr_vehicle))
+
+    for t in range(horizon_length):
+        receivable = np.minimum(power_max[t], np.maximum(remaining, 0) / charging_factor)
+        if allocator == "proportional":
+            total = np.bincount(cluster, weights=receivable, minlength=n_clusters)
+            share = np.minimum(1., cluster_power[t] / np.maximum(total, 1e-12))
+            allocated = receivable * share[cluster]
+        else:
+            # Laxity: number of time steps the vehicle can still wait before charging at nominal power until departure
+            key = departure if allocator == "edf" else departure - t - remaining / (charging_factor * power_nom)
+            # Vehicles sorted by cluster then priority, each one receiving the power left by the previous ones
+            order = np.lexsort((key, cluster))
+            cluster_sorted, receivable_sorted = cluster[order], receivable[order]
+            cumulative = np.cumsum(receivable_sorted)
+            first = np.searchsorted(cluster_sorted, np.arange(n_clusters))
+            offset = np.concatenate([[0.], cumulative])[first][cluster_sorted]
+            allocated = np.empty(nbr_vehicle)
+            allocated[order] = np.clip(
+                cluster_power[t, cluster_sorted] - (cumulative - receivable_sorted - offset), 0, receivable_sorted
+            )
+
+        power[t] = allocated
+        remaining -= charging_factor * allocated
+
+    return power
+
+
+def evcsp_aggregate(
+        nbr_vehicle: int, arrival_idx: List[int], departure_idx: List[int], power_nom: List[int],
+        required_energy: List[int], capacity_nom: List[float], soe_init: List[float], p_max_infra: float | List[float],
+        horizon_length: int, time_step: int = 900, solver_options: dict = None, prices=None,
+        efficiency_charging: float = 0.9
+) -> tuple[np.ndarray, np.ndarray, Dict]:
+    """
+    Aggregate-then-disaggregate version of the LP EVCSP, for large fleets: the vehicles are clustered by window,
+    power and penalty (see cluster_vehicles) into virtual batteries (see aggregate_parameter_values), the LP of the virtual
+    batteries is solved (its size only depends on the number of clusters), and the power of each cluster is split
+    between its vehicles (see disaggregate). The plan is feasible but not optimal: compare it with the LP with
+    aggregation_quality.
+
+    :param nbr_vehicle: number of vehicles / terminal considered in the horizon
+    :param arrival_idx: index of arrival time
+    :param departure_idx: index of departure time
+    :param power_nom: nominal power of each vehicle [kW]
+    :param required_energy: energy demand for each vehicle [kWh]
+    :param capacity_nom: nominal capacity for each vehicle [kWh]
+    :param soe_init: Initial SOE of vehicles at arrival [kWh]
+    :param p_max_infra: max power profile for the station [kW]
+    :param horizon_length: horizon length [time steps]
+    :param time_step: [seconds]
+    :param solver_options: options of the LP (see evcsp_lp), and of the aggregation: "n_clusters" (default
+        DEFAULT_N_CLUSTERS), "allocator" (see disaggregate, default "llf") and "seed" of the clustering
+    :param prices: contain prices information for the optimization problem
+    :param efficiency_charging: charging efficiency (on the scale of 1, not 100%)
+    :return:
+        activation_profile: charging indicators profile (1 for charging, 0 for not charging)
+        power_profile: power charging profile
+        result: status of the LP of the clusters, objective of the plan (see evcsp_objective) and of the LP of the
+            clusters, number of clusters, unserved energy [kWh], solving time and time of each phase
+    """
+
+    solver_options = solver_options or {}
+    n_clusters = solver_options.get("n_clusters", DEFAULT_N_CLUSTERS)
+    allocator = solver_options.get("allocator", "llf")
+    options = {k: v for k, v in solver_options.items() if k not in AGGREGATION_OPTIONS}
+
+    start_time = time.perf_counter()
+    timer = PhaseTimer()
+    with timer.phase("input"):
+        values = evcsp_parameter_values(
+            arrival_idx=arrival_idx, departure_idx=departure_idx, power_nom=power_nom,
+            required_energy=required_energy, capacity_nom=capacity_nom, soe_init=soe_init, p_max_infra=p_max_infra,
+            horizon_length=horizon_length, time_step=time_step, prices=prices, efficiency_charging=efficiency_charging
+        )
+        energy_room = np.minimum(
+            values["Required Energy"], np.asarray(capacity_nom, dtype=float) - np.asarray(soe_init, dtype=float)
+        )
+        cluster = cluster_vehicles(
+            arrival_idx, departure_idx, power_nom, values["Unsatisfied Weight"], n_clusters=n_clusters,
+            seed=solver_options.get("seed", 0)
+        )
+        cluster_values = aggregate_parameter_values(values, cluster, energy_room)
+
+    n_clusters = len(cluster_values["Required Energy"])
+    logger.info(f"Aggregation of {nbr_vehicle} vehicles into {n_clusters} virtual batteries")
+
+    _, cluster_power, cluster_result = solve_evcsp(
+        "aggregate", cluster_values, nbr_vehicle=n_clusters, horizon_length=horizon_length, solver_options=options,
+        timer=timer, builder=build_evcsp_aggregate
+    )
+
+    with timer.phase("disaggregation"):
+        power_profile = disaggregate(
+            cluster_power, cluster, values["Power Max"], energy_room, departure_idx, values["Charging Factor"],
+            allocator=allocator
+        )
+
+    charged = values["Charging Factor"] * power_profile.sum(axis=0)
+    result = {
+        "status": cluster_result.status,
+        "objective": evcsp_objective(power_profile, values),
+        "aggregate_objective": cluster_result.objective,
+        "n_clusters": n_clusters,
+        "unserved_energy": float(np.clip(values["Required Energy"] - charged, 0, None).sum()),
+        "nbr_vehicle": nbr_vehicle,
+        "horizon_length": horizon_length,
+        "solve_time": time.perf_counter() - start_time,
+        "telemetry": timer.phases,
+    }
+
+    return power_profile > 0, power_profile, result
+
+
+def aggregation_quality(solver_options: dict = None, **inputs) -> Dict:
+    """
+    Quality loss of the aggregate planner (see evcsp_aggregate) against the full LP (see evcsp_lp) on the same
+    instance: objective of both plans (see evcsp_objective), relative gap, unserved energy and solving times
+
+    :param solver_options: options of the planners (see evcsp_aggregate)
+    :param inputs: other arguments of the planners (see evcsp_lp)
+    :return: report
+    """
+
+    solver_options = solver_options or {}
+    _, _, aggregate = evcsp_aggregate(**inputs, solver_options=solver_options)
+
+    start_time = time.perf_counter()
+    _, power_lp, result_lp = evcsp_lp(
+        **inputs, solver_options={k: v for k, v in solver_options.items() if k not in AGGREGATION_OPTIONS}
+    )
+    time_lp = time.perf_counter() - start_time
+
+    values = evcsp_parameter_values(**{k: v for k, v in inputs.items() if k != "nbr_vehicle"})
+    objective_lp = evcsp_objective(power_lp, values)
+    charged_lp = values["Charging Factor"] * power_lp.sum(axis=0)
+
+    report = {
+        "nbr_vehicle": inputs["nbr_vehicle"],
+        "n_clusters": aggregate["n_clusters"],
+        "objective_aggregate": aggregate["objective"],
+        "objective_lp": objective_lp,
+        "gap": (aggregate["objective"] - objective_lp) / max(abs(objective_lp), 1e-9),
+        "unserved_energy_aggregate": aggregate["unserved_energy"],
+        "unserved_energy_lp": float(np.clip(values["Required Energy"] - charged_lp, 0, None).sum()),
+        "time_aggregate": aggregate["solve_time"],
+        "time_lp": time_lp,
+        "status_lp": result_lp.status,
+    }
+    logger.info(f"Aggregation quality: {report}")
+
+    return report
@@ -0,0 +1,195 @@
+# capacity_sweep.py
+# Parametric sweep of the station capacity, and cached frontier of plans / KPIs per capacity level
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List
+import cvxpy as cp
+import numpy as np
+import pandas as pd
+from core.planner.day_ahead_planner import demand_inputs, plan_vehicles
+from core.planner.decomposition import result_summary
+from core.planner.solver_selection import instance_features, resolve_auto
+from core.utility.kpi.eval_performance import compute_energetic_kpi
+from core.utility.logger.custom_loggers import setup_logger
+
+logger = setup_logger(__name__)
+
+# Formulations whose compiled problem is cached and which accept a previous plan as a warm start
+WARM_START_FORMULATIONS = ("lp", "milp")
+
+
+class FrontierCache:
+    """
+    LRU cache of capacity frontiers, keyed on the demand (content hash), the capacity levels and the planner options
+    """
+
+    def __init__(self, maxsize: int = 16):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Dict | None:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: Hashable, frontier: Dict) -> None:
+        with self._lock:
+            self._entries[key] = frontier
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits, self.misses = 0, 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+frontier_cache = FrontierCache()
+
+
+def capacity_sweep(
+        capacities: List[float] | np.ndarray, formulation: str = "lp", backend: str = "cvxpy",
+        solver_options: dict = None, **inputs
+) -> Dict:
+    """
+    Solve the same demand for a grid of station capacities (p_max_infra), by increasing capacity.
+
+    With the CVXPY backend, all levels share the compiled problem of the formulation (only the station capacity
+    parameter changes), and the plan of a level, which is feasible for any larger capacity, is the warm start of the
+    next level (for the solvers supporting warm starts).
+
+    :param capacities: capacity levels [kW]
+    :param formulation: optimization formulation (see day_ahead_planner.plan_vehicles)
+    :param backend: "cvxpy" or "highs"
+    :param solver_options: solver options of the planner
+    :param inputs: other arguments of the planner (see evcsp_lp), except p_max_infra
+    :return: frontier with the sorted capacity levels, the stacked (n_levels, horizon_length, nbr_vehicle)
+        activation and power profiles, the objective and summary of each level and the total solving time
+    """
+
+    solver_options = dict(solver_options or {})
+    capacities = np.unique(np.asarray(capacities, dtype=float))
+    warm_start = formulation in WARM_START_FORMULATIONS and backend == "cvxpy"
+    # The CVXPY interface of HiGHS densifies the constraint matrix when warm started
+    solver_options.setdefault("warm_start", warm_start and solver_options.get("solver", cp.CLARABEL) != cp.HIGHS)
+
+    start_time = time.time()
+    activations, powers, summaries = [], [], []
+    for capacity in capacities:
+        options = {**solver_options, "initial_power": powers[-1]} if warm_start and powers else solver_options
+        activation_profile, power_profile, result = plan_vehicles(
+            formulation=formulation, backend=backend, **inputs, p_max_infra=capacity, solver_options=options
+        )
+        activations.append(np.asarray(activation_profile) > 0)
+        powers.append(np.asarray(power_profile, dtype=float))
+        summaries.append(result_summary(result))
+
+    frontier = {
+        "capacity": capacities,
+        "activation": np.stack(activations),
+        "power": np.stack(powers),
+        "objective": np.array([np.nan if s["objective"] is None else s["objective"] for s in summaries]),
+        "levels": summaries,
+        "solve_time": time.time() - start_time,
+    }
+    logger.info(f"Capacity sweep of {len(capacities)} levels in {round(frontier['solve_time'], 3)} seconds")
+
+    return frontier
+
+
+def capacity_frontier(
+        data_demand: pd.DataFrame, capacities: List[float] | np.ndarray, horizon_length: int, time_step: int,
+        formulation: str = "lp", solver_options: dict = None, prices_data: dict = None, vehicle_data: dict = None,
+        backend: str = "cvxpy"
+) -> Dict:
+    """
+    Frontier of the charging plans and station KPIs of a demand for a grid of capacities (see capacity_sweep),
+    stored in frontier_cache: the sweep is run once per demand, capacity grid and planner options.
+
+    :param data_demand: charging demand data (arrivalTime and departureTime as time step indices)
+    :param capacities: capacity levels [kW]
+    :param horizon_length: length of horizon [time steps]
+    :param time_step: time step [seconds]
+    :param formulation: optimization formulation (see day_ahead_planner.plan_vehicles)
+    :param solver_options: solver options of the planner
+    :param prices_data: prices (buy/sell prices of energy/power) for the optimization problem
+    :param vehicle_data: vehicle data (charging efficiency)
+    :param backend: "cvxpy", "highs" or "auto" (see create_charging_plans)
+    :return: frontier of capacity_sweep, with the station KPIs of each level ("kpi"), the demand and the time step
+    """
+
+    vehicle_data = vehicle_data or {"efficiency_charging": 0.9}
+    key = (
+        int(pd.util.hash_pandas_object(data_demand, index=False).sum()),
+        tuple(np.unique(np.asarray(capacities, dtype=float))), horizon_length, time_step, formulation, backend,
+        repr(sorted((solver_options or {}).items())), repr(prices_data), repr(sorted(vehicle_data.items())),
+    )
+    frontier = frontier_cache.get(key)
+    if frontier is not None:
+        return frontier
+
+    if backend == "auto" or (solver_options or {}).get("solver") == "auto":
+        formulation, backend, solver_options, _ = resolve_auto(
+            formulation, backend, solver_options, features=instance_features(
+                len(data_demand), data_demand["arrivalTime"], data_demand["departureTime"], horizon_length
+            )
+        )
+
+    frontier = capacity_sweep(
+        capacities, formulation=formulation, backend=backend, solver_options=solver_options,
+        nbr_vehicle=len(data_demand), horizon_length=horizon_length, time_step=time_step, prices=prices_data,
+        efficiency_charging=vehicle_data["efficiency_charging"], **demand_inputs(data_demand)
+    )
+    frontier["kpi"] = [
+        compute_energetic_kpi(
+            power_profiles=power_profile, power_grid=capacity, planning_input=data_demand, time_step=time_step
+        )[0]
+        for capacity, power_profile in zip(frontier["capacity"], frontier["power"])
+    ]
+    frontier["demand"] = data_demand
+    frontier["time_step"] = time_step
+    frontier_cache.put(key, frontier)
+
+    return frontier
+
+
+def frontier_plan(frontier: Dict, capacity: float) -> tuple[np.ndarray, np.ndarray, Dict] | None:
+    """
+    Plan of a capacity from a frontier: the plan of the level if capacity is a level of the frontier, otherwise the
+    linear interpolation of the plans of the two neighbouring levels. Only the station limit depends on the
+    capacity, so the interpolation of two LP plans is feasible for the interpolated capacity (not necessarily
+    optimal).
+
+    :param frontier: frontier of capacity_frontier
+    :param capacity: station capacity [kW]
+    :return: activation profile, power profile and station KPIs, None if capacity is outside the frontier
+    """
+
+    levels = frontier["capacity"]
+    if not levels[0] <= capacity <= levels[-1]:
+        return None
+
+    k = int(np.searchsorted(levels, capacity))
+    if np.isclose(levels[k], capacity):
+        return frontier["activation"][k], frontier["power"][k], frontier["kpi"][k]
+
+    weight = (capacity - levels[k - 1]) / (levels[k] - levels[k - 1])
+    power_profile = (1 - weight) * frontier["power"][k - 1] + weight * frontier["power"][k]
+    kpi_station, _ = compute_energetic_kpi(
+        power_profiles=power_profile, power_grid=capacity, planning_input=frontier["demand"],
+        time_step=frontier["time_step"]
+    )
+
+    return power_profile > 0, power_profile, kpi_station
@@ -1,11 +1,25 @@
 # day_ahead_planner.py
 # Translate real charging demand data to optimization input file
-from typing import List
+import time
+from functools import partial
+from typing import Dict, List
 from matplotlib import pyplot as plt
 import numpy as np
 import pandas as pd
-import cvxpy as cp
+from core.planner.admm import evcsp_admm
+from core.planner.aggregation import evcsp_aggregate
+from core.planner.decomposition import solve_blocks
+from core.planner.heuristics import evcsp_heuristic
+from core.planner.network_flow import evcsp_flow
 from core.planner.optimization import evcsp_milp, evcsp_lp
+from core.planner.plan_result import PlanResult
+from core.planner.portfolio import evcsp_race
+from core.planner.presolve import evcsp_presolved
+from core.planner.relaxation import evcsp_milp_relaxed
+from core.planner.scenarios import perturb_demand, solve_scenarios
+from core.planner.solver_selection import DEFAULT_SOLVER_OPTIONS, instance_features, resolve_auto
+from core.planner.sparse_backend import evcsp_sparse
+from core.planner.telemetry import planning_record, publish
 from core.utility.data.data_processor import generate_demand_data, prepare_planning_data
 from core.utility.kpi.eval_performance import compute_energetic_kpi
 from core.utility.logger.custom_loggers import setup_logger
@@ -16,71 +30,167 @@ plt.rcParams["figure.figsize"] = (20, 12)
 logger = setup_logger(__name__)
 
 
+def plan_vehicles(
+        formulation: str = "milp", backend: str = "cvxpy", presolve: bool = False, **inputs
+) -> tuple[np.ndarray, np.ndarray, object]:
+    """
+    Call the EVCSP planner of the given formulation and backend (see create_charging_plans), and publish the
+    telemetry of the call (time of each phase, solver statistics and model size, see telemetry.publish)
+
+    :param formulation: optimization formulation, either "milp", "milp_relaxed", "lp", "flow", "admm", "aggregate"
+        or "heuristic"
+    :param backend: "cvxpy" or "highs"
+    :param presolve: if True, the "lp" and "milp" formulations are solved after a presolve (trivial sessions fixed
+        and identical vehicles merged into cohorts, see presolve.presolve)
+    :param inputs: arguments of the planner (see evcsp_lp). With solver_options["solver"] = "race", the "lp" or
+        "milp" formulation is solved by a race of solvers (see portfolio.evcsp_race)
+    :return: activation profiles, power profiles and the third output of the planner
+    """
+
+    start_time = time.perf_counter()
+    if (inputs.get("solver_options") or {}).get("solver") == "race":
+        planner = partial(evcsp_race, formulation=formulation)
+    elif formulation == "heuristic":
+        planner = evcsp_heuristic
+    elif formulation == "flow":
+        planner = evcsp_flow
+    elif formulation == "admm":
+        planner = evcsp_admm
+    elif formulation == "aggregate":
+        planner = evcsp_aggregate
+    elif formulation == "milp_relaxed":
+        planner = evcsp_milp_relaxed
+    elif backend == "highs":
+        planner = partial(evcsp_sparse, integral=(formulation == "milp"))
+    elif formulation == "milp":
+        planner = evcsp_milp
+    elif formulation == "lp":
+        planner = evcsp_lp
+    else:
+        raise ValueError(
+            f"Invalid formulation {formulation}, must be milp, milp_relaxed, lp, flow, admm, aggregate or heuristic"
+        )
+
+    if presolve and formulation in ("lp", "milp"):
+        planner = partial(evcsp_presolved, planner)
+
+    activation_profile, power_profile, result = planner(**inputs)
+    publish(planning_record(formulation, backend, inputs, result, total=time.perf_counter() - start_time))
+
+    return activation_profile, power_profile, result
+
+
+def demand_inputs(data_demand: pd.DataFrame) -> dict:
+    """
+    Vehicle inputs of the planners (see evcsp_lp) from charging demand data
+
+    :param data_demand: charging demand data (arrivalTime and departureTime as time step indices)
+    :return: arrival_idx, departure_idx, power_nom, required_energy, capacity_nom and soe_init
+    """
+
+    return {
+        "arrival_idx": data_demand.loc[:, "arrivalTime"].tolist(),
+        "departure_idx": data_demand.loc[:, "departureTime"].tolist(),
+        "power_nom": data_demand.loc[:, "powerNom"].tolist(),
+        "required_energy": data_demand.loc[:, "energyRequired"].tolist(),
+        "capacity_nom": data_demand.loc[:, "energyMax"].tolist(),
+        "soe_init": data_demand.loc[:, "arrivalSOE"].tolist(),
+    }
+
+
 def create_charging_plans(
-        data_demand: pd.DataFrame, horizon_length: int, time_step: int,
-        nbr_vehicle: int, capacity_grid: float | List[float] | np.ndarray, n_sols: int,
+        data_demand: pd.DataFrame | List[pd.DataFrame], horizon_length: int, time_step: int,
+        nbr_vehicle: int, capacity_grid: float | List[float] | np.ndarray, n_sols: int = 1,
         formulation: str = "milp", solver_options: dict = None,
-        prices_data: dict = None, vehicle_data: dict = None,
-) -> tuple[np.ndarray, np.ndarray, cp.Problem]:
+        prices_data: dict = None, vehicle_data: dict = None, backend: str = "cvxpy", n_jobs: int = 1,
+        perturbation: dict = None, presolve: bool = False,
+) -> tuple[np.ndarray, np.ndarray, PlanResult | Dict]:
 
     """
         Return the charging plans of all vehicles
 
-    :param solver_options:
-    :param formulation: optimization formulation, either "milp" or "lp"
-    :param data_demand: charging demand data
+    :param solver_options: solver options of the planner. The solver "race" solves the "lp" or "milp" formulation
+        with several solvers in parallel and keeps the first good answer (see portfolio.evcsp_race)
+    :param formulation: optimization formulation, either "milp", "milp_relaxed" (LP relaxation and repair), "lp",
+        "flow" (network-flow engine for the LP, optimal up to its flow resolution), "admm" (distributed LP for very
+        large fleets), "aggregate" (LP of clusters of vehicles split back to the vehicles, for very large fleets) or
+        "heuristic"
+    :param data_demand: charging demand data, or a list of demand scenarios (same vehicles in each scenario)
     :param horizon_length: length of horizon [time steps]
     :param time_step: time step [seconds]
     :param nbr_vehicle: number of vehicles
     :param capacity_grid: grid capacity [kW]
-    :param n_sols:
+    :param n_sols: number of demand scenarios. If greater than 1 (or if data_demand is a list), the plans of
+        n_sols perturbations of data_demand (see scenarios.perturb_demand, the first one is data_demand) are solved
+        in a pool of n_jobs processes. Profiles are then stacked in (n_sols, horizon_length, nbr_vehicle) arrays and
+        the third output is a dictionary with the summary of each scenario (see scenarios.solve_scenarios)
     :param prices_data: prices (buy/sell prices of energy/power) for the optimization problem
     :param vehicle_data: vehicle data (charging efficiency, discharging efficiency)
+    :param backend: "cvxpy" (model built with CVXPY, solver given in solver_options), "highs" (sparse matrices
+        given directly to HiGHS, the third output is then a scipy OptimizeResult) or "auto". With "auto", the
+        fastest planner of the formulation ("lp" or "milp") is selected from the persisted cost model (see
+        solver_selection.select_candidate), among the CVXPY solvers, the HiGHS backend and the decomposition. With
+        the "cvxpy" backend and solver_options["solver"] = "auto", the fastest CVXPY solver is selected
+    :param n_jobs: if not 1, vehicles are split into independent blocks (no overlapping parking windows), solved in
+        a pool of n_jobs processes (-1 for all cores). The third output is then a dictionary with the status and
+        objective of the whole problem, and a summary of each block (see decomposition.solve_blocks)
+    :param perturbation: arguments of scenarios.perturb_demand (arrival_std, departure_std, energy_std, seed)
+    :param presolve: if True, trivial sessions are fixed and identical vehicles merged into cohorts before the solve
+        of the "lp" and "milp" formulations (see presolve.presolve). Off by default: the size of the reduced problem
+        changes from one demand to the next, so each size compiles its own cached problem (see problem_cache)
     :return:
         profile: charging profile of individual vehicles [kW]
         totalPowerProfile: total charging profiles of all vehicles [kW]
+        result: a PlanResult for the CVXPY planners (plan arrays, objective breakdown and solver statistics, without
+            the CVXPY problem, see plan_result.PlanResult), the result of the planner otherwise
     """
 
-    if nbr_vehicle == len(data_demand):
-        logger.info("Planner called")
+    if isinstance(data_demand, list):
+        scenarios = data_demand
+    elif n_sols > 1:
+        scenarios = perturb_demand(
+            data_demand, n_scenarios=n_sols, horizon_length=horizon_length, **(perturbation or {})
+        )
     else:
-        logger.error(f"Number of vehicles: {nbr_vehicle} but data length is {len(data_demand)}")
-
-    # Data preparation
-    arrival = data_demand.loc[:, "arrivalTime"].tolist()
-    departure = data_demand.loc[:, "departureTime"].tolist()
-    power = data_demand.loc[:, "powerNom"].tolist()
-    # duration = data_demand.loc[:, "chargingDuration"].tolist()
-    energy_required = data_demand.loc[:, "energyRequired"].tolist()
-    energy_max = data_demand.loc[:, "energyMax"].tolist()
-    soe_arrival = data_demand.loc[:, "arrivalSOE"].tolist()
+        scenarios = None
 
-    # assert all((np.array(departure) - np.array(arrival) - duration) >= 0), \
-    #     "Charging duration must be shorter than parking time"
+    first_demand = scenarios[0] if scenarios else data_demand
+    n_demand = len(first_demand)
+    if nbr_vehicle == n_demand:
+        logger.info("Planner called")
+    else:
+        logger.error(f"Number of vehicles: {nbr_vehicle} but data length is {n_demand}")
 
     if vehicle_data is None:
         vehicle_data = {"efficiency_charging": 0.9}
 
+    if backend == "auto" or (solver_options or {}).get("solver") == "auto":
+        formulation, backend, solver_options, auto_jobs = resolve_auto(
+            formulation, backend, solver_options, features=instance_features(
+                nbr_vehicle, first_demand["arrivalTime"], first_demand["departureTime"], horizon_length
+            )
+        )
+        n_jobs = n_jobs if scenarios else auto_jobs
+
     # Calling the EVCSP planner: either CP (constraint programming), MILP or Heuristics.
     # profile, totalPowerProfile = EVCSP(data_mobility, horizon_length, 'CP')
+    inputs = {
+        "nbr_vehicle": nbr_vehicle, "p_max_infra": capacity_grid, "horizon_length": horizon_length,
+        "time_step": time_step, "solver_options": solver_options, "prices": prices_data,
+        "efficiency_charging": vehicle_data["efficiency_charging"],
+    }
+    solve = partial(plan_vehicles, formulation=formulation, backend=backend, presolve=presolve)
 
-    if formulation == "milp":
-        activation_profiles, power_profiles, evcsp = evcsp_milp(
-            nbr_vehicle=nbr_vehicle, arrival_idx=arrival, departure_idx=departure, power_nom=power,
-            required_energy=energy_required, capacity_nom=energy_max, soe_init=soe_arrival, p_max_infra=capacity_grid,
-            horizon_length=horizon_length, time_step=time_step, solver_options=solver_options,
-            efficiency_charging=vehicle_data["efficiency_charging"], prices=prices_data
+    if scenarios:
+        activation_profiles, power_profiles, evcsp = solve_scenarios(
+            solve=solve, scenario_inputs=[{**inputs, **demand_inputs(s)} for s in scenarios], n_jobs=n_jobs
         )
-
-
-    elif formulation == "lp":
-
-        activation_profiles, power_profiles, evcsp = evcsp_lp(
-            nbr_vehicle=nbr_vehicle, arrival_idx=arrival, departure_idx=departure, power_nom=power,
-            required_energy=energy_required, capacity_nom=energy_max, soe_init=soe_arrival, p_max_infra=capacity_grid,
-            horizon_length=horizon_length, time_step=time_step, solver_options=solver_options,
-            prices=prices_data, efficiency_charging=vehicle_data["efficiency_charging"]
-            )
+    elif n_jobs != 1:
+        activation_profiles, power_profiles, evcsp = solve_blocks(
+            solve=solve, n_jobs=n_jobs, **inputs, **demand_inputs(data_demand)
+        )
+    else:
+        activation_profiles, power_profiles, evcsp = solve(**inputs, **demand_inputs(data_demand))
 
     return activation_profiles, power_profiles, evcsp
 
@@ -91,9 +201,8 @@ if __name__ == '__main__':
     time_step = 900         # [Seconds]
     horizon_length = 96     # [Time Step]
     capacity = 100          # [kW] grid capacity
-    n_sols = 250
-    solver_options_1 = {"solver": cp.CLARABEL, "time_limit": 60.0, "verbose": False, "warm_start": False}
-    solver_options_2 = {"solver": cp.SCIPY, "time_limit": 60.0, "verbose": False, "warm_start": False}
+    n_sols = 1
+    solver_options = {**DEFAULT_SOLVER_OPTIONS, "solver": "auto"}
 
     # Data Preparation
     data_mobility = generate_demand_data(
@@ -105,7 +214,7 @@ if __name__ == '__main__':
     activationProfiles, powerProfiles, prob = create_charging_plans(
         data_planning, horizon_length=horizon_length, time_step=time_step,
         nbr_vehicle=nVE, capacity_grid=capacity, n_sols=n_sols,
-        formulation="milp", solver_options=solver_options_2
+        formulation="milp", solver_options=solver_options
     )
 
     # KPI
@@ -116,13 +225,13 @@ if __name__ == '__main__':
         time_step=time_step
     )
 
-    print(prob.solver_stats)
+    print(prob)
     print(kpi_station)
 
     # _, _, prob2 = planner(
     #     data_planning, horizon_length=horizon_length, time_step=time_step,
     #     nbr_vehicle=nVE, capacity_grid=capacity, n_sols=n_sols,
-    #     formulation="lp", solver_options=solver_options_2
+    #     formulation="lp", solver_options=solver_options
     # )
     # print(prob2.solver_stats)
 
@@ -0,0 +1,140 @@
+# decomposition.py
+# Decomposition of the EVCSP into independent blocks of vehicles, solved in parallel
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List
+import numpy as np
+from scipy.optimize import OptimizeResult
+from core.planner.plan_result import PlanResult
+from core.utility.logger.custom_loggers import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def independent_blocks(
+        arrival_idx: List[int], departure_idx: List[int], horizon_length: int
+) -> List[tuple[np.ndarray, int, int]]:
+    """
+    Split vehicles into independent blocks: the station power limit only couples vehicles parked at the same time
+    step, so the blocks are the connected components of the overlapping parking windows [arrival, departure).
+
+    :param arrival_idx: index of arrival time
+    :param departure_idx: index of departure time
+    :param horizon_length: horizon length [time steps]
+    :return: for each block, sorted by start time: indices of its vehicles, first and last (excluded) time step
+    """
+
+    arrival = np.clip(np.asarray(arrival_idx, dtype=int), 0, horizon_length)
+    departure = np.clip(np.asarray(departure_idx, dtype=int), arrival, horizon_length)
+    order = np.argsort(arrival, kind="stable")
+
+    # Sweep: a new block starts when a vehicle arrives after all previous vehicles left
+    end_so_far = np.maximum.accumulate(departure[order])
+    new_block = np.ones(len(order), dtype=bool)
+    new_block[1:] = arrival[order][1:] >= end_so_far[:-1]
+    block_id = np.cumsum(new_block) - 1
+
+    blocks = []
+    for b in range(block_id[-1] + 1 if len(order) else 0):
+        vehicles = np.sort(order[block_id == b])
+        blocks.append((vehicles, int(arrival[vehicles].min()), int(departure[vehicles].max())))
+
+    return blocks
+
+
+def result_summary(result: PlanResult | OptimizeResult | Dict) -> Dict:
+    """
+    Picklable summary (status, objective, solving time) of the third output of a planner
+
+    :param result: PlanResult, scipy OptimizeResult or result dictionary
+    :return: summary
+    """
+
+    if isinstance(result, PlanResult):
+        return {"status": result.status, "objective": result.objective, "solve_time": result.solve_time}
+    if isinstance(result, OptimizeResult):
+        return {"status": "optimal" if result.success else result.message, "objective": result.fun, "solve_time": None}
+
+    return {k: result.get(k) for k in ("status", "objective", "solve_time")}
+
+
+def _solve_block(solve: Callable, inputs: Dict) -> tuple[np.ndarray, np.ndarray, Dict]:
+    activation_profile, power_profile, result = solve(**inputs)
+    return activation_profile, power_profile, result_summary(result)
+
+
+def solve_blocks(
+        solve: Callable, nbr_vehicle: int, arrival_idx: List[int], departure_idx: List[int], power_nom: List[int],
+        required_energy: List[int], capacity_nom: List[float], soe_init: List[float], p_max_infra: float | List[float],
+        horizon_length: int, n_jobs: int = -1, **kwargs
+) -> tuple[np.ndarray, np.ndarray, Dict]:
+    """
+    Solve the EVCSP block by block (see independent_blocks) in a process pool, and stitch the profiles together.
+
+    Each block is solved on its own time range, extended by two time steps (when possible) so that the SOE dynamics
+    cover the whole parking windows, as in the full horizon problem.
+
+    :param solve: planner with the signature of evcsp_lp, returning (activation, power, result). It must be
+        picklable (module level function or functools.partial of one)
+    :param nbr_vehicle: number of vehicles / terminal considered in the horizon
+    :param arrival_idx: index of arrival time
+    :param departure_idx: index of departure time
+    :param power_nom: nominal power of each vehicle [kW]
+    :param required_energy: energy demand for each vehicle [kWh]
+    :param capacity_nom: nominal capacity for each vehicle [kWh]
+    :param soe_init: Initial SOE of vehicles at arrival [kWh]
+    :param p_max_infra: max power profile for the station [kW]
+    :param horizon_length: horizon length [time steps]
+    :param n_jobs: number of processes (-1 for all cores, 1 to solve the blocks sequentially in this process)
+    :param kwargs: other arguments of solve (time_step, solver_options, prices, efficiency_charging)
+    :return:
+        activation_profile: charging indicators profile (1 for charging, 0 for not charging)
+        power_profile: power charging profile
+        result: status and objective of the whole problem, with the summary of each block
+    """
+
+    blocks = independent_blocks(arrival_idx, departure_idx, horizon_length)
+    p_max_infra = np.broadcast_to(np.asarray(p_max_infra, dtype=float), (horizon_length,))
+    vehicle_data = {
+        "arrival_idx": np.asarray(arrival_idx, dtype=int), "departure_idx": np.asarray(departure_idx, dtype=int),
+        "power_nom": np.asarray(power_nom), "required_energy": np.asarray(required_energy, dtype=float),
+        "capacity_nom": np.asarray(capacity_nom, dtype=float), "soe_init": np.asarray(soe_init, dtype=float),
+    }
+
+    block_inputs = []
+    for vehicles, start, end in blocks:
+        end = min(end + 2, horizon_length)
+        inputs = {name: values[vehicles].tolist() for name, values in vehicle_data.items()}
+        inputs["arrival_idx"] = (vehicle_data["arrival_idx"][vehicles] - start).tolist()
+        inputs["departure_idx"] = (vehicle_data["departure_idx"][vehicles] - start).tolist()
+        block_inputs.append({
+            **kwargs, **inputs, "nbr_vehicle": len(vehicles), "p_max_infra": p_max_infra[start:end].tolist(),
+            "horizon_length": end - start,
+        })
+
+    n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+    logger.info(f"{len(blocks)} independent blocks, solved with {min(n_jobs, len(blocks))} processes")
+
+    if n_jobs == 1 or len(blocks) <= 1:
+        outputs = [_solve_block(solve, inputs) for inputs in block_inputs]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(blocks))) as executor:
+            outputs = list(executor.map(_solve_block, [solve] * len(blocks), block_inputs))
+
+    activation_profile = np.zeros(shape=(horizon_length, nbr_vehicle), dtype=bool)
+    power_profile = np.zeros(shape=(horizon_length, nbr_vehicle), dtype=float)
+    for (vehicles, start, _), (activation_block, power_block, _) in zip(blocks, outputs):
+        end = start + power_block.shape[0]
+        activation_profile[start:end, vehicles] = activation_block > 0
+        power_profile[start:end, vehicles] = power_block
+
+    # The status of the whole problem is the first status of a block that is not optimal
+    summaries = [summary for _, _, summary in outputs]
+    objectives = [summary["objective"] for summary in summaries]
+    result = {
+        "status": next((s["status"] for s in summaries if s["status"] != "optimal"), "optimal"),
+        "objective": sum(objectives) if all(o is not None for o in objectives) else None,
+        "blocks": summaries,
+    }
+
+    return activation_profile, power_profile, result
@@ -0,0 +1,180 @@
+# heuristics.py
+# Fast priority-based heuristic planner (EDF / least laxity first, with valley filling) for very large fleets
+import time
+from typing import Dict, List
+import numpy as np
+from core.planner.optimization import evcsp_parameter_values, evcsp_objective
+from core.planner.sparse_backend import evcsp_sparse
+from core.utility.logger.custom_loggers import setup_logger
+
+logger = setup_logger(__name__)
+
+_EPSILON_ = 1e-9
+
+
+def _priority_order(
+        active: np.ndarray, t: int, departure_idx: np.ndarray, remaining: np.ndarray, power_nom: np.ndarray,
+        weight: np.ndarray, priority: str
+) -> np.ndarray:
+    """
+    Sort active vehicles by priority
+
+    :param active: indices of vehicles to sort
+    :param t: current time step
+    :param departure_idx: index of departure time
+    :param remaining: remaining charging need [kW * time steps]
+    :param power_nom: nominal power of each vehicle [kW]
+    :param weight: penalty of the unsatisfied energy of each vehicle [currency/kWh]
+    :param priority: "edf" (earliest deadline first), "llf" (least laxity first) or "weighted" (highest penalty of
+        unsatisfied energy first, then earliest deadline)
+    :return: active vehicles, the most urgent first
+    """
+
+    if priority == "llf":
+        # Laxity: number of time steps the vehicle can still wait before charging at nominal power until departure
+        key = (departure_idx[active] - t) - remaining[active] / np.maximum(power_nom[active], _EPSILON_)
+    elif priority == "edf":
+        key = departure_idx[active]
+    elif priority == "weighted":
+        return active[np.lexsort((departure_idx[active], -weight[active]))]
+    else:
+        raise ValueError(f"Invalid priority {priority}, must be edf, llf or weighted")
+
+    return active[np.argsort(key, kind="stable")]
+
+
+def _valley_filling(
+        power_profile: np.ndarray, mask_parked: np.ndarray, power_nom: np.ndarray, p_max_infra: np.ndarray,
+        order: np.ndarray
+) -> np.ndarray:
+    """
+    Spread the energy of each vehicle over the valleys of the station load (water filling), vehicle by vehicle.
+    The energy of each vehicle is kept, and the station power limit remains satisfied.
+
+    :param power_profile: (horizon_length, nbr_vehicle) feasible charging profile [kW]
+    :param mask_parked: parking windows (see availability_masks)
+    :param power_nom: nominal power of each vehicle [kW]
+    :param p_max_infra: max power profile for the station [kW]
+    :param order: order in which vehicles are processed
+    :return: new charging profile [kW]
+    """
+
+    power_profile = power_profile.copy()
+    load = power_profile.sum(axis=1)
+
+    for v in order:
+        window = np.flatnonzero(mask_parked[:, v])
+        energy = power_profile[window, v].sum()
+        if energy <= _EPSILON_:
+            continue
+
+        base = load[window] - power_profile[window, v]
+        upper = np.clip(np.minimum(power_nom[v], p_max_infra[window] - base), 0, None)
+
+        # Water level L such that sum(clip(L - base, 0, upper)) == energy: the filled quantity is piecewise
+        # linear in L, with breakpoints at base and base + upper
+        levels = np.sort(np.concatenate([base, base + upper]))
+        filled = np.clip(levels[:, None] - base[None, :], 0, upper[None, :]).sum(axis=1)
+        level = np.interp(energy, filled, levels)
+
+        power_v = np.clip(level - base, 0, upper)
+        power_profile[window, v] = power_v
+        load[window] = base + power_v
+
+    return power_profile
+
+
+def evcsp_heuristic(
+        nbr_vehicle: int, arrival_idx: List[int], departure_idx: List[int], power_nom: List[int],
+        required_energy: List[int], capacity_nom: List[float], soe_init: List[float], p_max_infra: float | List[float],
+        horizon_length: int, time_step: int = 900, solver_options: dict = None, prices=None,
+        efficiency_charging: float = 0.9
+) -> tuple[np.ndarray, np.ndarray, Dict]:
+    """
+    Heuristic version of EVCSP: at each time step, parked vehicles are charged at nominal power by priority
+    (earliest deadline or least laxity first) until the station power limit is reached. A valley filling pass
+    then flattens the station load. Runs in O(V.T) (up to the sort of the parked vehicles at each step).
+    Under congestion, the "weighted" priority follows the objective more closely than edf / llf, since the
+    penalty of unsatisfied energy is weighted by the inverse of the battery capacity.
+
+    :param nbr_vehicle: number of vehicles / terminal considered in the horizon
+    :param arrival_idx: index of arrival time
+    :param departure_idx: index of departure time
+    :param power_nom: nominal power of each vehicle [kW]
+    :param required_energy: energy demand for each vehicle [kWh]
+    :param capacity_nom: nominal capacity for each vehicle [kWh]
+    :param soe_init: Initial SOE of vehicles at arrival [kWh]
+    :param p_max_infra: max power profile for the station [kW]
+    :param horizon_length: horizon length [time steps]
+    :param time_step: [seconds]
+    :param solver_options: "priority" ("edf", "llf" or "weighted", default "edf"), "valley_filling" (default True)
+        and "compute_gap" (default False: if True, the LP lower bound is computed to report the optimality gap)
+    :param prices: contain prices information for the optimization problem
+    :param efficiency_charging: charging efficiency (on the scale of 1, not 100%)
+    :return:
+        activation_profile: charging indicators profile (1 for charging, 0 for not charging)
+        power_profile: power charging profile
+        result: objective, lower bound, gap and solving time
+    """
+
+    if solver_options is None:
+        solver_options = {}
+
+    priority = solver_options.get("priority", "edf")
+    logger.info(f"Heuristic Formulation with priority {priority}")
+
+    start_time = time.time()
+    parameter_values = evcsp_parameter_values(
+        arrival_idx=arrival_idx, departure_idx=departure_idx, power_nom=power_nom, required_energy=required_energy,
+        capacity_nom=capacity_nom, soe_init=soe_init, p_max_infra=p_max_infra, horizon_length=horizon_length,
+        time_step=time_step, prices=prices, efficiency_charging=efficiency_charging
+    )
+
+    mask_parked = parameter_values["Parked"] > 0
+    departure = np.asarray(departure_idx, dtype=int)
+    power_nom = np.asarray(power_nom, dtype=float)
+    weight = parameter_values["Unsatisfied Weight"]
+    p_max = np.clip(parameter_values["Peak Power Capacity"], 0, None)
+
+    # Remaining charging need [kW * time steps], limited by the battery capacity
+    headroom = np.clip(np.asarray(capacity_nom, dtype=float) - np.asarray(soe_init, dtype=float), 0, None)
+    remaining = np.minimum(parameter_values["Required Energy"], headroom) / parameter_values["Charging Factor"]
+
+    # Priority scheduling, time step by time step
+    power_profile = np.zeros(shape=(horizon_length, nbr_vehicle), dtype=float)
+    for t in range(horizon_length):
+        active = np.flatnonzero(mask_parked[t] & (remaining > _EPSILON_))
+        if not active.size:
+            continue
+
+        order = _priority_order(active, t, departure, remaining, power_nom, weight, priority)
+        desired = np.minimum(power_nom[order], remaining[order])
+        allocated = np.clip(p_max[t] - (np.cumsum(desired) - desired), 0, desired)
+
+        power_profile[t, order] = allocated
+        remaining[order] -= allocated
+
+    if solver_options.get("valley_filling", True):
+        order = np.argsort(departure, kind="stable")
+        power_profile = _valley_filling(power_profile, mask_parked, power_nom, p_max, order)
+
+    activation_profile = power_profile > 0
+    result = {
+        "status": "heuristic",
+        "objective": evcsp_objective(power_profile, parameter_values),
+        "solve_time": time.time() - start_time,
+    }
+    logger.info(f"Measured Solving Time: {round(result['solve_time'], 3)} seconds")
+
+    if solver_options.get("compute_gap", False):
+        _, _, lp_result = evcsp_sparse(
+            nbr_vehicle=nbr_vehicle, arrival_idx=arrival_idx, departure_idx=departure_idx, power_nom=power_nom,
+            required_energy=required_energy, capacity_nom=capacity_nom, soe_init=soe_init, p_max_infra=p_max_infra,
+            horizon_length=horizon_length, time_step=time_step, prices=prices,
+            efficiency_charging=efficiency_charging
+        )
+        result["lower_bound"] = lp_result.fun
+        result["gap"] = (result["objective"] - lp_result.fun) / max(abs(lp_result.fun), _EPSILON_)
+        logger.info(f"Optimality gap against the LP lower bound: {result['gap']:.2%}")
+
+    return activation_profile, power_profile, result
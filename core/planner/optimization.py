@@ -1,64 +1,212 @@
-import time
-from typing import List
+from typing import Callable, Dict, List
 import cvxpy as cp
 import numpy as np
+import scipy.sparse as sp
+from core.planner.plan_result import PlanResult
+from core.planner.scaling import condition_diagnostics, problem_scales, scale_parameter_values
+from core.planner.problem_cache import problem_cache
+from core.planner.solve_control import solve_problem
+from core.planner.telemetry import PhaseTimer
 from core.utility.logger.custom_loggers import setup_logger
 
 logger = setup_logger(__name__)
 
+PRICE_POWER_VIOLATION = 1e6     # [currency/kW] Penalty of the soft station power limit violation
+FEASIBILITY_TOLERANCE = 1e-6    # [kW] Violation of the power bounds above which a plan of the solver is repaired
+
 
 # TODO: TOU
 
 
-def evcsp_milp(
-        nbr_vehicle: int, arrival_idx: List[int], departure_idx: List[int], power_nom: List[int],
-        required_energy: List[int], capacity_nom: List[float], soe_init: List[float], p_max_infra: float | List[float],
-        horizon_length: int, time_step: int = 900, solver_options: dict = None, prices = None,
-        efficiency_charging: float = 0.9
-) -> tuple[np.ndarray, np.ndarray, cp.Problem]:
+def availability_masks(
+        arrival_idx: List[int], departure_idx: List[int], horizon_length: int
+) -> tuple[np.ndarray, np.ndarray]:
     """
-    MILP version of EVCSP
+    Boolean masks of the parking windows of all vehicles
+
+    :param arrival_idx: index of arrival time
+    :param departure_idx: index of departure time
+    :param horizon_length: horizon length [time steps]
+    :return:
+        mask_parked: mask_parked[t, v] is True if vehicle v is parked at time t, i.e. arrival <= t < departure
+        mask_before: mask_before[t, v] is True if vehicle v has not arrived yet at time t
+    """
+
+    time_idx = np.arange(horizon_length)[:, None]
+    arrival = np.asarray(arrival_idx, dtype=int)[None, :]
+    departure = np.asarray(departure_idx, dtype=int)[None, :]
+
+    mask_parked = (time_idx >= arrival) & (time_idx < departure)
+    mask_before = time_idx < arrival
+
+    return mask_parked, mask_before
+
+
+def shift_matrices(horizon_length: int) -> tuple[sp.csr_matrix, sp.csr_matrix]:
+    """
+    Sparse shift matrices of the SOE dynamics soe[t+1] = soe[t] + efficiency * power[t] * delta_t,
+    for t in [0, horizon_length - 2) as in the original per-vehicle formulation.
+
+    :param horizon_length: horizon length [time steps]
+    :return:
+        shift_next: (horizon_length - 2, horizon_length) matrix selecting the rows t+1
+        shift_current: (horizon_length - 2, horizon_length) matrix selecting the rows t
+    """
+
+    shift_next = sp.eye(horizon_length - 2, horizon_length, k=1, format="csr")
+    shift_current = sp.eye(horizon_length - 2, horizon_length, k=0, format="csr")
+
+    return shift_next, shift_current
+
+
+def evcsp_parameter_values(
+        arrival_idx: List[int], departure_idx: List[int], power_nom: List[int], required_energy: List[int],
+        capacity_nom: List[float], soe_init: List[float], p_max_infra: float | List[float], horizon_length: int,
+        time_step: int = 900, prices: dict = None, efficiency_charging: float = 0.9
+) -> Dict[str, np.ndarray | float]:
+    """
+    Values of the EVCSP parameters (see build_evcsp_lp and build_evcsp_milp), indexed by parameter names
 
-    :param nbr_vehicle: number of vehicles / terminal considered in the horizon
     :param arrival_idx: index of arrival time
     :param departure_idx: index of departure time
     :param power_nom: nominal power of each vehicle [kW]
+    :param required_energy: energy demand for each vehicle [kWh]
     :param capacity_nom: nominal capacity for each vehicle [kWh]
     :param soe_init: Initial SOE of vehicles at arrival [kWh]
-    :param required_energy: energy demand for each vehicle [kWh]
     :param p_max_infra: max power profile for the station [kW]
     :param horizon_length: horizon length [time steps]
     :param time_step: [seconds]
-    :param solver_options:
     :param prices: contain prices information for the optimization problem
     :param efficiency_charging: charging efficiency (on the scale of 1, not 100%)
-    :return:
-        power_profile: power charging profile
-        activation_profile: charging indicators profile (1 for charging, 0 for not charging)
-        prob: CVXPY Problem
+    :return: parameter values
     """
 
     if prices is None:
         prices = {"price_energy_buy": 0.13, "price_energy_sell": 0.13, "penalty_unsatisfied": 100}
 
-    assert required_energy <= capacity_nom, "Required Energy must not exceed nom capacity"
+    delta_t = time_step / 3600
+    capacity_nom = np.asarray(capacity_nom, dtype=float)
+    soe_init = np.asarray(soe_init, dtype=float)
+    mask_parked, mask_before = availability_masks(arrival_idx, departure_idx, horizon_length)
+
+    return {
+        "Parked": mask_parked.astype(float),
+        "Power Max": mask_parked * np.asarray(power_nom, dtype=float)[None, :],
+        "Power Nom Max": float(np.max(power_nom, initial=0.)),
+        "SOE Lower": mask_before * soe_init[None, :],
+        "SOE Upper": np.where(mask_before, soe_init[None, :], capacity_nom[None, :]),
+        "Required Energy": np.asarray(required_energy, dtype=float),
+        "Unsatisfied Weight": prices["penalty_unsatisfied"] / capacity_nom,
+        "Energy Price": prices["price_energy_buy"] * delta_t,
+        "Charging Factor": efficiency_charging * delta_t,
+        "Peak Power Capacity": np.broadcast_to(np.asarray(p_max_infra, dtype=float), (horizon_length, )).copy(),
+        "Violation Price": PRICE_POWER_VIOLATION,
+    }
+
+
+def evcsp_objective_terms(power_profile: np.ndarray, parameter_values: Dict) -> Dict[str, float]:
+    """
+    Terms of the EVCSP objective (see build_evcsp_lp) for a given charging profile
 
-    verbose = solver_options["verbose"]
-    warm_start = solver_options["warm_start"]
-    solver = solver_options["solver"]
-    other_options = {k: v for k, v in solver_options.items() if k not in ("solver", "verbose", "warm_start")}
+    :param power_profile: (horizon_length, nbr_vehicle) charging profile [kW]
+    :param parameter_values: parameter values (see evcsp_parameter_values)
+    :return: cost of the unsatisfied energy, of the energy and of the station power limit violation
+    """
 
-    logger.info(f"MILP Formulation with solver {solver}")
+    energy_charged = parameter_values["Charging Factor"] * power_profile.sum(axis=0)
+    soe_under = np.clip(parameter_values["Required Energy"] - energy_charged, 0, None)
+    power_peak_over = np.clip(
+        power_profile.sum(axis=1) - parameter_values["Peak Power Capacity"], 0, None
+    ).max(initial=0.)
+
+    return {
+        "unsatisfied": float(parameter_values["Unsatisfied Weight"] @ soe_under),
+        "energy": float(parameter_values["Energy Price"] * power_profile.sum()),
+        "peak_violation": float(parameter_values["Violation Price"] * power_peak_over),
+    }
+
+
+def evcsp_objective(power_profile: np.ndarray, parameter_values: Dict) -> float:
+    """
+    Value of the EVCSP objective (see build_evcsp_lp) for a given charging profile
+
+    :param power_profile: (horizon_length, nbr_vehicle) charging profile [kW]
+    :param parameter_values: parameter values (see evcsp_parameter_values)
+    :return: objective value
+    """
+
+    return sum(evcsp_objective_terms(power_profile, parameter_values).values())
 
-    # Additional Parameters
-    delta_t = time_step / 3600
-    price_energy_buy = prices["price_energy_buy"]           # [currency/kWh]
-    penalty_unsatisfied = prices["penalty_unsatisfied"]     # [currency/kWh] Penalty for unsatisfied energy
+
+def power_violation(power_profile: np.ndarray, parameter_values: Dict) -> float:
+    """
+    Largest violation of the power bounds (0 and nominal power within parking windows) and of the station power limit
+    by a charging profile
+
+    :param power_profile: (horizon_length, nbr_vehicle) charging profile [kW]
+    :param parameter_values: parameter values (see evcsp_parameter_values)
+    :return: violation [kW], 0 if the profile is feasible, inf if it has NaN values
+    """
+
+    if np.isnan(power_profile).any():
+        return np.inf
+
+    load = power_profile.sum(axis=1)
+    return float(max(
+        np.max(-power_profile, initial=0.),
+        np.max(power_profile - parameter_values["Power Max"], initial=0.),
+        np.max(load - np.clip(parameter_values["Peak Power Capacity"], 0, None), initial=0.),
+    ))
+
+
+def feasible_power_profile(power_profile: np.ndarray, parameter_values: Dict) -> np.ndarray:
+    """
+    Make a charging profile (e.g. a solver incumbent at the time limit) satisfy the power bounds: powers are clipped
+    to [0, nominal power] within parking windows, and scaled down at time steps above the station power limit.
+
+    :param power_profile: (horizon_length, nbr_vehicle) charging profile [kW]
+    :param parameter_values: parameter values (see evcsp_parameter_values)
+    :return: feasible charging profile [kW]
+    """
+
+    power_profile = np.clip(np.nan_to_num(power_profile), 0, parameter_values["Power Max"])
+    load = power_profile.sum(axis=1)
+    p_max = np.clip(parameter_values["Peak Power Capacity"], 0, None)
+    scale = np.where(load > p_max, p_max / np.maximum(load, 1e-12), 1.)
+
+    return power_profile * scale[:, None]
+
+
+def build_evcsp_milp(nbr_vehicle: int, horizon_length: int) -> tuple[cp.Problem, Dict[str, cp.Parameter]]:
+    """
+    Build the parametrized (DPP) MILP version of EVCSP. All demand-dependent data are parameters, so that the
+    problem only depends on (nbr_vehicle, horizon_length) and can be compiled once and re-solved.
+    Parameters only enter right-hand sides or scale variables as scalars, which keeps DPP compilation cheap.
+
+    :param nbr_vehicle: number of vehicles / terminal considered in the horizon
+    :param horizon_length: horizon length [time steps]
+    :return:
+        prob: CVXPY Problem
+        parameters: parameters of the problem, indexed by name
+    """
+
+    # PARAMETERS object
+    # --------------------------------
+    param_parked = cp.Parameter(shape=(horizon_length, nbr_vehicle), nonneg=True, name="Parked")
+    param_power_max = cp.Parameter(shape=(horizon_length, nbr_vehicle), nonneg=True, name="Power Max")
+    param_power_nom_max = cp.Parameter(nonneg=True, name="Power Nom Max")
+    param_soe_lower = cp.Parameter(shape=(horizon_length, nbr_vehicle), nonneg=True, name="SOE Lower")
+    param_soe_upper = cp.Parameter(shape=(horizon_length, nbr_vehicle), nonneg=True, name="SOE Upper")
+    param_required_energy = cp.Parameter(shape=nbr_vehicle, nonneg=True, name="Required Energy")
+    param_weight_unsatisfied = cp.Parameter(shape=nbr_vehicle, nonneg=True, name="Unsatisfied Weight")
+    param_price_energy = cp.Parameter(name="Energy Price")
+    param_charging_factor = cp.Parameter(nonneg=True, name="Charging Factor")
+    param_peak_power = cp.Parameter(shape=(horizon_length, ), name="Peak Power Capacity")
 
     # VARIABLE
     # --------------------------------
     # activation[t, v] = 1 means the vehicle v is charged at time t
-    activation: cp.Variable = cp.Variable(shape=(horizon_length, nbr_vehicle), boolean=True)
+    activation: cp.Variable = cp.Variable(shape=(horizon_length, nbr_vehicle), boolean=True, name="Activation")
 
     # soe[t,v] is the state of energy vehicle v at time t
     soe: cp.Variable = cp.Variable(shape=(horizon_length, nbr_vehicle), nonneg=True, name="SOE")
@@ -66,7 +214,7 @@ def evcsp_milp(
     soe_over: cp.Variable = cp.Variable(shape=nbr_vehicle, nonneg=True, name="SOE Over")        # Overcharged SOE
 
     # powerCharging[t,v] is the charging power  of vehicle v at time t
-    power_charging: cp.Variable = cp.Variable(shape=(horizon_length, nbr_vehicle), nonneg=True)
+    power_charging: cp.Variable = cp.Variable(shape=(horizon_length, nbr_vehicle), nonneg=True, name="Charging Power")
 
     # CONSTRAINTS
     # --------------------------------
@@ -76,42 +224,38 @@ def evcsp_milp(
     ctrs_power_bounds = []
     ctrs_energy = []
 
-    for v in range(nbr_vehicle):
+    shift_next, shift_current = shift_matrices(horizon_length)
 
-        # Arrival & Departure
-        ctrs_arrival.append(activation[0:arrival_idx[v], v] == 0)
-        ctrs_arrival.append(power_charging[0:arrival_idx[v], v] == 0)
-        ctrs_departure.append(activation[departure_idx[v]::, v] == 0)
-        ctrs_departure.append(power_charging[departure_idx[v]::, v] == 0)
+    # Arrival & Departure: no activation outside the parking window
+    ctrs_arrival.append(activation <= param_parked)
 
-        # Power Bounds & Activation
-        ctrs_power_bounds.append(power_charging[:, v] <= power_nom[v] * activation[:, v])
+    # Power Bounds & Activation: the power is bounded by its nominal power inside the parking window (0 outside),
+    # and is 0 when the vehicle is not activated (the largest nominal power is a valid big-M)
+    ctrs_power_bounds.append(power_charging <= param_power_max)
+    ctrs_power_bounds.append(power_charging <= param_power_nom_max * activation)
 
-        # Charging Energy [t+1] = activation[t] * Charging Power [t] + Charging Energy[t]
-        ctrs_energy.append(
-            soe[1:-1, v]
-            ==
-            efficiency_charging * power_charging[0:-2, v] * delta_t + soe[0:-2, v]
-        )
-
-        # Initial SOE
-        ctrs_energy.append(soe[0:arrival_idx[v], v] == soe_init[v])
+    # Charging Energy [t+1] = activation[t] * Charging Power [t] + Charging Energy[t]
+    ctrs_energy.append(
+        shift_next @ soe
+        ==
+        param_charging_factor * (shift_current @ power_charging) + shift_current @ soe
+    )
 
-        # Bounds for SOE
-        ctrs_energy.append(soe[:, v] <= capacity_nom[v])
+    # Initial SOE (lower = upper = SOE init before arrival) & Bounds for SOE (upper = capacity after arrival)
+    ctrs_energy.append(soe >= param_soe_lower)
+    ctrs_energy.append(soe <= param_soe_upper)
 
-        # Unsatisfied SOE
-        ctrs_energy.append(
-            soe_over[v] - soe_under[v] == (soe[departure_idx[v], v] - soe[arrival_idx[v], v]) - required_energy[v]
-        )
+    # Unsatisfied SOE: soe[departure] - soe[arrival] is the energy charged within the parking window
+    ctrs_energy.append(
+        soe_over - soe_under == param_charging_factor * cp.sum(power_charging, axis=0) - param_required_energy
+    )
 
-    ctrs_energy.append(required_energy >= soe_under)
-    ctrs_energy.append(soe_over <= required_energy)
+    ctrs_energy.append(param_required_energy >= soe_under)
+    ctrs_energy.append(soe_over <= param_required_energy)
 
     # Power Limit.
     # TODO: soft constraint this
-    # TODO: make it a Parameter object
-    ctrs_power.append(cp.sum(power_charging, axis=1) <= p_max_infra)
+    ctrs_power.append(cp.sum(power_charging, axis=1) <= param_peak_power)
 
     # Append all constraints
     ctrs_all = ctrs_arrival + ctrs_departure + ctrs_power_bounds + ctrs_energy + ctrs_power
@@ -119,84 +263,44 @@ def evcsp_milp(
     # -------------------------------
     # OBJECTIVE
     # -------------------------------
-    # func_obj_service = cp.sum( cp.multiply(penalty_unsatisfied / np.array(capacity_nom), soe_under) )
-    # func_obj_energy_cost = delta_t * cp.sum( cp.multiply(price_energy_buy, power_charging) )
-
-    func_obj_service = penalty_unsatisfied * cp.sum(soe_under / capacity_nom)
-    func_obj_energy_cost = price_energy_buy * delta_t * cp.sum(power_charging)
+    func_obj_service = param_weight_unsatisfied @ soe_under
+    func_obj_energy_cost = param_price_energy * cp.sum(power_charging)
     func_obj = cp.Minimize( func_obj_service + func_obj_energy_cost)
 
-    # Solve the problem
     prob = cp.Problem(objective=func_obj, constraints=ctrs_all)
-    # prob.is_mixed_integer()
-
-    start_time = time.time()
-    # prob.solve(verbose=True, warm_start=False, solver=cp.SCIPY, scipy_options={'method': 'highs', 'time_limit': 30})
-    prob.solve(verbose=True, warm_start=False, solver=solver_options["solver"])
-
-    if prob.status == cp.OPTIMAL or prob.status == cp.OPTIMAL_INACCURATE:
-        logger.info(f"Solution found with status {prob.status}")
-        logger.info(f"Measured Solving Time: {round(time.time() - start_time)} seconds")
-        activation_profile = power_charging.value > 0
-        power_profile = power_charging.value
-
-    else:
-        logger.exception('Problem not solved properly !')
-        activation_profile = np.zeros(shape=(horizon_length, nbr_vehicle), dtype=int)
-        power_profile = np.zeros(shape=(horizon_length, nbr_vehicle), dtype=float)
+    parameters = {param.name(): param for param in prob.parameters()}
 
+    return prob, parameters
 
-    return activation_profile, power_profile, prob
 
-
-def evcsp_lp(
-        nbr_vehicle: int, arrival_idx: List[int], departure_idx: List[int], power_nom: List[int],
-        required_energy: List[int], capacity_nom: List[float], soe_init: List[float], p_max_infra: float | List[float],
-        horizon_length: int, time_step: int = 900, solver_options: dict = None, prices=None,
-        efficiency_charging: float = 0.9
-    ) -> tuple[np.ndarray, np.ndarray, cp.Problem]:
+def build_evcsp_lp(
+        nbr_vehicle: int, horizon_length: int, peak_power_soft_constraint: bool = True
+) -> tuple[cp.Problem, Dict[str, cp.Parameter]]:
     """
-    LP version of EVCSP
+    Build the parametrized (DPP) LP version of EVCSP. All demand-dependent data are parameters, so that the
+    problem only depends on (nbr_vehicle, horizon_length) and can be compiled once and re-solved.
+    Parameters only enter right-hand sides or scale variables as scalars, which keeps DPP compilation cheap.
 
     :param nbr_vehicle: number of vehicles / terminal considered in the horizon
-    :param arrival_idx: index of arrival time
-    :param departure_idx: index of departure time
-    :param power_nom: nominal power of each vehicle [kW]
-    :param capacity_nom: nominal capacity for each vehicle [kWh]
-    :param soe_init: Initial SOE of vehicles at arrival [kWh]
-    :param required_energy: energy demand for each vehicle [kWh]
-    :param p_max_infra: max power profile for the station [kW]
     :param horizon_length: horizon length [time steps]
-    :param time_step: [seconds]
-    :param solver_options:
-    :param prices: contain prices information for the optimization problem
-    :param efficiency_charging: charging efficiency (on the scale of 1, not 100%)
+    :param peak_power_soft_constraint: if True, the station power limit is a soft constraint
     :return:
+        prob: CVXPY Problem
+        parameters: parameters of the problem, indexed by name
     """
 
-    if prices is None:
-        prices = {"price_energy_buy": 0.13, "price_energy_sell": 0.13, "penalty_unsatisfied": 100}
-
-    verbose = solver_options["verbose"]
-    warm_start = solver_options["warm_start"]
-    solver = solver_options["solver"]
-    other_options = {k: v for k, v in solver_options.items() if k not in ("solver", "verbose", "warm_start")}
-
-    logger.info(f"LP Formulation with solver {solver}")
-
-    # Additional Parameters
-    delta_t = time_step / 3600
-    price_energy_buy = prices["price_energy_buy"]           # [currency/kWh]
-    penalty_unsatisfied = prices["penalty_unsatisfied"]     # [currency/kWh] Penalty for unsatisfied energy
-    price_power_violation = 1e6
-    peak_power_soft_constraint = True
-
     # PARAMETERS object
     # --------------------------------
-    if hasattr(p_max_infra, "__len__"):
-        param_peak_power = cp.Parameter(shape=(len(p_max_infra), ), name="Peak Power Capacity", value=p_max_infra)
-    else:
-        param_peak_power = cp.Parameter(name="Peak Power Capacity", value=p_max_infra)
+    param_power_max = cp.Parameter(shape=(horizon_length, nbr_vehicle), nonneg=True, name="Power Max")
+    param_soe_lower = cp.Parameter(shape=(horizon_length, nbr_vehicle), nonneg=True, name="SOE Lower")
+    param_soe_upper = cp.Parameter(shape=(horizon_length, nbr_vehicle), nonneg=True, name="SOE Upper")
+    param_required_energy = cp.Parameter(shape=nbr_vehicle, nonneg=True, name="Required Energy")
+    param_weight_unsatisfied = cp.Parameter(shape=nbr_vehicle, nonneg=True, name="Unsatisfied Weight")
+    param_price_energy = cp.Parameter(name="Energy Price")
+    param_charging_factor = cp.Parameter(nonneg=True, name="Charging Factor")
+    param_peak_power = cp.Parameter(shape=(horizon_length, ), name="Peak Power Capacity")
+    # Price of the station limit violation, a parameter so that the objective can be scaled (see scaling)
+    param_price_violation = cp.Parameter(nonneg=True, name="Violation Price")
 
     # VARIABLE
     # --------------------------------
@@ -221,39 +325,32 @@ def evcsp_lp(
     ctrs_power_bounds = []
     ctrs_energy = []
 
-    for v in range(nbr_vehicle):
+    shift_next, shift_current = shift_matrices(horizon_length)
 
-        # Arrival & Departure
-        ctrs_arrival.append(power_charging[0:arrival_idx[v], v] == 0)
-        ctrs_departure.append(power_charging[departure_idx[v]::, v] == 0)
+    # Arrival & Departure + Power Bounds: power bounded by the nominal power inside the parking window, 0 outside
+    ctrs_power_bounds.append(power_charging <= param_power_max)
 
-        # Power Bounds
-        ctrs_power_bounds.append(power_charging[:, v] <= power_nom[v])
+    # Charging Energy [t+1] = Charging Power [t] + Charging Energy[t]
+    ctrs_energy.append(
+        shift_next @ soe
+        ==
+        param_charging_factor * (shift_current @ power_charging) + shift_current @ soe
+    )
 
-        # Charging Energy [t+1] = Charging Power [t] + Charging Energy[t]
-        ctrs_energy.append(
-            soe[1:-1, v]
-            ==
-            efficiency_charging * power_charging[0:-2, v] * delta_t + soe[0:-2, v]
-        )
-
-        # Initial SOE
-        ctrs_energy.append(soe[0:arrival_idx[v], v] == soe_init[v])
+    # Initial SOE (lower = upper = SOE init before arrival) & Bounds for SOE (upper = capacity after arrival)
+    ctrs_energy.append(soe >= param_soe_lower)
+    ctrs_energy.append(soe <= param_soe_upper)
 
-        # Bounds for SOE
-        ctrs_energy.append(soe[:, v] <= capacity_nom[v])
-
-        # Unsatisfied SOE
-        ctrs_energy.append(
-            soe_over[v] - soe_under[v] == (soe[departure_idx[v], v] - soe[arrival_idx[v], v]) - required_energy[v]
-        )
+    # Unsatisfied SOE: soe[departure] - soe[arrival] is the energy charged within the parking window
+    ctrs_energy.append(
+        soe_over - soe_under == param_charging_factor * cp.sum(power_charging, axis=0) - param_required_energy
+    )
 
     # Bounds for SOE under and over
-    ctrs_energy.append(required_energy >= soe_under)
-    ctrs_energy.append(soe_over <= required_energy)
+    ctrs_energy.append(param_required_energy >= soe_under)
+    ctrs_energy.append(soe_over <= param_required_energy)
 
     # Power Limit.
-    # TODO: make it a Parameter object
     if peak_power_soft_constraint:
         ctrs_power.append(cp.sum(power_charging, axis=1) <= param_peak_power + power_peak_over)
     else:
@@ -265,33 +362,216 @@ def evcsp_lp(
     # -------------------------------
     # OBJECTIVE
     # -------------------------------
-    # func_obj_service = cp.sum( cp.multiply(penalty_unsatisfied / np.array(capacity_nom), soe_under) )
-    # func_obj_energy_cost = delta_t * cp.sum( cp.multiply(price_energy_buy, power_charging) )
-
-    func_obj_service = penalty_unsatisfied * cp.sum(soe_under / capacity_nom)
-    func_obj_energy_cost = price_energy_buy * delta_t * cp.sum(power_charging)
+    func_obj_service = param_weight_unsatisfied @ soe_under
+    func_obj_energy_cost = param_price_energy * cp.sum(power_charging)
     func_obj = func_obj_service + func_obj_energy_cost
 
     if peak_power_soft_constraint:
-        func_obj_power_peak_violation = price_power_violation  * power_peak_over
+        func_obj_power_peak_violation = param_price_violation * power_peak_over
         func_obj += func_obj_power_peak_violation
 
-    # Solve the problem
     prob = cp.Problem(objective=cp.Minimize(func_obj), constraints=ctrs_all)
+    parameters = {param.name(): param for param in prob.parameters()}
 
-    start_time = time.time()
-    prob.solve(verbose=True, warm_start=False, solver=solver_options["solver"])
+    return prob, parameters
 
-    if prob.status == cp.OPTIMAL or prob.status == cp.OPTIMAL_INACCURATE:
-        logger.info(f"Solution found with status {prob.status}")
-        logger.info(f"Measured Solving Time: {round(time.time() - start_time)} seconds")
-        activation_profile = power_charging.value > 0
-        power_profile = power_charging.value
 
-    else:
-        logger.exception('Problem not solved properly !')
-        activation_profile = np.zeros(shape=(horizon_length, nbr_vehicle), dtype=int)
-        power_profile = np.zeros(shape=(horizon_length, nbr_vehicle), dtype=float)
+def evcsp_milp(
+        nbr_vehicle: int, arrival_idx: List[int], departure_idx: List[int], power_nom: List[int],
+        required_energy: List[int], capacity_nom: List[float], soe_init: List[float], p_max_infra: float | List[float],
+        horizon_length: int, time_step: int = 900, solver_options: dict = None, prices = None,
+        efficiency_charging: float = 0.9
+) -> tuple[np.ndarray, np.ndarray, PlanResult]:
+    """
+    MILP version of EVCSP. The compiled problem is cached (see build_evcsp_milp), only its parameters are
+    updated between two calls with the same number of vehicles, horizon length and solver.
+
+    :param nbr_vehicle: number of vehicles / terminal considered in the horizon
+    :param arrival_idx: index of arrival time
+    :param departure_idx: index of departure time
+    :param power_nom: nominal power of each vehicle [kW]
+    :param capacity_nom: nominal capacity for each vehicle [kWh]
+    :param soe_init: Initial SOE of vehicles at arrival [kWh]
+    :param required_energy: energy demand for each vehicle [kWh]
+    :param p_max_infra: max power profile for the station [kW]
+    :param horizon_length: horizon length [time steps]
+    :param time_step: [seconds]
+    :param solver_options: "solver", "verbose", "time_limit" [s], "mip_gap", "threads", "warm_start",
+        "initial_power" (previous plan used as a warm start), see solve_control.solver_kwargs, "result_dtype"
+        (dtype of the arrays of the result, np.float64 or np.float32) and "scaling" ("auto", default, to solve the
+        problem in the units of scaling.problem_scales, or None)
+    :param prices: contain prices information for the optimization problem
+    :param efficiency_charging: charging efficiency (on the scale of 1, not 100%)
+    :return:
+        activation_profile: charging indicators profile (1 for charging, 0 for not charging)
+        power_profile: power charging profile (best incumbent if the time limit is reached)
+        result: copy of the plan and of the solver statistics (see plan_result.PlanResult), with the report of the
+            solve in result.solve_report (see solve_control.solve_problem, with the scales and the coefficient ranges
+            before and after scaling in solve_report["scaling"]) and the time of each phase in result.telemetry (see
+            telemetry.PhaseTimer)
+    """
+
+    assert required_energy <= capacity_nom, "Required Energy must not exceed nom capacity"
 
+    if solver_options is None:
+        solver_options = {}
+
+    solver = solver_options.get("solver", cp.CLARABEL)
+    logger.info(f"MILP Formulation with solver {solver}")
+
+    timer = PhaseTimer()
+    with timer.phase("input"):
+        parameter_values = evcsp_parameter_values(
+            arrival_idx=arrival_idx, departure_idx=departure_idx, power_nom=power_nom,
+            required_energy=required_energy, capacity_nom=capacity_nom, soe_init=soe_init, p_max_infra=p_max_infra,
+            horizon_length=horizon_length, time_step=time_step, prices=prices, efficiency_charging=efficiency_charging
+        )
+
+    return solve_evcsp(
+        "milp", parameter_values, nbr_vehicle=nbr_vehicle, horizon_length=horizon_length,
+        solver_options=solver_options, timer=timer
+    )
+
+
+def evcsp_lp(
+        nbr_vehicle: int, arrival_idx: List[int], departure_idx: List[int], power_nom: List[int],
+        required_energy: List[int], capacity_nom: List[float], soe_init: List[float], p_max_infra: float | List[float],
+        horizon_length: int, time_step: int = 900, solver_options: dict = None, prices=None,
+        efficiency_charging: float = 0.9
+    ) -> tuple[np.ndarray, np.ndarray, PlanResult]:
+    """
+    LP version of EVCSP. The compiled problem is cached (see build_evcsp_lp), only its parameters are
+    updated between two calls with the same number of vehicles, horizon length and solver.
+
+    :param nbr_vehicle: number of vehicles / terminal considered in the horizon
+    :param arrival_idx: index of arrival time
+    :param departure_idx: index of departure time
+    :param power_nom: nominal power of each vehicle [kW]
+    :param capacity_nom: nominal capacity for each vehicle [kWh]
+    :param soe_init: Initial SOE of vehicles at arrival [kWh]
+    :param required_energy: energy demand for each vehicle [kWh]
+    :param p_max_infra: max power profile for the station [kW]
+    :param horizon_length: horizon length [time steps]
+    :param time_step: [seconds]
+    :param solver_options: "solver", "verbose", "time_limit" [s], "mip_gap", "threads", "warm_start",
+        "initial_power" (previous plan used as a warm start), see solve_control.solver_kwargs, "result_dtype"
+        (dtype of the arrays of the result, np.float64 or np.float32) and "scaling" ("auto", default, to solve the
+        problem in the units of scaling.problem_scales, or None)
+    :param prices: contain prices information for the optimization problem
+    :param efficiency_charging: charging efficiency (on the scale of 1, not 100%)
+    :return:
+        activation_profile: charging indicators profile (1 for charging, 0 for not charging)
+        power_profile: power charging profile (best incumbent if the time limit is reached)
+        result: copy of the plan and of the solver statistics (see plan_result.PlanResult), with the report of the
+            solve in result.solve_report (see solve_control.solve_problem, with the scales and the coefficient ranges
+            before and after scaling in solve_report["scaling"]) and the time of each phase in result.telemetry (see
+            telemetry.PhaseTimer)
+    """
+
+    if solver_options is None:
+        solver_options = {}
+
+    solver = solver_options.get("solver", cp.CLARABEL)
+    logger.info(f"LP Formulation with solver {solver}")
+
+    timer = PhaseTimer()
+    with timer.phase("input"):
+        parameter_values = evcsp_parameter_values(
+            arrival_idx=arrival_idx, departure_idx=departure_idx, power_nom=power_nom,
+            required_energy=required_energy, capacity_nom=capacity_nom, soe_init=soe_init, p_max_infra=p_max_infra,
+            horizon_length=horizon_length, time_step=time_step, prices=prices, efficiency_charging=efficiency_charging
+        )
+
+    return solve_evcsp(
+        "lp", parameter_values, nbr_vehicle=nbr_vehicle, horizon_length=horizon_length,
+        solver_options=solver_options, timer=timer
+    )
+
+
+def solve_evcsp(
+        formulation: str, parameter_values: Dict, nbr_vehicle: int, horizon_length: int, solver_options: dict = None,
+        timer: PhaseTimer = None, builder: Callable = None
+) -> tuple[np.ndarray, np.ndarray, PlanResult]:
+    """
+    Solve the cached problem of a formulation (see build_evcsp_lp and build_evcsp_milp) for given parameter values
+
+    :param formulation: "lp" or "milp", or the name of the problem built by builder
+    :param parameter_values: parameter values (see evcsp_parameter_values)
+    :param nbr_vehicle: number of vehicles / terminal considered in the horizon
+    :param horizon_length: horizon length [time steps]
+    :param solver_options: solver options (see evcsp_lp)
+    :param timer: timer of the planning call, with the time of the input phase
+    :param builder: builder of the problem, taking nbr_vehicle and horizon_length, default the builder of the
+        formulation
+    :return: activation profile, power profile and result (see evcsp_lp)
+    """
+
+    solver_options = solver_options or {}
+    solver = solver_options.get("solver", cp.CLARABEL)
+    builder = builder or {"lp": build_evcsp_lp, "milp": build_evcsp_milp}[formulation]
+    timer = timer or PhaseTimer()
+
+    with timer.phase("build"):
+        prob, parameters, lock = problem_cache.get(
+            key=(formulation, nbr_vehicle, horizon_length, solver),
+            builder=lambda: builder(nbr_vehicle=nbr_vehicle, horizon_length=horizon_length)
+        )
 
-    return activation_profile, power_profile, prob
+    # Scaled problem (see scaling): power, SOE and objective of the solution are unscaled below
+    scales = problem_scales(parameter_values) if solver_options.get("scaling", "auto") == "auto" else None
+    solve_values = parameter_values if scales is None else scale_parameter_values(parameter_values, scales)
+    power_scale = 1. if scales is None else scales["power"]
+
+    with lock:
+        with timer.phase("build"):
+            for name, param in parameters.items():
+                param.value = solve_values[name]
+
+        initial_power = solver_options.get("initial_power")
+        initial_values = {"Charging Power": None if initial_power is None else np.asarray(initial_power) / power_scale}
+        if formulation == "milp":
+            initial_values["Activation"] = None if initial_power is None \
+                else (np.asarray(initial_power) > 0).astype(float)
+        prob.solve_report = solve_problem(prob, solver_options, initial_values=initial_values)
+
+        compilation_time = prob.solve_report["compilation_time"] or 0.
+        timer.add("canonicalization", compilation_time)
+        timer.add("solve", prob.solve_report["elapsed"] - compilation_time)
+
+        with timer.phase("extraction"):
+            if scales is not None:
+                if prob.solve_report["objective"] is not None:
+                    prob.solve_report["objective"] *= scales["objective"]
+                prob.solve_report["scaling"] = {
+                    "scales": scales,
+                    "before": condition_diagnostics(parameter_values, formulation),
+                    "after": condition_diagnostics(solve_values, formulation),
+                }
+
+            if prob.solve_report["incumbent"]:
+                logger.info(f"Solution found with status {prob.status}")
+                power_profile = power_scale * prob.var_dict["Charging Power"].value
+                # The plan of the solver is kept (up to its tolerance, e.g. 1e-12 kW outside parking windows),
+                # unless it violates the bounds or the station limit (e.g. an incumbent at the time limit)
+                violation = power_violation(power_profile, parameter_values)
+                if violation > FEASIBILITY_TOLERANCE:
+                    logger.warning(f"Plan repaired, bounds or station limit violated by {violation:.3g} kW")
+                    power_profile = feasible_power_profile(power_profile, parameter_values)
+                else:
+                    power_profile = np.clip(power_profile, 0, parameter_values["Power Max"])
+                activation_profile = power_profile > 0
+
+            else:
+                logger.exception('Problem not solved properly !')
+                activation_profile = np.zeros(shape=(horizon_length, nbr_vehicle), dtype=int)
+                power_profile = np.zeros(shape=(horizon_length, nbr_vehicle), dtype=float)
+
+            result = PlanResult.from_problem(
+                prob, power_profile, activation_profile,
+                objective_terms=evcsp_objective_terms(power_profile, parameter_values),
+                dtype=solver_options.get("result_dtype", np.float64),
+                energy_scale=1. if scales is None else scales["energy"]
+            )
+
+    result.telemetry = timer.phases
+    return activation_profile, power_profile, result
@@ -0,0 +1,311 @@
+# plan_cache.py
+# Content-addressed cache of charging plans: identical requests (demand, parameters, options) are served from the cache
+import datetime
+import hashlib
+import json
+import pickle
+import socket
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List
+from urllib.parse import urlparse
+import numpy as np
+import pandas as pd
+from core.planner.day_ahead_planner import create_charging_plans
+from core.utility.logger.custom_loggers import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_TTL = 3600.     # [s] Time to live of the cached plans
+
+
+def canonical(value: Any) -> Any:
+    """
+    Canonical JSON form of a request value, so that equal requests have equal keys: data frames as lists of
+    records, arrays as lists, numbers as floats (7 and 7.0 are the same request), dictionaries with sorted keys (see
+    plan_key). The order of lists is kept (the order of the vehicles is the order of the plans).
+
+    :param value: value of a request (data frame, array, dictionary, list, number, string, ...)
+    :return: JSON serializable value
+    """
+
+    if isinstance(value, pd.DataFrame):
+        return canonical(value.to_dict("records"))
+    if isinstance(value, (pd.Series, np.ndarray)):
+        return canonical(value.tolist())
+    if isinstance(value, dict):
+        return {str(k): canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonical(v) for v in value]
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return float(value) + 0.     # -0.0 is 0.0
+    if isinstance(value, (np.datetime64, pd.Timestamp, datetime.datetime)):
+        return pd.Timestamp(value).isoformat()
+    if value is None or isinstance(value, str):
+        return value
+    return repr(value)
+
+
+def plan_key(**request) -> str:
+    """
+    Content address of a planning request: SHA-256 of its canonical JSON form (see canonical)
+
+    :param request: everything the plans depend on (demand, planning parameters, formulation, solver options, ...)
+    :return: key
+    """
+
+    payload = json.dumps(canonical(request), sort_keys=True, separators=(",", ":"))
+    return "plan:" + hashlib.sha256(payload.encode()).hexdigest()
+
+
+class MemoryCache:
+    """
+    In-process cache of plans with LRU eviction and time to live. Values are stored as they are (not copied).
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = DEFAULT_TTL):
+        """
+        :param max_entries: maximum number of cached plans, the least recently used are evicted first
+        :param ttl: time to live of a cached plan [s]
+        """
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()      # key -> (expiry time, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        """
+        :param key: key (see plan_key)
+        :return: cached value, None if not cached or expired
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted_key, _ = self._entries.popitem(last=False)
+                logger.info(f"Evicting plan {evicted_key}")
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits, self.misses = 0, 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisError(Exception):
+    """
+    Error reply of a Redis server
+    """
+
+
+class RedisCache:
+    """
+    Cache of plans in a Redis server (or any server speaking the Redis protocol, RESP2), shared by the processes of
+    the API. Values are pickled, so the server must be trusted. The time to live of the plans is set with SET PX;
+    the LRU eviction is the one of the server (maxmemory-policy allkeys-lru). A server error or an unreachable
+    server is logged and counted as a miss: the plans are then computed, the planning never fails because of the
+    cache.
+    """
+
+    def __init__(
+            self, host: str = "localhost", port: int = 6379, db: int = 0, password: str = None,
+            ttl: float = DEFAULT_TTL, prefix: str = "smartcharging:", timeout: float = 1.
+    ):
+        """
+        :param host: host of the server
+        :param port: port of the server
+        :param db: database index
+        :param password: password of the server, if any
+        :param ttl: time to live of a cached plan [s]
+        :param prefix: prefix of the keys in the server
+        :param timeout: timeout of the connection and of the replies [s]
+        """
+
+        self.host, self.port, self.db, self.password = host, port, db, password
+        self.ttl = ttl
+        self.prefix = prefix
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._socket: socket.socket | None = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> None:
+        self._socket = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._reader = self._socket.makefile("rb")
+        if self.password is not None:
+            self._send("AUTH", self.password)
+        if self.db:
+            self._send("SELECT", self.db)
+
+    def _close(self) -> None:
+        if self._socket is not None:
+            self._reader.close()
+            self._socket.close()
+        self._socket, self._reader = None, None
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by the server")
+        kind, data = line[:1], line[1:-2]
+
+        if kind == b"+":
+            return data.decode()
+        if kind == b"-":
+            raise RedisError(data.decode())
+        if kind == b":":
+            return int(data)
+        if kind == b"$":
+            length = int(data)
+            if length < 0:
+                return None
+            value = self._reader.read(length + 2)
+            return value[:-2]
+        if kind == b"*":
+            length = int(data)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise RedisError(f"Invalid reply {line!r}")
+
+    def _send(self, *args):
+        parts = [arg if isinstance(arg, bytes) else str(arg).encode() for arg in args]
+        command = b"*%d\r\n" % len(parts) + b"".join(b"$%d\r\n%s\r\n" % (len(part), part) for part in parts)
+        self._socket.sendall(command)
+        return self._read_reply()
+
+    def command(self, *args):
+        """
+        Send a command to the server, reconnecting once if the connection was lost
+
+        :param args: command and arguments (bytes, strings or numbers)
+        :return: reply of the server
+        """
+
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._socket is None:
+                        self._connect()
+                    return self._send(*args)
+                except (ConnectionError, OSError):
+                    self._close()
+                    if attempt == 1:
+                        raise
+
+    def get(self, key: str) -> Any:
+        """
+        :param key: key (see plan_key)
+        :return: cached value, None if not cached, expired, invalid (e.g. written by another version) or if the
+            server is unavailable
+        """
+
+        try:
+            data = self.command("GET", self.prefix + key)
+        except (RedisError, ConnectionError, OSError) as error:
+            logger.warning(f"Plan cache unavailable: {error!r}")
+            data = None
+
+        if data is None:
+            self.misses += 1
+            return None
+
+        try:
+            value = pickle.loads(data)
+        except Exception as error:
+            logger.warning(f"Invalid cached plan {key}: {error!r}")
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        try:
+            self.command("SET", self.prefix + key, pickle.dumps(value), "PX", int(self.ttl * 1000))
+        except (RedisError, ConnectionError, OSError) as error:
+            logger.warning(f"Plan not cached: {error!r}")
+
+    def delete(self, key: str) -> None:
+        try:
+            self.command("DEL", self.prefix + key)
+        except (RedisError, ConnectionError, OSError) as error:
+            logger.warning(f"Plan not deleted from the cache: {error!r}")
+
+
+def plan_cache_from_url(url: str, ttl: float = DEFAULT_TTL, max_entries: int = 256) -> MemoryCache | RedisCache | None:
+    """
+    Plan cache of a configuration string
+
+    :param url: "memory" (see MemoryCache), "redis://[:password@]host[:port][/db]" (see RedisCache) or "none"
+    :param ttl: time to live of a cached plan [s]
+    :param max_entries: maximum number of cached plans of the in-process cache
+    :return: cache, None for "none"
+    """
+
+    if url in (None, "", "none"):
+        return None
+    if url == "memory":
+        return MemoryCache(max_entries=max_entries, ttl=ttl)
+
+    parsed = urlparse(url)
+    assert parsed.scheme == "redis", f"Invalid plan cache {url}, must be memory, none or redis://host:port/db"
+    return RedisCache(
+        host=parsed.hostname or "localhost", port=parsed.port or 6379, db=int(parsed.path.strip("/") or 0),
+        password=parsed.password, ttl=ttl
+    )
+
+
+def cached_charging_plans(
+        cache: MemoryCache | RedisCache | None, data_demand: pd.DataFrame | List[pd.DataFrame], **kwargs
+) -> tuple[np.ndarray, np.ndarray, Any]:
+    """
+    Charging plans (see day_ahead_planner.create_charging_plans), served from the cache if the same request was
+    already solved
+
+    :param cache: plan cache, no cache if None
+    :param data_demand: charging demand data
+    :param kwargs: other arguments of create_charging_plans, all part of the key
+    :return: activation profiles, power profiles and result (see create_charging_plans)
+    """
+
+    if cache is None:
+        return create_charging_plans(data_demand, **kwargs)
+
+    key = plan_key(data_demand=data_demand, **kwargs)
+    plans = cache.get(key)
+    if plans is None:
+        plans = create_charging_plans(data_demand, **kwargs)
+        cache.set(key, plans)
+    else:
+        logger.info(f"Plans served from the cache ({key})")
+
+    return plans
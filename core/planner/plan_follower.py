@@ -0,0 +1,203 @@
+# plan_follower.py
+# Receding-horizon (MPC) controller: re-plan the remaining horizon at each time step from the connected vehicles
+import time
+from typing import Dict, List
+import cvxpy as cp
+import numpy as np
+from core.planner.optimization import build_evcsp_lp, build_evcsp_milp, evcsp_parameter_values, \
+    feasible_power_profile
+from core.planner.problem_cache import problem_cache
+from core.planner.solve_control import solve_problem
+from core.utility.logger.custom_loggers import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class PlanFollower:
+    """
+    Receding-horizon controller of a station with nbr_terminals terminals.
+
+    At each time step (see step), the EVCSP is solved on the next horizon_length steps for the vehicles currently
+    connected, from their current SOE: past decisions are fixed, only the remaining horizon is re-planned. The
+    problem always has nbr_terminals vehicles (free terminals have no parking window) and horizon_length steps, so
+    the compiled problem is shared between steps (and with evcsp_lp / evcsp_milp) through the problem cache, and
+    each solve is warm-started from the previous plan shifted by one time step.
+    """
+
+    def __init__(
+            self, nbr_terminals: int, horizon_length: int, p_max_infra: float | List[float], time_step: int = 900,
+            formulation: str = "lp", solver_options: dict = None, prices: dict = None,
+            efficiency_charging: float = 0.9
+    ):
+        """
+        :param nbr_terminals: number of terminals of the station
+        :param horizon_length: length of the receding horizon [time steps]
+        :param p_max_infra: max power of the station [kW], either constant or a profile indexed by time step (the
+            last value is used beyond the profile)
+        :param time_step: [seconds]
+        :param formulation: "lp" or "milp"
+        :param solver_options: "solver" (default CLARABEL), "verbose", "time_limit", "mip_gap" and "threads" (see
+            solve_control.solver_kwargs). Warm starts are used by the solvers supporting them in CVXPY (e.g. OSQP)
+        :param prices: contain prices information for the optimization problem
+        :param efficiency_charging: charging efficiency (on the scale of 1, not 100%)
+        """
+
+        if formulation not in ("lp", "milp"):
+            raise ValueError(f"Invalid formulation {formulation}, must be lp or milp")
+
+        self.nbr_terminals = nbr_terminals
+        self.horizon_length = horizon_length
+        self.p_max_infra = np.atleast_1d(np.asarray(p_max_infra, dtype=float))
+        self.time_step = time_step
+        self.formulation = formulation
+        self.solver_options = {"solver": cp.CLARABEL, "verbose": False, **(solver_options or {})}
+        self.prices = prices
+        self.efficiency_charging = efficiency_charging
+
+        self.current_step = 0
+        self.connected = np.zeros(nbr_terminals, dtype=bool)
+        self.departure_idx = np.zeros(nbr_terminals, dtype=int)
+        self.power_nom = np.zeros(nbr_terminals, dtype=float)
+        self.required_energy = np.zeros(nbr_terminals, dtype=float)
+        self.capacity_nom = np.ones(nbr_terminals, dtype=float)
+        self.soe = np.zeros(nbr_terminals, dtype=float)
+
+        # Plan of the remaining horizon (from the current step), and power applied at each past step
+        self.plan = np.zeros(shape=(horizon_length, nbr_terminals), dtype=float)
+        self._soe_plan = None
+        self.applied: List[np.ndarray] = []
+        self.history: List[Dict] = []
+
+    def connect(
+            self, terminal: int, departure_idx: int, power_nom: float, required_energy: float, capacity_nom: float,
+            soe: float
+    ) -> None:
+        """
+        Connect a vehicle to a terminal at the current time step
+
+        :param terminal: index of the terminal
+        :param departure_idx: index of departure time (absolute, as current_step)
+        :param power_nom: nominal power of the vehicle [kW]
+        :param required_energy: energy demand of the vehicle [kWh]
+        :param capacity_nom: nominal capacity of the vehicle [kWh]
+        :param soe: SOE of the vehicle at arrival [kWh]
+        """
+
+        if self.connected[terminal]:
+            raise ValueError(f"Terminal {terminal} is already used")
+
+        self.connected[terminal] = True
+        self.departure_idx[terminal] = departure_idx
+        self.power_nom[terminal] = power_nom
+        self.required_energy[terminal] = required_energy
+        self.capacity_nom[terminal] = capacity_nom
+        self.soe[terminal] = soe
+        self.plan[:, terminal] = 0.
+        if self._soe_plan is not None:
+            self._soe_plan[:, terminal] = soe
+
+    def disconnect(self, terminal: int) -> None:
+        self.connected[terminal] = False
+        self.required_energy[terminal] = 0.
+        self.plan[:, terminal] = 0.
+
+    def measure_soe(self, terminal: int, soe: float) -> None:
+        """
+        Replace the SOE of a connected vehicle, predicted from the applied power, by its measured value
+
+        :param terminal: index of the terminal
+        :param soe: measured SOE [kWh]
+        """
+
+        charged = soe - self.soe[terminal]
+        self.required_energy[terminal] = max(self.required_energy[terminal] - charged, 0.)
+        self.soe[terminal] = soe
+
+    def _p_max_window(self) -> np.ndarray:
+        window = np.arange(self.current_step, self.current_step + self.horizon_length)
+        return self.p_max_infra[np.minimum(window, len(self.p_max_infra) - 1)]
+
+    def _solve(self) -> str:
+        """
+        Solve the EVCSP on the remaining horizon, warm-started from the previous plan shifted by one time step
+
+        :return: status of the problem
+        """
+
+        departure = np.where(
+            self.connected, np.clip(self.departure_idx - self.current_step, 0, self.horizon_length), 0
+        )
+        parameter_values = evcsp_parameter_values(
+            arrival_idx=np.zeros(self.nbr_terminals, dtype=int), departure_idx=departure, power_nom=self.power_nom,
+            required_energy=self.required_energy, capacity_nom=self.capacity_nom, soe_init=self.soe,
+            p_max_infra=self._p_max_window(), horizon_length=self.horizon_length, time_step=self.time_step,
+            prices=self.prices, efficiency_charging=self.efficiency_charging
+        )
+        # Past decisions are fixed: the SOE at the current step is the SOE reached with the applied power
+        parameter_values["SOE Lower"][0] = self.soe
+        parameter_values["SOE Upper"][0] = self.soe
+
+        builder = build_evcsp_lp if self.formulation == "lp" else build_evcsp_milp
+        prob, parameters, lock = problem_cache.get(
+            key=(self.formulation, self.nbr_terminals, self.horizon_length, self.solver_options["solver"]),
+            builder=lambda: builder(nbr_vehicle=self.nbr_terminals, horizon_length=self.horizon_length)
+        )
+
+        with lock:
+            for name, param in parameters.items():
+                param.value = parameter_values[name]
+
+            # Warm start: previous plan, shifted to the current step
+            soe_plan = None if self._soe_plan is None else np.clip(
+                self._soe_plan, parameter_values["SOE Lower"], parameter_values["SOE Upper"]
+            )
+            report = solve_problem(
+                prob, {**self.solver_options, "warm_start": True}, initial_values={
+                    "Charging Power": np.minimum(self.plan, parameter_values["Power Max"]), "SOE": soe_plan
+                }
+            )
+
+            if report["incumbent"]:
+                self.plan = feasible_power_profile(prob.var_dict["Charging Power"].value, parameter_values)
+                self._soe_plan = prob.var_dict["SOE"].value.copy()
+            else:
+                logger.error(f"Step {self.current_step}: problem not solved properly ({report['status']})")
+                self.plan = np.where(parameter_values["Parked"] > 0, self.plan, 0.)
+
+        return report["status"]
+
+    def step(self) -> np.ndarray:
+        """
+        Re-plan the remaining horizon, apply the power of the current step and move to the next step.
+        Vehicles reaching their departure time are disconnected.
+
+        :return: charging power of each terminal at the current step [kW]
+        """
+
+        start_time = time.time()
+        status = self._solve() if self.connected.any() else "idle"
+
+        # Station power limit on the applied power
+        power = np.where(self.connected, np.clip(self.plan[0], 0, self.power_nom), 0.)
+        p_max = self._p_max_window()[0]
+        if power.sum() > p_max:
+            power *= max(p_max, 0.) / power.sum()
+
+        # Apply the power of the current step
+        charged = self.efficiency_charging * self.time_step / 3600 * power
+        charged = np.minimum(charged, self.capacity_nom - self.soe)
+        self.soe += charged
+        self.required_energy = np.clip(self.required_energy - charged, 0, None)
+        self.applied.append(power)
+        self.history.append({"step": self.current_step, "status": status, "solve_time": time.time() - start_time})
+        logger.info(f"Step {self.current_step}: status {status}, {round(self.history[-1]['solve_time'], 3)} seconds")
+
+        # Next step
+        self.current_step += 1
+        self.plan = np.vstack([self.plan[1:], np.zeros((1, self.nbr_terminals))])
+        if self._soe_plan is not None:
+            self._soe_plan = np.vstack([self._soe_plan[1:], self._soe_plan[-1:]])
+        for terminal in np.flatnonzero(self.connected & (self.departure_idx <= self.current_step)):
+            self.disconnect(terminal)
+
+        return power
@@ -0,0 +1,127 @@
+# plan_result.py
+# Compact result of the CVXPY planners: plan arrays and solver statistics, without the CVXPY problem
+from typing import Dict
+import cvxpy as cp
+import numpy as np
+
+
+def cvxpy_solver_stats(prob: cp.Problem) -> Dict:
+    """
+    Solver statistics and model size of a solved CVXPY problem. The size is computed once per problem (the problems
+    of the problem cache are reused).
+
+    :param prob: solved CVXPY problem
+    :return: solver, iterations, status, gap, objective, number of scalar variables and constraints
+    """
+
+    if not hasattr(prob, "size_telemetry"):
+        metrics = prob.size_metrics
+        prob.size_telemetry = {
+            "variables": int(metrics.num_scalar_variables),
+            "constraints": int(metrics.num_scalar_eq_constr + metrics.num_scalar_leq_constr),
+        }
+
+    report = getattr(prob, "solve_report", {})
+    solver_stats = prob.solver_stats
+    return {
+        "solver": report.get("solver"),
+        "status": report.get("status", prob.status),
+        "iterations": None if solver_stats is None else solver_stats.num_iters,
+        "gap": report.get("gap"),
+        "objective": report.get("objective"),
+        **prob.size_telemetry,
+    }
+
+
+class PlanResult:
+    """
+    Result of a planning call of the CVXPY planners (see optimization.solve_evcsp): a copy of the plan (power,
+    activation and SOE arrays) and of the solver statistics, taken while the cached problem is locked. The CVXPY
+    problem is not referenced, so its expression graph and compiled matrices are not kept alive by the callers, and
+    the next solve of the cached problem does not change the result.
+    """
+
+    __slots__ = (
+        "status", "objective", "objective_terms", "power", "activation", "soe", "solver", "solve_time", "iterations",
+        "gap", "variables", "constraints", "solve_report", "telemetry", "presolve",
+    )
+
+    def __init__(
+            self, status: str, objective: float | None, power: np.ndarray, activation: np.ndarray,
+            soe: np.ndarray = None, objective_terms: Dict[str, float] = None, solver: str = None,
+            solve_time: float = None, iterations: int = None, gap: float = None, variables: int = None,
+            constraints: int = None, solve_report: Dict = None, telemetry: Dict[str, float] = None,
+            presolve: Dict = None
+    ):
+        self.status = status
+        self.objective = objective
+        self.objective_terms = objective_terms or {}
+        self.power = power
+        self.activation = activation
+        self.soe = soe
+        self.solver = solver
+        self.solve_time = solve_time
+        self.iterations = iterations
+        self.gap = gap
+        self.variables = variables
+        self.constraints = constraints
+        self.solve_report = solve_report or {}
+        self.telemetry = telemetry or {}
+        self.presolve = presolve
+
+    @classmethod
+    def from_problem(
+            cls, prob: cp.Problem, power_profile: np.ndarray, activation_profile: np.ndarray,
+            objective_terms: Dict[str, float] = None, dtype: type = np.float64, energy_scale: float = 1.
+    ) -> "PlanResult":
+        """
+        Copy the plan and the statistics of a solved problem (with prob.solve_report, see solve_control.solve_problem)
+
+        :param prob: solved CVXPY problem
+        :param power_profile: (horizon_length, nbr_vehicle) charging profile extracted from the solution [kW]
+        :param activation_profile: (horizon_length, nbr_vehicle) charging indicators
+        :param objective_terms: objective breakdown of the plan (see optimization.evcsp_objective_terms)
+        :param dtype: dtype of the power and SOE arrays, np.float64 or np.float32
+        :param energy_scale: unit of the SOE variable of a scaled problem (see scaling.problem_scales) [kWh]
+        :return: result
+        """
+
+        report = dict(prob.solve_report)
+        stats = cvxpy_solver_stats(prob)
+        soe = prob.var_dict["SOE"].value if report["incumbent"] and "SOE" in prob.var_dict else None
+
+        return cls(
+            status=report["status"],
+            objective=report["objective"],
+            objective_terms=objective_terms,
+            power=np.asarray(power_profile, dtype=dtype),
+            activation=np.asarray(activation_profile, dtype=bool),
+            soe=None if soe is None else np.array(energy_scale * soe, dtype=dtype),
+            solver=report["solver"],
+            solve_time=None if prob.solver_stats is None else prob.solver_stats.solve_time,
+            iterations=stats["iterations"],
+            gap=report["gap"],
+            variables=stats["variables"],
+            constraints=stats["constraints"],
+            solve_report=report,
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in (self.power, self.activation, self.soe) if array is not None)
+
+    def summary(self) -> Dict:
+        """
+        Statistics of the result, without the arrays
+
+        :return: status, objective, objective breakdown, solver, solving time, iterations, gap and model size
+        """
+
+        return {
+            "status": self.status, "objective": self.objective, "objective_terms": self.objective_terms,
+            "solver": self.solver, "solve_time": self.solve_time, "iterations": self.iterations, "gap": self.gap,
+            "variables": self.variables, "constraints": self.constraints,
+        }
+
+    def __repr__(self) -> str:
+        return f"PlanResult({', '.join(f'{k}={v!r}' for k, v in self.summary().items())})"
@@ -0,0 +1,144 @@
+# portfolio.py
+# Solver portfolio racing: the same EVCSP is solved by several solvers in parallel processes, the first good answer wins
+import json
+import multiprocessing as mp
+import queue
+import time
+from collections import deque
+from typing import Dict, List
+import cvxpy as cp
+import numpy as np
+from core.planner.optimization import evcsp_lp, evcsp_milp
+from core.utility.logger.custom_loggers import setup_logger
+
+logger = setup_logger(__name__)
+
+# Planners and default solvers of the race, by formulation. HiGHS is not raced on the LP: CVXPY sends LPs to HiGHS
+# through its QP path, which densifies the constraint matrix (see solver_selection.CANDIDATES)
+RACE_PLANNERS = {"lp": evcsp_lp, "milp": evcsp_milp}
+RACE_SOLVERS = {"lp": (cp.CLARABEL, cp.SCIPY), "milp": (cp.HIGHS, cp.SCIPY)}
+
+# Options of the race, not passed to the solvers
+RACE_OPTIONS = ("race_solvers", "race_log")
+
+# Winners and timings of the last races, used to tune the solver routing
+race_history = deque(maxlen=1000)
+
+
+def _race_worker(results: mp.Queue, formulation: str, solver: str, solver_options: Dict, inputs: Dict) -> None:
+    activation_profile, power_profile, prob = RACE_PLANNERS[formulation](
+        **inputs, solver_options={**solver_options, "solver": solver}
+    )
+    results.put((solver, activation_profile, power_profile, prob.solve_report))
+
+
+def accept_report(report: Dict, tolerance: float) -> bool:
+    """
+    Check that a solve meets the criteria of the race: optimal status and, for a MILP, a gap within tolerance
+
+    :param report: report of the solve (see solve_control.solve_problem)
+    :param tolerance: maximum relative MIP gap
+    :return: True if the solution can be returned
+    """
+
+    return report["status"] == cp.OPTIMAL and (report["gap"] is None or report["gap"] <= tolerance)
+
+
+def evcsp_race(
+        formulation: str = "lp", solver_options: dict = None, **inputs
+) -> tuple[np.ndarray, np.ndarray, Dict]:
+    """
+    Start one process per solver on the same EVCSP, return the first solution meeting the race criteria (see
+    accept_report) and terminate the other processes. If no solver meets the criteria, the best incumbent is
+    returned. The winner and the time of each solver are appended to race_history (and to the JSON lines file
+    solver_options["race_log"] if given).
+
+    :param formulation: "lp" or "milp"
+    :param solver_options: options of the planner (see evcsp_lp), with "solver" set to "race", and "race_solvers"
+        (solvers of the race, default RACE_SOLVERS of the formulation). "mip_gap" is also the tolerance of the race
+        (default 1e-4), and the race is stopped after "time_limit" [s] plus a margin for the problem compilation
+    :param inputs: other arguments of the planner (see evcsp_lp)
+    :return:
+        activation_profile: charging indicators profile (1 for charging, 0 for not charging)
+        power_profile: power charging profile
+        result: status, objective, gap, winner solver, time of each solver (None if terminated), number of vehicles
+            and horizon length
+    """
+
+    if formulation not in RACE_PLANNERS:
+        raise ValueError(f"Invalid formulation {formulation} for a solver race, must be lp or milp")
+
+    solver_options = {k: v for k, v in (solver_options or {}).items() if k != "solver"}
+    solvers = list(solver_options.get("race_solvers", RACE_SOLVERS[formulation]))
+    race_log = solver_options.get("race_log")
+    options = {k: v for k, v in solver_options.items() if k not in RACE_OPTIONS}
+    tolerance = options.get("mip_gap") or 1e-4
+    deadline = None if options.get("time_limit") is None else options["time_limit"] + 30.
+
+    logger.info(f"Solver race between {solvers}")
+    results = mp.Queue()
+    start_time = time.time()
+    processes = {
+        solver: mp.Process(target=_race_worker, args=(results, formulation, solver, options, inputs), daemon=True)
+        for solver in solvers
+    }
+    for process in processes.values():
+        process.start()
+
+    timings: Dict[str, float | None] = {solver: None for solver in solvers}
+    finished: List[tuple] = []
+    winner = None
+    try:
+        while winner is None and len(finished) < len(solvers):
+            remaining = None if deadline is None else deadline - (time.time() - start_time)
+            if remaining is not None and remaining <= 0:
+                break
+            try:
+                output = results.get(timeout=min(remaining, 1.) if remaining is not None else 1.)
+            except queue.Empty:
+                # A solver process may have died without a result
+                if all(not p.is_alive() for p in processes.values()) and results.empty():
+                    break
+                continue
+            timings[output[0]] = time.time() - start_time
+            finished.append(output)
+            if accept_report(output[3], tolerance):
+                winner = output
+    finally:
+        for process in processes.values():
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+    if winner is None:
+        incumbents = [output for output in finished if output[3]["incumbent"]]
+        winner = min(incumbents, key=lambda output: output[3]["objective"]) if incumbents else None
+
+    if winner is None:
+        logger.error("No solver of the race found a solution")
+        horizon_length, nbr_vehicle = inputs["horizon_length"], inputs["nbr_vehicle"]
+        solver, activation_profile, power_profile = None, np.zeros((horizon_length, nbr_vehicle), dtype=int), \
+            np.zeros((horizon_length, nbr_vehicle), dtype=float)
+        report = {"status": cp.SOLVER_ERROR, "objective": None, "gap": None}
+    else:
+        solver, activation_profile, power_profile, report = winner
+
+    result = {
+        "status": report["status"],
+        "objective": report["objective"],
+        "gap": report["gap"],
+        "winner": solver,
+        "timings": timings,
+        "formulation": formulation,
+        "nbr_vehicle": inputs["nbr_vehicle"],
+        "horizon_length": inputs["horizon_length"],
+        "solve_time": time.time() - start_time,
+    }
+    logger.info(f"Solver race won by {solver}, timings {timings}")
+
+    race_history.append(result)
+    if race_log is not None:
+        with open(race_log, "a") as file:
+            file.write(json.dumps(result) + "\n")
+
+    return activation_profile, power_profile, result
@@ -0,0 +1,234 @@
+# presolve.py
+# Presolve of the EVCSP: trivial sessions are fixed and identical vehicles are merged into cohorts before the solve
+from typing import Callable, Dict, List
+import cvxpy as cp
+import numpy as np
+from core.planner.optimization import evcsp_parameter_values
+from core.planner.plan_result import PlanResult
+from core.utility.logger.custom_loggers import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def asap_profile(power_max: np.ndarray, energy: np.ndarray, charging_factor: float) -> np.ndarray:
+    """
+    Charge each vehicle at its maximum power from its arrival until its energy is delivered
+
+    :param power_max: (horizon_length, nbr_vehicle) maximum power (0 outside of the parking window) [kW]
+    :param energy: energy to deliver to each vehicle [kWh]
+    :param charging_factor: charging efficiency * time step [h]
+    :return: (horizon_length, nbr_vehicle) charging profile [kW]
+    """
+
+    power_needed = energy / charging_factor
+    delivered_before = np.cumsum(power_max, axis=0) - power_max
+    return np.clip(power_needed[None, :] - delivered_before, 0, power_max)
+
+
+def presolve(
+        nbr_vehicle: int, arrival_idx: List[int], departure_idx: List[int], power_nom: List[int],
+        required_energy: List[int], capacity_nom: List[float], soe_init: List[float], p_max_infra: float | List[float],
+        horizon_length: int, time_step: int = 900, prices: dict = None, efficiency_charging: float = 0.9, **options
+) -> tuple[Dict, Dict]:
+    """
+    Reduce an EVCSP before the solve. Sessions are fixed, and removed from the problem, when their optimal plan is
+    known in advance:
+        - no charging if the session needs no energy, has an empty parking window or if charging costs more than
+          the unsatisfied energy penalty,
+        - charging at nominal power from arrival (see asap_profile) if the station limit cannot be reached during the
+          whole parking window (even with all vehicles at nominal power) and the required energy fits the battery.
+          The vehicle is then independent of the others, and its plan is subtracted from the station capacity.
+    The other vehicles with the same arrival, departure, nominal power, capacity, initial SOE and required energy
+    are merged into a cohort: one vehicle with the powers and energies of the cohort summed (and the same
+    unsatisfied energy penalty per kWh). Since the problem is symmetric in the vehicles of a cohort, the plan
+    split evenly between them is optimal (see postsolve).
+
+    :param nbr_vehicle: number of vehicles
+    :param arrival_idx: index of arrival time
+    :param departure_idx: index of departure time
+    :param power_nom: nominal power of each vehicle [kW]
+    :param required_energy: energy demand for each vehicle [kWh]
+    :param capacity_nom: nominal capacity for each vehicle [kWh]
+    :param soe_init: Initial SOE of vehicles at arrival [kWh]
+    :param p_max_infra: max power profile for the station [kW]
+    :param horizon_length: horizon length [time steps]
+    :param time_step: [seconds]
+    :param prices: contain prices information for the optimization problem
+    :param efficiency_charging: charging efficiency (on the scale of 1, not 100%)
+    :param options: other arguments of the planner (solver_options, ...), passed unchanged. The warm start
+        solver_options["initial_power"] is reduced to the cohorts.
+    :return:
+        reduced_inputs: arguments of the planner for the reduced problem (one vehicle per cohort)
+        presolve_info: fixed plan, cohort of each vehicle (-1 if fixed), size of each cohort (see postsolve), terms of
+            the objective of the fixed sessions (see optimization.evcsp_objective_terms) and statistics, with the
+            objective of the fixed sessions (objective of the problem = objective of the reduced problem +
+            fixed_objective)
+    """
+
+    if prices is None:
+        prices = {"price_energy_buy": 0.13, "price_energy_sell": 0.13, "penalty_unsatisfied": 100}
+
+    values = evcsp_parameter_values(
+        arrival_idx=arrival_idx, departure_idx=departure_idx, power_nom=power_nom, required_energy=required_energy,
+        capacity_nom=capacity_nom, soe_init=soe_init, p_max_infra=p_max_infra, horizon_length=horizon_length,
+        time_step=time_step, prices=prices, efficiency_charging=efficiency_charging
+    )
+    vehicles = np.column_stack([np.asarray(v, dtype=float) for v in (
+        arrival_idx, departure_idx, power_nom, required_energy, capacity_nom, soe_init
+    )])
+    energy, capacity, soe = vehicles[:, 3], vehicles[:, 4], vehicles[:, 5]
+    power_max = values["Power Max"]
+
+    worth_charging = values["Unsatisfied Weight"] * values["Charging Factor"] > values["Energy Price"]
+    fixed_zero = (energy <= 0) | ~power_max.any(axis=0) | ~worth_charging
+
+    uncongested = power_max.sum(axis=1) <= values["Peak Power Capacity"]
+    fixed_asap = ~fixed_zero & ~(values["Parked"].astype(bool) & ~uncongested[:, None]).any(axis=0) \
+        & (soe + energy <= capacity + 1e-9)
+
+    fixed_plan = np.zeros((horizon_length, nbr_vehicle), dtype=float)
+    fixed_plan[:, fixed_asap] = asap_profile(power_max[:, fixed_asap], energy[fixed_asap], values["Charging Factor"])
+
+    free = ~(fixed_zero | fixed_asap)
+    cohorts, cohort_idx, cohort_size = np.unique(vehicles[free], axis=0, return_inverse=True, return_counts=True)
+    cohort = np.full(nbr_vehicle, -1, dtype=int)
+    cohort[free] = cohort_idx.ravel()
+
+    penalty = np.asarray(prices["penalty_unsatisfied"], dtype=float)
+    penalty = np.broadcast_to(penalty, (nbr_vehicle, )) if penalty.ndim == 0 else penalty
+    cohort_penalty = np.zeros(len(cohorts))
+    np.add.at(cohort_penalty, cohort[free], penalty[free])
+
+    reduced_inputs = {
+        **options,
+        "nbr_vehicle": len(cohorts),
+        "arrival_idx": cohorts[:, 0].astype(int).tolist(),
+        "departure_idx": cohorts[:, 1].astype(int).tolist(),
+        "power_nom": (cohorts[:, 2] * cohort_size).tolist(),
+        "required_energy": (cohorts[:, 3] * cohort_size).tolist(),
+        "capacity_nom": (cohorts[:, 4] * cohort_size).tolist(),
+        "soe_init": (cohorts[:, 5] * cohort_size).tolist(),
+        "p_max_infra": values["Peak Power Capacity"] - fixed_plan.sum(axis=1),
+        "horizon_length": horizon_length,
+        "time_step": time_step,
+        "prices": {**prices, "penalty_unsatisfied": cohort_penalty},
+        "efficiency_charging": efficiency_charging,
+    }
+
+    solver_options = options.get("solver_options") or {}
+    if solver_options.get("initial_power") is not None:
+        initial_power = np.zeros((horizon_length, len(cohorts)))
+        np.add.at(initial_power.T, cohort[free], np.asarray(solver_options["initial_power"], dtype=float).T[free])
+        reduced_inputs["solver_options"] = {**solver_options, "initial_power": initial_power}
+
+    # The station limit of the reduced problem excludes the fixed plans, so the objective is separable
+    fixed = ~free
+    soe_under = np.clip(energy[fixed] - values["Charging Factor"] * fixed_plan[:, fixed].sum(axis=0), 0, None)
+    fixed_terms = {
+        "unsatisfied": float(values["Unsatisfied Weight"][fixed] @ soe_under),
+        "energy": float(values["Energy Price"] * fixed_plan.sum()),
+        "peak_violation": 0.,
+    }
+    fixed_objective = sum(fixed_terms.values())
+
+    presolve_info = {
+        "fixed_plan": fixed_plan,
+        "cohort": cohort,
+        "cohort_size": cohort_size,
+        "fixed_terms": fixed_terms,
+        "stats": {
+            "vehicles": nbr_vehicle, "fixed_zero": int(fixed_zero.sum()), "fixed_asap": int(fixed_asap.sum()),
+            "cohorts": len(cohorts), "fixed_objective": fixed_objective,
+        },
+    }
+    logger.info(f"Presolve: {presolve_info['stats']}")
+
+    return reduced_inputs, presolve_info
+
+
+def postsolve(power_profile: np.ndarray, presolve_info: Dict) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Plan of all vehicles from the plan of the reduced problem: fixed plans, and the plan of each cohort split evenly
+    between its vehicles
+
+    :param power_profile: (horizon_length, n_cohorts) charging profile of the reduced problem [kW]
+    :param presolve_info: presolve information (see presolve)
+    :return: activation and power profiles of all vehicles
+    """
+
+    cohort = presolve_info["cohort"]
+    free = cohort >= 0
+    power = presolve_info["fixed_plan"].copy()
+    power[:, free] = (np.asarray(power_profile, dtype=float) / presolve_info["cohort_size"][None, :])[:, cohort[free]]
+
+    return power > 0, power
+
+
+def postsolve_soe(soe: np.ndarray, power_profile: np.ndarray, presolve_info: Dict, inputs: Dict) -> np.ndarray:
+    """
+    SOE of all vehicles from the SOE of the reduced problem: the SOE of each cohort split evenly between its vehicles,
+    and the SOE of the fixed sessions from their plan
+
+    :param soe: (horizon_length, n_cohorts) SOE of the reduced problem [kWh]
+    :param power_profile: (horizon_length, nbr_vehicle) charging profile of all vehicles (see postsolve) [kW]
+    :param presolve_info: presolve information (see presolve)
+    :param inputs: arguments of the planner (see evcsp_lp)
+    :return: (horizon_length, nbr_vehicle) SOE [kWh]
+    """
+
+    cohort = presolve_info["cohort"]
+    free = cohort >= 0
+    charging_factor = inputs.get("efficiency_charging", 0.9) * inputs.get("time_step", 900) / 3600
+    delivered = charging_factor * (np.cumsum(power_profile, axis=0) - power_profile)
+    full_soe = np.asarray(inputs["soe_init"], dtype=float)[None, :] + delivered
+    full_soe[:, free] = (np.asarray(soe, dtype=float) / presolve_info["cohort_size"][None, :])[:, cohort[free]]
+
+    return full_soe
+
+
+def evcsp_presolved(planner: Callable, **inputs) -> tuple[np.ndarray, np.ndarray, object]:
+    """
+    Solve an EVCSP with a planner, after presolve (see presolve). If all sessions are fixed, no planner is called.
+
+    :param planner: planner taking the arguments of evcsp_lp
+    :param inputs: arguments of the planner (see evcsp_lp)
+    :return: activation profiles, power profiles and the third output of the planner (a PlanResult with the fixed
+        plan if no planner is called), with the arrays of all vehicles, the objective (and objective terms) of the
+        whole problem, fixed sessions included, and the presolve statistics (result.presolve for a PlanResult,
+        result["presolve"] otherwise)
+    """
+
+    reduced_inputs, presolve_info = presolve(**inputs)
+    fixed_objective = presolve_info["stats"]["fixed_objective"]
+
+    if reduced_inputs["nbr_vehicle"] == 0:
+        activation_profile, power_profile = postsolve(np.zeros((inputs["horizon_length"], 0)), presolve_info)
+        dtype = (inputs.get("solver_options") or {}).get("result_dtype", np.float64)
+        soe = postsolve_soe(np.zeros((inputs["horizon_length"], 0)), power_profile, presolve_info, inputs)
+        result = PlanResult(
+            status=cp.OPTIMAL, objective=0., power=power_profile.astype(dtype), activation=activation_profile,
+            soe=soe.astype(dtype), solve_time=0., iterations=0, gap=0., variables=0, constraints=0
+        )
+    else:
+        reduced_activation, reduced_power, result = planner(**reduced_inputs)
+        activation_profile, power_profile = postsolve(reduced_power, presolve_info)
+
+    if isinstance(result, PlanResult):
+        if result.soe is not None and reduced_inputs["nbr_vehicle"] > 0:
+            result.soe = postsolve_soe(result.soe, power_profile, presolve_info, inputs).astype(result.soe.dtype)
+        result.power, result.activation = power_profile.astype(result.power.dtype), activation_profile
+        if result.objective is not None:
+            result.objective += fixed_objective
+            result.objective_terms = {
+                term: result.objective_terms.get(term, 0.) + value
+                for term, value in presolve_info["fixed_terms"].items()
+            }
+        result.presolve = presolve_info["stats"]
+    else:
+        # scipy OptimizeResult of the sparse backend (objective "fun") or result dictionary
+        objective = "fun" if "fun" in result else "objective"
+        if result.get(objective) is not None:
+            result[objective] += fixed_objective
+        result["presolve"] = presolve_info["stats"]
+
+    return activation_profile, power_profile, result
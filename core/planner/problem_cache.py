@@ -0,0 +1,72 @@
+# problem_cache.py
+# LRU cache of compiled (DPP) CVXPY problems, so that repeated plans skip the CVXPY canonicalization
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable
+import cvxpy as cp
+from core.utility.logger.custom_loggers import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class ProblemCache:
+    """
+    LRU cache of parametrized problems, keyed on (formulation, nbr_vehicle, horizon_length, solver).
+
+    Each entry holds the CVXPY problem, its parameters (by name) and a lock: a cached problem is shared, so
+    setting its parameters, solving and reading the solution must be done while holding the lock.
+    """
+
+    def __init__(self, maxsize: int = 8):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+            self, key: Hashable, builder: Callable[[], tuple[cp.Problem, Dict[str, cp.Parameter]]]
+    ) -> tuple[cp.Problem, Dict[str, cp.Parameter], threading.Lock]:
+        """
+        Return the cached problem for key, building it with builder() if it is not cached yet.
+
+        :param key: cache key
+        :param builder: function returning a new (problem, parameters) pair
+        :return: problem, parameters and the lock of the entry
+        """
+
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+            self.misses += 1
+
+        logger.info(f"Building problem {key}")
+        prob, parameters = builder()
+        entry = (prob, parameters, threading.Lock())
+
+        with self._lock:
+            # Another thread may have built the same problem in the meantime
+            entry = self._entries.setdefault(key, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                evicted_key, _ = self._entries.popitem(last=False)
+                logger.info(f"Evicting problem {evicted_key}")
+
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits, self.misses = 0, 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+
+problem_cache = ProblemCache()
@@ -0,0 +1,175 @@
+# relaxation.py
+# Two-phase MILP: LP relaxation, vectorized rounding / repair of the activation, optional MILP polish
+import time
+from typing import Dict, List
+import numpy as np
+from scipy.optimize import Bounds, LinearConstraint, milp
+from core.planner.optimization import evcsp_lp, evcsp_objective, evcsp_parameter_values, feasible_power_profile
+from core.planner.sparse_backend import evcsp_matrices
+from core.utility.logger.custom_loggers import setup_logger
+
+logger = setup_logger(__name__)
+
+# Options of the rounding and polish phases, not passed to the LP solver
+RELAXATION_OPTIONS = ("activation_threshold", "polish", "polish_time_limit", "mip_gap")
+
+
+def round_activation(
+        power_profile: np.ndarray, parameter_values: Dict, threshold: float = 1e-3
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Round a relaxed charging profile to an on/off pattern: a cell is activated if its power exceeds threshold
+    (residual powers of interior point solvers are dropped), then the profile is repaired to satisfy
+    power <= power_nom * activation and the station power limit (see feasible_power_profile).
+
+    :param power_profile: (horizon_length, nbr_vehicle) relaxed charging profile [kW]
+    :param parameter_values: parameter values (see evcsp_parameter_values)
+    :param threshold: minimum power of an activated cell [kW]
+    :return:
+        activation_profile: charging indicators profile (1 for charging, 0 for not charging)
+        power_profile: repaired charging profile [kW]
+    """
+
+    activation_profile = (power_profile > threshold) & (parameter_values["Parked"] > 0)
+    power_profile = feasible_power_profile(np.where(activation_profile, power_profile, 0.), parameter_values)
+
+    return power_profile > 0, power_profile
+
+
+def _polish(
+        power_profile: np.ndarray, activation_profile: np.ndarray, inputs: Dict, solver_options: Dict,
+        tolerance: float
+) -> tuple[np.ndarray, np.ndarray, int] | None:
+    """
+    MILP polish with HiGHS: activations are fixed to the rounded pattern, except on the fractional cells of the LP
+    (0 < power < power_nom), which remain binary. Powers are free.
+
+    :param power_profile: relaxed charging profile (LP solution) [kW]
+    :param activation_profile: rounded activation profile
+    :param inputs: EVCSP inputs (see evcsp_matrices)
+    :param solver_options: "polish_time_limit", "mip_gap" and "verbose"
+    :param tolerance: relative tolerance of the fractional cells
+    :return: activation profile, power profile and number of binary cells, None if no solution is found
+    """
+
+    matrices = evcsp_matrices(**inputs, integral=True, layout="window")
+    t_idx, v_idx = matrices["cells"]
+    offset, size = matrices["offsets"]["activation"], matrices["sizes"]["activation"]
+
+    power_nom = np.asarray(inputs["power_nom"], dtype=float)
+    relaxed = power_profile[t_idx, v_idx] / np.maximum(power_nom[v_idx], 1e-12)
+    fractional = (relaxed > tolerance) & (relaxed < 1 - tolerance)
+
+    lb, ub, integrality = matrices["lb"].copy(), matrices["ub"].copy(), matrices["integrality"].copy()
+    fixed = offset + np.flatnonzero(~fractional)
+    lb[fixed] = ub[fixed] = activation_profile[t_idx, v_idx][~fractional]
+    integrality[fixed] = 0
+
+    options = {"disp": bool(solver_options.get("verbose", False)),
+               "time_limit": solver_options.get("polish_time_limit", 10.)}
+    if solver_options.get("mip_gap") is not None:
+        options["mip_rel_gap"] = solver_options["mip_gap"]
+
+    result = milp(
+        c=matrices["c"],
+        constraints=[
+            LinearConstraint(matrices["A_eq"], matrices["b_eq"], matrices["b_eq"]),
+            LinearConstraint(matrices["A_ub"], -np.inf, matrices["b_ub"])
+        ],
+        integrality=integrality, bounds=Bounds(lb, ub), options=options
+    )
+    if result.x is None:
+        logger.warning(f"MILP polish failed: {result.message}")
+        return None
+
+    power_offset, power_size = matrices["offsets"]["power"], matrices["sizes"]["power"]
+    polished_power = np.zeros_like(power_profile)
+    polished_power[t_idx, v_idx] = np.maximum(result.x[power_offset:power_offset + power_size], 0.)
+    polished_activation = np.zeros(power_profile.shape, dtype=bool)
+    polished_activation[t_idx, v_idx] = result.x[offset:offset + size] > 0.5
+
+    return polished_activation, polished_power * polished_activation, int(fractional.sum())
+
+
+def evcsp_milp_relaxed(
+        nbr_vehicle: int, arrival_idx: List[int], departure_idx: List[int], power_nom: List[int],
+        required_energy: List[int], capacity_nom: List[float], soe_init: List[float], p_max_infra: float | List[float],
+        horizon_length: int, time_step: int = 900, solver_options: dict = None, prices=None,
+        efficiency_charging: float = 0.9
+) -> tuple[np.ndarray, np.ndarray, Dict]:
+    """
+    Two-phase MILP version of EVCSP: the LP relaxation is solved with evcsp_lp (phase one), then rounded to an
+    on/off pattern and repaired (phase two, see round_activation). Optionally, a small MILP limited to the fractional
+    cells of the LP polishes the plan. The LP optimum is a lower bound of the MILP, so the gap of the plan is known.
+
+    :param nbr_vehicle: number of vehicles / terminal considered in the horizon
+    :param arrival_idx: index of arrival time
+    :param departure_idx: index of departure time
+    :param power_nom: nominal power of each vehicle [kW]
+    :param required_energy: energy demand for each vehicle [kWh]
+    :param capacity_nom: nominal capacity for each vehicle [kWh]
+    :param soe_init: Initial SOE of vehicles at arrival [kWh]
+    :param p_max_infra: max power profile for the station [kW]
+    :param horizon_length: horizon length [time steps]
+    :param time_step: [seconds]
+    :param solver_options: options of evcsp_lp, plus "activation_threshold" (minimum power of an activated cell,
+        default 1e-3 kW), "polish" (default False), "polish_time_limit" (default 10 s) and "mip_gap"
+    :param prices: contain prices information for the optimization problem
+    :param efficiency_charging: charging efficiency (on the scale of 1, not 100%)
+    :return:
+        activation_profile: charging indicators profile (1 for charging, 0 for not charging)
+        power_profile: power charging profile
+        result: status, objective, lower bound (LP), gap, number of polished cells and time of each phase
+    """
+
+    if solver_options is None:
+        solver_options = {}
+
+    logger.info("Two-phase MILP Formulation (LP relaxation and repair)")
+    start_time = time.time()
+
+    inputs = {
+        "nbr_vehicle": nbr_vehicle, "arrival_idx": arrival_idx, "departure_idx": departure_idx, "power_nom": power_nom,
+        "required_energy": required_energy, "capacity_nom": capacity_nom, "soe_init": soe_init,
+        "p_max_infra": p_max_infra, "horizon_length": horizon_length, "time_step": time_step, "prices": prices,
+        "efficiency_charging": efficiency_charging,
+    }
+
+    # Phase one: LP relaxation
+    _, power_relaxed, prob = evcsp_lp(
+        **inputs, solver_options={k: v for k, v in solver_options.items() if k not in RELAXATION_OPTIONS}
+    )
+    lower_bound = prob.solve_report["objective"]
+    time_relaxation = time.time() - start_time
+
+    # Phase two: rounding and repair
+    parameter_values = evcsp_parameter_values(**{k: v for k, v in inputs.items() if k != "nbr_vehicle"})
+    threshold = solver_options.get("activation_threshold", 1e-3)
+    activation_profile, power_profile = round_activation(power_relaxed, parameter_values, threshold=threshold)
+    objective = evcsp_objective(power_profile, parameter_values)
+
+    # Optional phase three: MILP polish on the fractional cells
+    n_polished = 0
+    if solver_options.get("polish", False) and lower_bound is not None:
+        polished = _polish(
+            power_profile=power_relaxed, activation_profile=activation_profile, inputs=inputs,
+            solver_options=solver_options, tolerance=threshold / 100
+        )
+        if polished is not None and evcsp_objective(polished[1], parameter_values) < objective:
+            activation_profile, power_profile, n_polished = polished
+            objective = evcsp_objective(power_profile, parameter_values)
+
+    # The LP optimum is a lower bound: a negative gap is only numerical noise
+    gap = None if lower_bound is None else max(objective - lower_bound, 0.) / max(abs(lower_bound), 1e-9)
+    result = {
+        "status": prob.solve_report["status"],
+        "objective": objective,
+        "lower_bound": lower_bound,
+        "gap": gap,
+        "polished_cells": n_polished,
+        "time_relaxation": time_relaxation,
+        "solve_time": time.time() - start_time,
+    }
+    logger.info(f"Two-phase MILP: objective {objective:.4f}, gap {gap}, {round(result['solve_time'], 3)} seconds")
+
+    return activation_profile, power_profile, result
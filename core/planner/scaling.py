@@ -0,0 +1,133 @@
+# scaling.py
+# Automatic scaling of the EVCSP: power, energy and objective units chosen per instance, applied to parameter values
+from typing import Dict
+import numpy as np
+
+# Values of solver_options["scaling"]: scales chosen from the instance (see problem_scales), or no scaling
+SCALING_MODES = ("auto", None)
+
+
+def _power_of_two(value: float) -> float:
+    # Scales are powers of 2, so that scaling and unscaling are exact in floating point
+    return float(2. ** np.round(np.log2(value))) if value > 0 and np.isfinite(value) else 1.
+
+
+def problem_scales(parameter_values: Dict) -> Dict[str, float]:
+    """
+    Scales of the EVCSP variables and objective: the power variables are expressed in units of the largest
+    nominal power, the energy variables in units of the largest SOE bound or energy demand, and the objective in
+    units of the largest service coefficient (unsatisfied energy or energy cost of one scaled unit). The station
+    limit violation price is an exact penalty and stays larger than the service coefficients.
+
+    :param parameter_values: parameter values (see optimization.evcsp_parameter_values)
+    :return: scales of the power [kW], of the energy [kWh] and of the objective [currency], powers of 2
+    """
+
+    power = _power_of_two(np.max(parameter_values["Power Max"], initial=0.))
+    energy = _power_of_two(max(
+        np.max(parameter_values["SOE Upper"], initial=0.), np.max(parameter_values["Required Energy"], initial=0.)
+    ))
+    objective = _power_of_two(max(
+        energy * np.max(np.abs(parameter_values["Unsatisfied Weight"]), initial=0.),
+        power * abs(parameter_values["Energy Price"]),
+    ))
+
+    return {"power": power, "energy": energy, "objective": objective}
+
+
+def parameter_factors(scales: Dict[str, float]) -> Dict[str, float]:
+    """
+    Factor applied to each parameter value for given scales: power and energy bounds are divided by their unit,
+    the charging factor (energy per power) and the objective weights (currency per power or energy) are multiplied
+    by the ratio of their units. Each constraint row is then expressed in the unit of its right-hand side.
+
+    :param scales: scales of the power, energy and objective (see problem_scales)
+    :return: factors, indexed by parameter names (parameters without unit are not scaled)
+    """
+
+    power, energy, objective = scales["power"], scales["energy"], scales["objective"]
+    return {
+        "Power Max": 1 / power,
+        "Power Nom Max": 1 / power,
+        "Peak Power Capacity": 1 / power,
+        "SOE Lower": 1 / energy,
+        "SOE Upper": 1 / energy,
+        "Required Energy": 1 / energy,
+        "Energy After": 1 / energy,
+        "Charging Factor": power / energy,
+        "Unsatisfied Weight": energy / objective,
+        "Energy Price": power / objective,
+        "Violation Price": power / objective,
+    }
+
+
+def exact_violation_price(parameter_values: Dict) -> float:
+    """
+    Safe price of the station limit violation: twice the largest value of one more kW at every time step (the
+    violation is the same at all time steps), each kW being worth at most the unsatisfied energy penalty it avoids
+    plus the energy price. Above this price, violating the limit never pays off, so the soft limit is exact (no
+    violation at the optimum) when the limit is nonnegative, and the optimal plan does not depend on the price. The
+    violation price is then capped to this value, instead of orders of magnitude above the other objective
+    coefficients.
+
+    :param parameter_values: parameter values (see optimization.evcsp_parameter_values)
+    :return: price [currency / kW]
+    """
+
+    marginal_value = np.max(parameter_values["Unsatisfied Weight"], initial=0.) * parameter_values["Charging Factor"] \
+        + abs(parameter_values["Energy Price"])
+    return float(2 * len(parameter_values["Peak Power Capacity"]) * marginal_value)
+
+
+def scale_parameter_values(parameter_values: Dict, scales: Dict[str, float]) -> Dict:
+    """
+    Parameter values of the scaled problem. The optimal power, SOE and objective of the scaled problem are those of
+    the original problem divided by scales["power"], scales["energy"] and scales["objective"]. The violation price
+    is capped to its exact value (see exact_violation_price) if the station limit is nonnegative.
+
+    :param parameter_values: parameter values (see optimization.evcsp_parameter_values)
+    :param scales: scales of the power, energy and objective (see problem_scales)
+    :return: scaled parameter values
+    """
+
+    values = dict(parameter_values)
+    if "Violation Price" in values and np.min(values["Peak Power Capacity"], initial=0.) >= 0:
+        values["Violation Price"] = min(values["Violation Price"], exact_violation_price(values))
+
+    factors = parameter_factors(scales)
+    return {name: value * factors[name] if name in factors else value for name, value in values.items()}
+
+
+def _value_range(*values) -> Dict[str, float]:
+    magnitudes = np.abs(np.concatenate([np.ravel(value) for value in values]))
+    magnitudes = magnitudes[magnitudes > 0]
+    if len(magnitudes) == 0:
+        return {"min": 0., "max": 0., "orders": 0.}
+
+    low, high = float(magnitudes.min()), float(magnitudes.max())
+    return {"min": low, "max": high, "orders": float(np.log10(high / low))}
+
+
+def condition_diagnostics(parameter_values: Dict, formulation: str = "lp") -> Dict[str, Dict[str, float]]:
+    """
+    Ranges of the nonzero coefficients of the EVCSP (as reported by LP solvers): constraint matrix, objective and
+    right-hand sides. "orders" is the number of orders of magnitude between the smallest and the largest
+    coefficient of each range; interior-point solvers lose accuracy and iterations when it is large.
+
+    :param parameter_values: parameter values (see optimization.evcsp_parameter_values), scaled or not
+    :param formulation: "lp" (soft station limit) or "milp" (big-M activation constraints)
+    :return: range of the constraint matrix, of the objective and of the right-hand sides
+    """
+
+    matrix = [1., parameter_values["Charging Factor"]]
+    objective = [parameter_values["Unsatisfied Weight"], parameter_values["Energy Price"]]
+    if formulation == "milp":
+        matrix.append(parameter_values["Power Nom Max"])
+    else:
+        objective.append(parameter_values["Violation Price"])
+
+    rhs = [parameter_values[name] for name in (
+        "Power Max", "SOE Lower", "SOE Upper", "Required Energy", "Peak Power Capacity", "Energy After"
+    ) if name in parameter_values]
+
+    return {"matrix": _value_range(*matrix), "objective": _value_range(*objective), "rhs": _value_range(*rhs)}
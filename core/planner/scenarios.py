@@ -0,0 +1,115 @@
+# scenarios.py
+# Scenario-batch solving of the EVCSP: demand perturbations solved through one compiled problem per process
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List
+import numpy as np
+import pandas as pd
+from core.planner.decomposition import result_summary
+from core.utility.logger.custom_loggers import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def perturb_demand(
+        data_demand: pd.DataFrame, n_scenarios: int, horizon_length: int, arrival_std: float = 2.,
+        departure_std: float = 2., energy_std: float = 0.1, seed: int = None
+) -> List[pd.DataFrame]:
+    """
+    Demand scenarios around a nominal demand: arrival and departure indices are shifted by rounded gaussian noise,
+    and required energies are scaled by lognormal noise. The first scenario is the nominal demand.
+
+    Perturbed values are kept valid: 0 <= arrival < departure <= horizon_length (at least one parked time step) and
+    0 <= energyRequired <= energyMax - arrivalSOE. All scenarios have the same vehicles (same number of columns of
+    the planning problem), so they share the compiled problem.
+
+    :param data_demand: nominal charging demand data (arrivalTime and departureTime as time step indices)
+    :param n_scenarios: number of scenarios, including the nominal one
+    :param horizon_length: horizon length [time steps]
+    :param arrival_std: standard deviation of the arrival shift [time steps]
+    :param departure_std: standard deviation of the departure shift [time steps]
+    :param energy_std: standard deviation of the log of the required energy factor
+    :param seed: seed of the random generator
+    :return: list of n_scenarios demand data
+    """
+
+    rng = np.random.default_rng(seed)
+    size = (n_scenarios - 1, len(data_demand))
+
+    arrival = data_demand["arrivalTime"].to_numpy(dtype=int)
+    departure = data_demand["departureTime"].to_numpy(dtype=int)
+    energy_required = data_demand["energyRequired"].to_numpy(dtype=float)
+    headroom = np.clip(
+        data_demand["energyMax"].to_numpy(dtype=float) - data_demand["arrivalSOE"].to_numpy(dtype=float), 0, None
+    )
+
+    arrivals = np.clip(arrival + np.rint(rng.normal(0., arrival_std, size)).astype(int), 0, horizon_length - 1)
+    departures = np.clip(
+        departure + np.rint(rng.normal(0., departure_std, size)).astype(int), arrivals + 1, horizon_length
+    )
+    energies = np.clip(energy_required * rng.lognormal(0., energy_std, size), 0, np.maximum(headroom, energy_required))
+
+    scenarios = [data_demand.copy()]
+    for k in range(n_scenarios - 1):
+        scenario = data_demand.copy()
+        scenario["arrivalTime"] = arrivals[k]
+        scenario["departureTime"] = departures[k]
+        scenario["energyRequired"] = energies[k]
+        scenarios.append(scenario)
+
+    return scenarios
+
+
+def _solve_scenario(solve: Callable, inputs: Dict) -> tuple[np.ndarray, np.ndarray, Dict]:
+    activation_profile, power_profile, result = solve(**inputs)
+    return activation_profile, power_profile, result_summary(result)
+
+
+def solve_scenarios(
+        solve: Callable, scenario_inputs: List[Dict], n_jobs: int = 1
+) -> tuple[np.ndarray, np.ndarray, Dict]:
+    """
+    Solve a batch of EVCSP scenarios of the same size (number of vehicles and horizon length).
+
+    The planners of the CVXPY backend keep their compiled problem in problem_cache, so each process compiles the
+    problem once and only updates its parameters for the next scenarios. Scenarios are given to the processes of
+    the pool by contiguous chunks.
+
+    :param solve: planner with the signature of evcsp_lp, returning (activation, power, result). It must be
+        picklable (module level function or functools.partial of one) when n_jobs is not 1
+    :param scenario_inputs: arguments of solve for each scenario
+    :param n_jobs: number of processes (-1 for all cores, 1 to solve the scenarios sequentially in this process)
+    :return:
+        activation_profiles: (n_scenarios, horizon_length, nbr_vehicle) charging indicators
+        power_profiles: (n_scenarios, horizon_length, nbr_vehicle) charging profiles [kW]
+        result: status of the batch (first status of a scenario that is not optimal), objective of each scenario and
+            the summary of each scenario (see decomposition.result_summary)
+    """
+
+    shapes = {(inputs["horizon_length"], inputs["nbr_vehicle"]) for inputs in scenario_inputs}
+    if len(shapes) != 1:
+        raise ValueError(f"Scenarios must have the same horizon length and number of vehicles, got {shapes}")
+
+    n_scenarios = len(scenario_inputs)
+    n_jobs = min(os.cpu_count() if n_jobs == -1 else n_jobs, n_scenarios)
+    logger.info(f"{n_scenarios} scenarios, solved with {n_jobs} processes")
+
+    if n_jobs == 1:
+        outputs = [_solve_scenario(solve, inputs) for inputs in scenario_inputs]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            outputs = list(executor.map(
+                _solve_scenario, [solve] * n_scenarios, scenario_inputs, chunksize=-(-n_scenarios // n_jobs)
+            ))
+
+    activation_profiles = np.stack([np.asarray(activation) > 0 for activation, _, _ in outputs])
+    power_profiles = np.stack([np.asarray(power, dtype=float) for _, power, _ in outputs])
+
+    summaries = [summary for _, _, summary in outputs]
+    result = {
+        "status": next((s["status"] for s in summaries if s["status"] != "optimal"), "optimal"),
+        "objective": np.array([np.nan if s["objective"] is None else s["objective"] for s in summaries]),
+        "scenarios": summaries,
+    }
+
+    return activation_profiles, power_profiles, result
@@ -0,0 +1,157 @@
+# solve_control.py
+# Solve control of CVXPY problems: per-solver translation of time limit / MIP gap / threads, warm start and report
+import time
+from typing import Dict
+import cvxpy as cp
+import numpy as np
+from core.utility.logger.custom_loggers import setup_logger
+
+logger = setup_logger(__name__)
+
+# Names of the generic options "time_limit" [s], "mip_gap" (relative) and "threads" for each solver
+SOLVER_OPTION_NAMES = {
+    cp.HIGHS: {"time_limit": "time_limit", "mip_gap": "mip_rel_gap", "threads": "threads"},
+    cp.SCIPY: {"time_limit": "time_limit", "mip_gap": "mip_rel_gap"},
+    cp.CLARABEL: {"time_limit": "time_limit", "threads": "max_threads"},
+    cp.OSQP: {"time_limit": "time_limit"},
+    cp.SCS: {"time_limit": "time_limit_secs"},
+    cp.GUROBI: {"time_limit": "TimeLimit", "mip_gap": "MIPGap", "threads": "Threads"},
+    cp.CBC: {"time_limit": "maximumSeconds", "mip_gap": "allowableFractionGap", "threads": "numberThreads"},
+    cp.SCIP: {"time_limit": "limits/time", "mip_gap": "limits/gap", "threads": "parallel/maxnthreads"},
+    cp.CPLEX: {"time_limit": "timelimit", "mip_gap": "mip.tolerances.mipgap", "threads": "threads"},
+    cp.MOSEK: {
+        "time_limit": "MSK_DPAR_OPTIMIZER_MAX_TIME", "mip_gap": "MSK_DPAR_MIO_TOL_REL_GAP",
+        "threads": "MSK_IPAR_NUM_THREADS"
+    },
+}
+
+# Errors of the CVXPY canonicalization of a problem for a solver (e.g. the matrix densified by the QP path of HiGHS
+# does not fit in memory), reported as solver errors
+CANONICALIZATION_ERRORS = (cp.error.DCPError, cp.error.DPPError, cp.error.ParameterError, ValueError, MemoryError)
+
+# Solvers taking their options in a dictionary argument of prob.solve
+SOLVER_OPTION_DICTS = {
+    cp.SCIPY: "scipy_options", cp.SCIP: "scip_params", cp.CPLEX: "cplex_params", cp.MOSEK: "mosek_params"
+}
+
+# Keys of solver_options handled by the solve control or by the planners, other keys are passed to prob.solve as
+# they are
+CONTROL_OPTIONS = (
+    "solver", "verbose", "warm_start", "time_limit", "mip_gap", "threads", "initial_power", "result_dtype",
+    "scaling",
+)
+
+
+def solver_kwargs(solver_options: Dict) -> Dict:
+    """
+    Keyword arguments of prob.solve for the given solver options: the generic options "time_limit", "mip_gap" and
+    "threads" are translated to the option names of the solver (options not supported by the solver are ignored
+    with a warning), other options are passed as they are.
+
+    :param solver_options: "solver", "verbose", "warm_start", "time_limit", "mip_gap", "threads" and solver
+        specific options
+    :return: keyword arguments of prob.solve
+    """
+
+    solver = solver_options.get("solver", cp.CLARABEL)
+    names = SOLVER_OPTION_NAMES.get(solver, {})
+
+    options = {}
+    for option in ("time_limit", "mip_gap", "threads"):
+        if solver_options.get(option) is None:
+            continue
+        if option in names:
+            options[names[option]] = solver_options[option]
+        else:
+            logger.warning(f"Option {option} is not supported for solver {solver}, ignored")
+
+    kwargs = {
+        "solver": solver,
+        "verbose": solver_options.get("verbose", False),
+        "warm_start": solver_options.get("warm_start", False),
+        **{k: v for k, v in solver_options.items() if k not in CONTROL_OPTIONS},
+    }
+    if solver in SOLVER_OPTION_DICTS:
+        default = {"method": "highs"} if solver == cp.SCIPY else {}
+        kwargs[SOLVER_OPTION_DICTS[solver]] = {**default, **options, **kwargs.get(SOLVER_OPTION_DICTS[solver], {})}
+    else:
+        kwargs.update(options)
+
+    return kwargs
+
+
+def mip_gap(prob: cp.Problem) -> float | None:
+    """
+    Relative MIP gap reported by the solver of the last solve, if any
+
+    :param prob: solved CVXPY problem
+    :return: relative gap, None if the solver does not report it
+    """
+
+    extra_stats = prob.solver_stats.extra_stats if prob.solver_stats is not None else None
+    if isinstance(extra_stats, dict):
+        gap = extra_stats.get("mip_gap")
+    else:
+        gap = getattr(extra_stats, "mip_gap", getattr(extra_stats, "MIPGap", None))
+
+    return None if gap is None else float(gap)
+
+
+def solve_problem(prob: cp.Problem, solver_options: Dict, initial_values: Dict[str, np.ndarray] = None) -> Dict:
+    """
+    Solve a CVXPY problem with the given solver options (see solver_kwargs), and report the solve.
+    When the time limit is reached, the best solution found so far (incumbent) is kept if the solver returns one.
+
+    :param prob: CVXPY problem
+    :param solver_options: solver options
+    :param initial_values: initial values of variables (by name), used as a warm start by the solvers supporting
+        it when solver_options["warm_start"] is True
+    :return: report with the solver, the status, whether a solution is available ("incumbent"), the objective,
+        the relative MIP gap (0 for a continuous problem solved to optimality, None if unknown), the elapsed time
+        and the part of it spent in the CVXPY canonicalization ("compilation_time"). A failure of the solver or of
+        the canonicalization (see CANONICALIZATION_ERRORS) is reported with the status cp.SOLVER_ERROR
+    """
+
+    kwargs = solver_kwargs(solver_options)
+
+    if kwargs["warm_start"] and initial_values:
+        for name, value in initial_values.items():
+            if name in prob.var_dict and value is not None:
+                prob.var_dict[name].value = value
+
+    start_time = time.time()
+    try:
+        prob.solve(**kwargs)
+        status = prob.status
+    except cp.SolverError as error:
+        logger.error(f"Solver {kwargs['solver']} failed: {error}")
+        status = cp.SOLVER_ERROR
+    except CANONICALIZATION_ERRORS as error:
+        logger.error(f"Problem not canonicalized for solver {kwargs['solver']}: {error!r}")
+        status = cp.SOLVER_ERROR
+    elapsed = time.time() - start_time
+    # Time of the CVXPY canonicalization (or of the parameter update of a compiled problem) within the solve
+    compilation_time = getattr(prob, "compilation_time", None) if status != cp.SOLVER_ERROR else None
+
+    if prob.is_mixed_integer():
+        gap = mip_gap(prob) if status != cp.SOLVER_ERROR else None
+    else:
+        gap = 0. if status == cp.OPTIMAL else None
+
+    incumbent = status in (cp.OPTIMAL, cp.OPTIMAL_INACCURATE) or (
+        status == cp.USER_LIMIT and all(v.value is not None for v in prob.variables())
+        and (gap is None or np.isfinite(gap))
+    )
+
+    report = {
+        "solver": kwargs["solver"],
+        "status": status,
+        "incumbent": bool(incumbent),
+        "objective": prob.value if incumbent else None,
+        "gap": gap,
+        "elapsed": elapsed,
+        "compilation_time": compilation_time,
+    }
+    logger.info(f"Solve report: {report}")
+
+    return report
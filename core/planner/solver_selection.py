@@ -0,0 +1,268 @@
+# solver_selection.py
+# Size-aware selection of the EVCSP formulation / backend / solver, from a cost model fitted on local benchmark runs
+import itertools
+import json
+import os
+import time
+from typing import Dict, List
+import cvxpy as cp
+import numpy as np
+from core.planner.decomposition import independent_blocks
+from core.utility.logger.custom_loggers import setup_logger
+
+logger = setup_logger(__name__)
+
+COST_MODEL_PATH = os.path.join(os.path.dirname(__file__), "cost_model.json")
+
+# Options of all planners when the solver is selected automatically
+DEFAULT_SOLVER_OPTIONS = {"time_limit": 60.0, "verbose": False, "warm_start": False}
+
+# Candidates of the selection: planner arguments, whether they return binary activations (MILP) and whether they
+# are exact. Heuristic candidates are only selected if solver_options["allow_heuristic"] is True. HiGHS is not a
+# candidate for the CVXPY LP: CVXPY sends LPs to HiGHS through its QP path, which densifies the constraint matrix.
+# The decomposition candidates (with "n_jobs") are only selected for instances of more than one independent block.
+CANDIDATES = {
+    "cvxpy_clarabel_lp": {"formulation": "lp", "backend": "cvxpy", "solver": cp.CLARABEL, "binaries": False},
+    "cvxpy_highs_milp": {"formulation": "milp", "backend": "cvxpy", "solver": cp.HIGHS, "binaries": True},
+    "cvxpy_scipy_milp": {"formulation": "milp", "backend": "cvxpy", "solver": cp.SCIPY, "binaries": True},
+    "highs_lp": {"formulation": "lp", "backend": "highs", "binaries": False},
+    "highs_milp": {"formulation": "milp", "backend": "highs", "binaries": True},
+    "decomposition_lp": {"formulation": "lp", "backend": "highs", "n_jobs": -1, "binaries": False},
+    "decomposition_milp": {"formulation": "milp", "backend": "highs", "n_jobs": -1, "binaries": True},
+    "heuristic": {"formulation": "heuristic", "backend": "cvxpy", "binaries": True, "exact": False},
+}
+
+FEATURES = ("intercept", "log_vehicles", "log_horizon", "log_cells", "density", "log_blocks")
+
+
+def instance_features(nbr_vehicle: int, arrival_idx: List[int], departure_idx: List[int], horizon_length: int) -> Dict:
+    """
+    Size features of an EVCSP instance: number of vehicles, horizon length, number of parked cells (variables of
+    the windowed formulations), window density (parked cells / (horizon_length * nbr_vehicle)) and number of
+    independent blocks (see decomposition.independent_blocks)
+
+    :param nbr_vehicle: number of vehicles
+    :param arrival_idx: index of arrival time
+    :param departure_idx: index of departure time
+    :param horizon_length: horizon length [time steps]
+    :return: features (see FEATURES), and the number of blocks ("blocks")
+    """
+
+    arrival = np.clip(np.asarray(arrival_idx, dtype=int), 0, horizon_length)
+    departure = np.clip(np.asarray(departure_idx, dtype=int), arrival, horizon_length)
+    cells = int((departure - arrival).sum())
+    blocks = len(independent_blocks(arrival, departure, horizon_length))
+
+    return {
+        "intercept": 1.,
+        "log_vehicles": float(np.log(max(nbr_vehicle, 1))),
+        "log_horizon": float(np.log(max(horizon_length, 1))),
+        "log_cells": float(np.log(max(cells, 1))),
+        "density": cells / max(nbr_vehicle * horizon_length, 1),
+        "log_blocks": float(np.log(max(blocks, 1))),
+        "blocks": blocks,
+    }
+
+
+def fit_cost_model(records: List[Dict], ridge: float = 1e-2) -> Dict:
+    """
+    Fit, for each candidate, a linear model of log(solving time) on the instance features. The size features are
+    nearly collinear (log_cells ~ log_vehicles + log_horizon), so the least squares are regularized (ridge, the
+    intercept is not penalized) to keep the extrapolation to larger instances stable.
+
+    :param records: benchmark runs with the "candidate", the instance "features" and the "solve_time" [s]
+    :param ridge: regularization weight
+    :return: cost model with the features, and the coefficients, the number of runs and the range of the features
+        (see predict_solve_time) of each candidate
+    """
+
+    penalty = ridge * np.diag([0.] + [1.] * (len(FEATURES) - 1))
+    model = {"features": list(FEATURES), "coefficients": {}, "runs": {}, "ranges": {}}
+    for name in sorted({record["candidate"] for record in records}):
+        runs = [record for record in records if record["candidate"] == name]
+        x = np.array([[run["features"][f] for f in FEATURES] for run in runs])
+        y = np.log(np.maximum([run["solve_time"] for run in runs], 1e-4))
+        coefficients = np.linalg.solve(x.T @ x + len(runs) * penalty, x.T @ y)
+        model["coefficients"][name] = coefficients.tolist()
+        model["runs"][name] = len(runs)
+        model["ranges"][name] = np.column_stack([x.min(axis=0), x.max(axis=0)]).tolist()
+
+    return model
+
+
+def save_cost_model(model: Dict, path: str = COST_MODEL_PATH) -> None:
+    with open(path, "w") as file:
+        json.dump(model, file, indent=2)
+
+
+def load_cost_model(path: str = COST_MODEL_PATH) -> Dict | None:
+    if not os.path.exists(path):
+        logger.warning(f"No cost model at {path}")
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+def predict_solve_time(model: Dict, candidate: str, features: Dict) -> float | None:
+    """
+    Predicted solving time of a candidate. The features are clipped to the range of the runs the candidate was
+    fitted on: outside of it, the fitted trends (e.g. decreasing with the horizon) are not extrapolated.
+
+    :param model: cost model (see fit_cost_model)
+    :param candidate: name of the candidate (see CANDIDATES)
+    :param features: instance features (see instance_features)
+    :return: solving time [s], None if the candidate is not in the model
+    """
+
+    if candidate not in model["coefficients"]:
+        return None
+
+    x = np.array([features[f] for f in model["features"]])
+    if candidate in model.get("ranges", {}):
+        x = np.clip(x, *np.asarray(model["ranges"][candidate]).T)
+    return float(np.exp(x @ np.asarray(model["coefficients"][candidate])))
+
+
+def select_candidate(
+        features: Dict, binaries: bool, cvxpy_only: bool = False, allow_heuristic: bool = False, model: Dict = None
+) -> str:
+    """
+    Select the candidate with the lowest predicted solving time
+
+    :param features: instance features (see instance_features)
+    :param binaries: whether binary activations are needed (MILP)
+    :param cvxpy_only: only select a candidate of the CVXPY backend (the planner returns a CVXPY problem)
+    :param allow_heuristic: whether approximate candidates can be selected
+    :param model: cost model, default the persisted model (see load_cost_model)
+    :return: name of the candidate (see CANDIDATES)
+    """
+
+    eligible = [
+        name for name, candidate in CANDIDATES.items()
+        if candidate["binaries"] == binaries and (candidate.get("exact", True) or allow_heuristic)
+        and (candidate["backend"] == "cvxpy" or not cvxpy_only)
+        and not ("n_jobs" in candidate and (cvxpy_only or features["blocks"] <= 1))
+    ]
+
+    model = model if model is not None else load_cost_model()
+    predictions = {} if model is None else {name: predict_solve_time(model, name, features) for name in eligible}
+    predictions = {name: value for name, value in predictions.items() if value is not None}
+
+    if not predictions:
+        logger.warning(f"No cost model for candidates {eligible}, selecting {eligible[0]}")
+        return eligible[0]
+
+    selected = min(predictions, key=predictions.get)
+    logger.info(
+        f"Selected {selected} for {features}: predicted solving times "
+        + ", ".join(f"{name} {value:.3f} s" for name, value in sorted(predictions.items(), key=lambda kv: kv[1]))
+    )
+
+    return selected
+
+
+def resolve_auto(
+        formulation: str, backend: str, solver_options: dict, features: Dict
+) -> tuple[str, str, dict, int]:
+    """
+    Planner arguments of the selected candidate, for the "auto" backend (any candidate) or the "auto" solver of the
+    CVXPY backend (CVXPY candidates only)
+
+    :param formulation: "lp" or "milp" (whether binary activations are needed)
+    :param backend: "auto" or "cvxpy"
+    :param solver_options: solver options, with "allow_heuristic" (default False)
+    :param features: instance features (see instance_features)
+    :return: formulation, backend, solver options and number of processes of the selected candidate
+    """
+
+    if formulation not in ("lp", "milp"):
+        raise ValueError(f"Invalid formulation {formulation} for an automatic selection, must be milp or lp")
+
+    solver_options = dict(solver_options or {})
+    allow_heuristic = solver_options.pop("allow_heuristic", False)
+    solver_options.pop("solver", None)
+
+    candidate = CANDIDATES[select_candidate(
+        features=features, binaries=formulation == "milp", cvxpy_only=backend != "auto",
+        allow_heuristic=allow_heuristic
+    )]
+    if "solver" in candidate:
+        solver_options["solver"] = candidate["solver"]
+
+    return candidate["formulation"], candidate["backend"], solver_options, candidate.get("n_jobs", 1)
+
+
+def split_blocks(arrival_idx: np.ndarray, departure_idx: np.ndarray, horizon_length: int, n_blocks: int):
+    """
+    Demand of n_blocks independent blocks (see decomposition.independent_blocks): vehicle v is moved to the block
+    v % n_blocks, whose parking windows are those of the horizon compressed to its n_blocks-th of the horizon
+
+    :param arrival_idx: index of arrival time
+    :param departure_idx: index of departure time
+    :param horizon_length: horizon length [time steps]
+    :param n_blocks: number of blocks
+    :return: arrival and departure indices of the vehicles
+    """
+
+    length = horizon_length // n_blocks
+    block_start = length * (np.arange(len(arrival_idx)) % n_blocks)
+    arrival = np.clip(np.asarray(arrival_idx, dtype=int), 0, horizon_length - 1) * length // horizon_length
+    departure = -(-np.clip(np.asarray(departure_idx, dtype=int), 0, horizon_length) * length // horizon_length)
+    departure = np.clip(departure, arrival + 1, length)
+
+    return block_start + arrival, block_start + departure
+
+
+def benchmark_candidates(
+        candidates: List[str], nbr_vehicles: List[int], horizon_lengths: List[int], seeds: List[int],
+        time_step: int = 900, capacity_per_vehicle: float = 5., solver_options: dict = None, blocks: List[int] = (1, )
+) -> List[Dict]:
+    """
+    Time the candidates on synthetic demands (see generate_demand_data), to fit the cost model
+
+    :param candidates: names of the candidates (see CANDIDATES)
+    :param nbr_vehicles: numbers of vehicles
+    :param horizon_lengths: horizon lengths [time steps]
+    :param seeds: seeds of the synthetic demands
+    :param time_step: time step [seconds]
+    :param capacity_per_vehicle: station capacity per vehicle [kW]
+    :param solver_options: options of the planners, default DEFAULT_SOLVER_OPTIONS
+    :param blocks: numbers of independent blocks of the demands (see split_blocks). The decomposition candidates
+        are only timed on demands of more than one block, the only ones they are selected for
+    :return: benchmark runs (see fit_cost_model)
+    """
+
+    # Imported here: the day-ahead planner uses this module for the "auto" backend
+    from core.planner.day_ahead_planner import create_charging_plans
+    from core.utility.data.data_processor import generate_demand_data, prepare_planning_data
+
+    records = []
+    for horizon_length, nbr_vehicle, seed, n_blocks in itertools.product(horizon_lengths, nbr_vehicles, seeds, blocks):
+        np.random.seed(seed)
+        demand = prepare_planning_data(
+            generate_demand_data(nbr_vehicles=nbr_vehicle, horizon_length=horizon_length, time_step=time_step),
+            time_step=time_step
+        )
+        if n_blocks > 1:
+            demand["arrivalTime"], demand["departureTime"] = split_blocks(
+                demand["arrivalTime"], demand["departureTime"], horizon_length, n_blocks
+            )
+        features = instance_features(nbr_vehicle, demand["arrivalTime"], demand["departureTime"], horizon_length)
+        for name in candidates:
+            candidate = CANDIDATES[name]
+            if "n_jobs" in candidate and features["blocks"] <= 1:
+                continue
+            options = {**(solver_options or DEFAULT_SOLVER_OPTIONS)}
+            if "solver" in candidate:
+                options["solver"] = candidate["solver"]
+            start_time = time.time()
+            create_charging_plans(
+                demand, horizon_length=horizon_length, time_step=time_step, nbr_vehicle=nbr_vehicle,
+                capacity_grid=capacity_per_vehicle * nbr_vehicle, formulation=candidate["formulation"],
+                backend=candidate["backend"], n_jobs=candidate.get("n_jobs", 1), solver_options=options
+            )
+            records.append({"candidate": name, "features": features, "solve_time": time.time() - start_time})
+            logger.info(f"Benchmark {name}, {nbr_vehicle} vehicles, {horizon_length} steps: "
+                        f"{records[-1]['solve_time']:.3f} s")
+
+    return records
@@ -0,0 +1,367 @@
+# sparse_backend.py
+# EVCSP assembled directly as scipy.sparse matrices and solved by HiGHS (scipy.optimize), bypassing CVXPY
+import time
+from typing import Dict, List
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import Bounds, LinearConstraint, OptimizeResult, linprog, milp
+from core.planner.optimization import evcsp_parameter_values, shift_matrices, PRICE_POWER_VIOLATION
+from core.planner.telemetry import PhaseTimer
+from core.utility.logger.custom_loggers import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def _block_row(n_rows: int, blocks: Dict[str, sp.spmatrix], offsets: Dict[str, int], n_cols: int) -> sp.csr_matrix:
+    """
+    Place sparse blocks side by side, each one at the column offset of its variable
+
+    :param n_rows: number of rows of the blocks
+    :param blocks: sparse blocks, indexed by variable name
+    :param offsets: column offsets of the variables
+    :param n_cols: total number of columns
+    :return: (n_rows, n_cols) CSR matrix
+    """
+
+    rows, cols, data = [], [], []
+    for name, block in blocks.items():
+        block = sp.coo_matrix(block)
+        rows.append(block.row)
+        cols.append(block.col + offsets[name])
+        data.append(block.data)
+
+    return sp.csr_matrix(
+        (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))), shape=(n_rows, n_cols)
+    )
+
+
+def evcsp_matrices(
+        nbr_vehicle: int, arrival_idx: List[int], departure_idx: List[int], power_nom: List[int],
+        required_energy: List[int], capacity_nom: List[float], soe_init: List[float], p_max_infra: float | List[float],
+        horizon_length: int, time_step: int = 900, prices: dict = None, efficiency_charging: float = 0.9,
+        integral: bool = False, peak_power_soft_constraint: bool = True, layout: str = "dense"
+) -> Dict:
+    """
+    Assemble the EVCSP (same formulation as evcsp_lp, or evcsp_milp if integral) in matrix form:
+        min c @ x  s.t.  A_eq @ x == b_eq,  A_ub @ x <= b_ub,  lb <= x <= ub
+
+    With the "dense" layout, variables are stacked as [power, soe, soe_under, soe_over, peak_over, activation],
+    (t, v) entries being flattened vehicle by vehicle, i.e. x[offset + v * horizon_length + t].
+    With the "window" layout, power and activation variables only exist within the parking windows
+    (see _evcsp_matrices_window). In both cases, "cells" gives the (t, v) indices of the power variables.
+
+    :param nbr_vehicle: number of vehicles / terminal considered in the horizon
+    :param arrival_idx: index of arrival time
+    :param departure_idx: index of departure time
+    :param power_nom: nominal power of each vehicle [kW]
+    :param required_energy: energy demand for each vehicle [kWh]
+    :param capacity_nom: nominal capacity for each vehicle [kWh]
+    :param soe_init: Initial SOE of vehicles at arrival [kWh]
+    :param p_max_infra: max power profile for the station [kW]
+    :param horizon_length: horizon length [time steps]
+    :param time_step: [seconds]
+    :param prices: contain prices information for the optimization problem
+    :param efficiency_charging: charging efficiency (on the scale of 1, not 100%)
+    :param integral: if True, add the boolean activation variables (MILP), with a hard station power limit
+    :param peak_power_soft_constraint: if True (and not integral), the station power limit is a soft constraint
+    :param layout: "dense" (variables over the whole horizon) or "window" (variables within parking windows only)
+    :return: dictionary with c, A_eq, b_eq, A_ub, b_ub, lb, ub, integrality, the variable offsets and sizes and
+        the (t, v) cells of the power variables
+    """
+
+    values = evcsp_parameter_values(
+        arrival_idx=arrival_idx, departure_idx=departure_idx, power_nom=power_nom, required_energy=required_energy,
+        capacity_nom=capacity_nom, soe_init=soe_init, p_max_infra=p_max_infra, horizon_length=horizon_length,
+        time_step=time_step, prices=prices, efficiency_charging=efficiency_charging
+    )
+    peak_power_soft_constraint = peak_power_soft_constraint and not integral
+
+    if layout == "window":
+        return _evcsp_matrices_window(
+            values=values, power_nom=power_nom, capacity_nom=capacity_nom, soe_init=soe_init,
+            nbr_vehicle=nbr_vehicle, horizon_length=horizon_length, integral=integral,
+            peak_power_soft_constraint=peak_power_soft_constraint
+        )
+
+    def flat(matrix: np.ndarray) -> np.ndarray:
+        return np.asarray(matrix).T.ravel()
+
+    n_tv = horizon_length * nbr_vehicle
+    sizes = {
+        "power": n_tv, "soe": n_tv, "soe_under": nbr_vehicle, "soe_over": nbr_vehicle,
+        "peak_over": int(peak_power_soft_constraint), "activation": n_tv if integral else 0
+    }
+    offsets = dict(zip(sizes, np.cumsum([0] + list(sizes.values()))[:-1].tolist()))
+    n_cols = sum(sizes.values())
+
+    eye_vehicle = sp.identity(nbr_vehicle, format="csr")
+    factor = values["Charging Factor"]
+    required = values["Required Energy"]
+
+    # EQUALITY CONSTRAINTS
+    # --------------------------------
+    # Charging Energy [t+1] = Charging Power [t] + Charging Energy[t]
+    shift_next, shift_current = shift_matrices(horizon_length)
+    ctrs_energy = _block_row(
+        nbr_vehicle * (horizon_length - 2),
+        {
+            "soe": sp.kron(eye_vehicle, shift_next - shift_current),
+            "power": -factor * sp.kron(eye_vehicle, shift_current)
+        },
+        offsets, n_cols
+    )
+
+    # Unsatisfied SOE: soe_over - soe_under - energy charged within the parking window = - required energy
+    ctrs_unsatisfied = _block_row(
+        nbr_vehicle,
+        {
+            "power": -factor * sp.kron(eye_vehicle, np.ones((1, horizon_length))),
+            "soe_under": -eye_vehicle, "soe_over": eye_vehicle
+        },
+        offsets, n_cols
+    )
+
+    a_eq = sp.vstack([ctrs_energy, ctrs_unsatisfied], format="csr")
+    b_eq = np.concatenate([np.zeros(ctrs_energy.shape[0]), -required])
+
+    # INEQUALITY CONSTRAINTS
+    # --------------------------------
+    # Power Limit: sum of charging powers (- peak power violation) <= peak power capacity
+    blocks_power = {"power": sp.kron(np.ones((1, nbr_vehicle)), sp.identity(horizon_length))}
+    if peak_power_soft_constraint:
+        blocks_power["peak_over"] = -np.ones((horizon_length, 1))
+    ctrs_ub = [_block_row(horizon_length, blocks_power, offsets, n_cols)]
+    b_ub = [values["Peak Power Capacity"]]
+
+    # Power Bounds & Activation: power <= power nom * activation
+    if integral:
+        power_nom_flat = np.repeat(np.asarray(power_nom, dtype=float), horizon_length)
+        ctrs_ub.append(
+            _block_row(n_tv, {"power": sp.identity(n_tv), "activation": -sp.diags(power_nom_flat)}, offsets, n_cols)
+        )
+        b_ub.append(np.zeros(n_tv))
+
+    a_ub = sp.vstack(ctrs_ub, format="csr")
+    b_ub = np.concatenate(b_ub)
+
+    # BOUNDS & OBJECTIVE
+    # --------------------------------
+    lb, ub, c = np.zeros(n_cols), np.full(n_cols, np.inf), np.zeros(n_cols)
+    integrality = np.zeros(n_cols, dtype=int)
+
+    def block(name: str) -> slice:
+        return slice(offsets[name], offsets[name] + sizes[name])
+
+    ub[block("power")] = flat(values["Power Max"])
+    lb[block("soe")], ub[block("soe")] = flat(values["SOE Lower"]), flat(values["SOE Upper"])
+    ub[block("soe_under")], ub[block("soe_over")] = required, required
+    if integral:
+        ub[block("activation")] = flat(values["Parked"])
+        integrality[block("activation")] = 1
+
+    c[block("power")] = values["Energy Price"]
+    c[block("soe_under")] = values["Unsatisfied Weight"]
+    c[block("peak_over")] = PRICE_POWER_VIOLATION
+
+    v_idx, t_idx = np.divmod(np.arange(n_tv), horizon_length)
+
+    return {
+        "c": c, "A_eq": a_eq, "b_eq": b_eq, "A_ub": a_ub, "b_ub": b_ub, "lb": lb, "ub": ub,
+        "integrality": integrality, "offsets": offsets, "sizes": sizes, "cells": (t_idx, v_idx)
+    }
+
+
+def _evcsp_matrices_window(
+        values: Dict, power_nom: List[int], capacity_nom: List[float], soe_init: List[float], nbr_vehicle: int,
+        horizon_length: int, integral: bool, peak_power_soft_constraint: bool
+) -> Dict:
+    """
+    Window-only layout of the EVCSP matrices: one power (and activation) variable per parked (t, v) cell.
+
+    Outside its parking window, a vehicle neither charges nor changes its SOE, so the SOE variables are eliminated:
+    the SOE is soe_init + efficiency * delta_t * cumsum(power) and, power being nonnegative, its capacity bound
+    reduces to one row per vehicle on the total energy charged within the window.
+
+    :param values: parameter values (see evcsp_parameter_values)
+    :param power_nom: nominal power of each vehicle [kW]
+    :param capacity_nom: nominal capacity for each vehicle [kWh]
+    :param soe_init: Initial SOE of vehicles at arrival [kWh]
+    :param nbr_vehicle: number of vehicles / terminal considered in the horizon
+    :param horizon_length: horizon length [time steps]
+    :param integral: if True, add the boolean activation variables (MILP)
+    :param peak_power_soft_constraint: if True, the station power limit is a soft constraint
+    :return: same dictionary as evcsp_matrices
+    """
+
+    # Parked cells, vehicle by vehicle
+    v_idx, t_idx = np.nonzero(values["Parked"].T > 0)
+    n_cells = len(t_idx)
+    cells = np.arange(n_cells)
+
+    sizes = {
+        "power": n_cells, "soe_under": nbr_vehicle, "soe_over": nbr_vehicle,
+        "peak_over": int(peak_power_soft_constraint), "activation": n_cells if integral else 0
+    }
+    offsets = dict(zip(sizes, np.cumsum([0] + list(sizes.values()))[:-1].tolist()))
+    n_cols = sum(sizes.values())
+
+    eye_vehicle = sp.identity(nbr_vehicle, format="csr")
+    factor = values["Charging Factor"]
+    required = values["Required Energy"]
+
+    # sum_per_vehicle @ power: charging energy of each vehicle; sum_per_step @ power: station power at each step
+    sum_per_vehicle = sp.csr_matrix((np.ones(n_cells), (v_idx, cells)), shape=(nbr_vehicle, n_cells))
+    sum_per_step = sp.csr_matrix((np.ones(n_cells), (t_idx, cells)), shape=(horizon_length, n_cells))
+
+    # EQUALITY CONSTRAINTS
+    # --------------------------------
+    # Unsatisfied SOE: soe_over - soe_under - energy charged within the parking window = - required energy
+    a_eq = _block_row(
+        nbr_vehicle, {"power": -factor * sum_per_vehicle, "soe_under": -eye_vehicle, "soe_over": eye_vehicle},
+        offsets, n_cols
+    )
+    b_eq = -required
+
+    # INEQUALITY CONSTRAINTS
+    # --------------------------------
+    # Bounds for SOE: soe_init + energy charged within the parking window <= capacity
+    ctrs_ub = [_block_row(nbr_vehicle, {"power": factor * sum_per_vehicle}, offsets, n_cols)]
+    b_ub = [np.asarray(capacity_nom, dtype=float) - np.asarray(soe_init, dtype=float)]
+
+    # Power Limit: sum of charging powers (- peak power violation) <= peak power capacity
+    blocks_power = {"power": sum_per_step}
+    if peak_power_soft_constraint:
+        blocks_power["peak_over"] = -np.ones((horizon_length, 1))
+    ctrs_ub.append(_block_row(horizon_length, blocks_power, offsets, n_cols))
+    b_ub.append(values["Peak Power Capacity"])
+
+    # Power Bounds & Activation: power <= power nom * activation
+    power_nom_cells = np.asarray(power_nom, dtype=float)[v_idx]
+    if integral:
+        ctrs_ub.append(
+            _block_row(
+                n_cells, {"power": sp.identity(n_cells), "activation": -sp.diags(power_nom_cells)}, offsets, n_cols
+            )
+        )
+        b_ub.append(np.zeros(n_cells))
+
+    a_ub = sp.vstack(ctrs_ub, format="csr")
+    b_ub = np.concatenate(b_ub)
+
+    # BOUNDS & OBJECTIVE
+    # --------------------------------
+    lb, ub, c = np.zeros(n_cols), np.full(n_cols, np.inf), np.zeros(n_cols)
+    integrality = np.zeros(n_cols, dtype=int)
+
+    def block(name: str) -> slice:
+        return slice(offsets[name], offsets[name] + sizes[name])
+
+    ub[block("power")] = power_nom_cells
+    ub[block("soe_under")], ub[block("soe_over")] = required, required
+    if integral:
+        ub[block("activation")] = 1.
+        integrality[block("activation")] = 1
+
+    c[block("power")] = values["Energy Price"]
+    c[block("soe_under")] = values["Unsatisfied Weight"]
+    c[block("peak_over")] = PRICE_POWER_VIOLATION
+
+    return {
+        "c": c, "A_eq": a_eq, "b_eq": b_eq, "A_ub": a_ub, "b_ub": b_ub, "lb": lb, "ub": ub,
+        "integrality": integrality, "offsets": offsets, "sizes": sizes, "cells": (t_idx, v_idx)
+    }
+
+
+def evcsp_sparse(
+        nbr_vehicle: int, arrival_idx: List[int], departure_idx: List[int], power_nom: List[int],
+        required_energy: List[int], capacity_nom: List[float], soe_init: List[float], p_max_infra: float | List[float],
+        horizon_length: int, time_step: int = 900, solver_options: dict = None, prices=None,
+        efficiency_charging: float = 0.9, integral: bool = False, layout: str = "window"
+) -> tuple[np.ndarray, np.ndarray, OptimizeResult]:
+    """
+    EVCSP solved by HiGHS on directly assembled sparse matrices (see evcsp_matrices):
+    scipy.optimize.linprog(method="highs") for the LP, scipy.optimize.milp for the MILP.
+
+    :param nbr_vehicle: number of vehicles / terminal considered in the horizon
+    :param arrival_idx: index of arrival time
+    :param departure_idx: index of departure time
+    :param power_nom: nominal power of each vehicle [kW]
+    :param required_energy: energy demand for each vehicle [kWh]
+    :param capacity_nom: nominal capacity for each vehicle [kWh]
+    :param soe_init: Initial SOE of vehicles at arrival [kWh]
+    :param p_max_infra: max power profile for the station [kW]
+    :param horizon_length: horizon length [time steps]
+    :param time_step: [seconds]
+    :param solver_options: "time_limit", "mip_gap" (MILP only) and "verbose" are passed to HiGHS, other options
+        are ignored
+    :param prices: contain prices information for the optimization problem
+    :param efficiency_charging: charging efficiency (on the scale of 1, not 100%)
+    :param integral: if True, solve the MILP version
+    :param layout: "window" (variables within parking windows only, default) or "dense" (see evcsp_matrices)
+    :return:
+        activation_profile: charging indicators profile (1 for charging, 0 for not charging)
+        power_profile: power charging profile
+        result: scipy OptimizeResult, with the elapsed time ("elapsed"), the relative MIP gap ("gap"), the time of
+            each phase ("telemetry", see telemetry.PhaseTimer) and the model size ("variables", "constraints")
+    """
+
+    if solver_options is None:
+        solver_options = {}
+
+    logger.info(f"{'MILP' if integral else 'LP'} Formulation with HiGHS sparse backend")
+
+    timer = PhaseTimer()
+    with timer.phase("build"):
+        matrices = evcsp_matrices(
+            nbr_vehicle=nbr_vehicle, arrival_idx=arrival_idx, departure_idx=departure_idx, power_nom=power_nom,
+            required_energy=required_energy, capacity_nom=capacity_nom, soe_init=soe_init, p_max_infra=p_max_infra,
+            horizon_length=horizon_length, time_step=time_step, prices=prices,
+            efficiency_charging=efficiency_charging, integral=integral, layout=layout
+        )
+
+    options = {"disp": bool(solver_options.get("verbose", False))}
+    if solver_options.get("time_limit") is not None:
+        options["time_limit"] = solver_options["time_limit"]
+    if integral and solver_options.get("mip_gap") is not None:
+        options["mip_rel_gap"] = solver_options["mip_gap"]
+
+    start_time = time.time()
+    if integral:
+        result = milp(
+            c=matrices["c"],
+            constraints=[
+                LinearConstraint(matrices["A_eq"], matrices["b_eq"], matrices["b_eq"]),
+                LinearConstraint(matrices["A_ub"], -np.inf, matrices["b_ub"])
+            ],
+            integrality=matrices["integrality"], bounds=Bounds(matrices["lb"], matrices["ub"]), options=options
+        )
+    else:
+        result = linprog(
+            c=matrices["c"], A_ub=matrices["A_ub"], b_ub=matrices["b_ub"], A_eq=matrices["A_eq"],
+            b_eq=matrices["b_eq"], bounds=np.column_stack([matrices["lb"], matrices["ub"]]), method="highs",
+            options=options
+        )
+
+    # Report: status 0 is optimal, 1 is the time / iteration limit (result.x is then the best incumbent, if any)
+    result["elapsed"] = time.time() - start_time
+    result["gap"] = result.get("mip_gap") if integral else (0. if result.status == 0 else None)
+    timer.add("solve", result["elapsed"])
+
+    with timer.phase("extraction"):
+        if result.x is not None:
+            logger.info(f"Solution found with status {result.status}: {result.message}")
+            offset, size = matrices["offsets"]["power"], matrices["sizes"]["power"]
+            power_profile = np.zeros(shape=(horizon_length, nbr_vehicle), dtype=float)
+            power_profile[matrices["cells"]] = np.maximum(result.x[offset:offset + size], 0.)
+            activation_profile = power_profile > 0
+
+        else:
+            logger.exception(f'Problem not solved properly ! {result.message}')
+            activation_profile = np.zeros(shape=(horizon_length, nbr_vehicle), dtype=int)
+            power_profile = np.zeros(shape=(horizon_length, nbr_vehicle), dtype=float)
+
+    result["telemetry"] = timer.phases
+    result["variables"] = matrices["c"].size
+    result["constraints"] = matrices["A_eq"].shape[0] + matrices["A_ub"].shape[0]
+
+    return activation_profile, power_profile, result
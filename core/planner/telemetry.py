@@ -0,0 +1,157 @@
+# telemetry.py
+# Per-phase timing and solver telemetry of planning calls, published to pluggable sinks
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+from scipy.optimize import OptimizeResult
+from core.planner.plan_result import PlanResult
+from core.utility.logger.custom_loggers import setup_logger
+
+logger = setup_logger(__name__)
+
+PHASES = ("input", "build", "canonicalization", "solve", "extraction")
+
+
+class PhaseTimer:
+    """
+    Wall-clock time of the phases of a planning call [s]: input extraction, model build, canonicalization, solve and
+    result extraction
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.) + time.perf_counter() - start_time
+
+    def add(self, name: str, elapsed: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.) + elapsed
+
+
+def planning_record(formulation: str, backend: str, inputs: Dict, result, total: float) -> Dict:
+    """
+    Record of a planning call, from the third output of the planner
+
+    :param formulation: optimization formulation
+    :param backend: "cvxpy" or "highs"
+    :param inputs: arguments of the planner
+    :param result: PlanResult (CVXPY planners), scipy OptimizeResult (sparse backend) or result dictionary
+    :param total: total time of the call [s]
+    :return: record (see publish)
+    """
+
+    if isinstance(result, PlanResult):
+        phases = dict(result.telemetry)
+        stats = {
+            "solver": result.solver, "status": result.status, "iterations": result.iterations, "gap": result.gap,
+            "objective": result.objective, "variables": result.variables, "constraints": result.constraints,
+        }
+    elif isinstance(result, OptimizeResult):
+        phases = dict(result.get("telemetry", {}))
+        stats = {
+            "solver": "HIGHS", "status": "optimal" if result.success else result.message,
+            "iterations": result.get("nit"), "gap": result.get("gap"), "objective": result.get("fun"),
+            "variables": result.get("variables"), "constraints": result.get("constraints"),
+        }
+    else:
+        phases = {} if result.get("solve_time") is None else {"solve": result["solve_time"]}
+        stats = {k: result.get(k) for k in ("status", "objective", "gap", "iterations")}
+
+    return {
+        "timestamp": time.time(), "formulation": formulation, "backend": backend,
+        "nbr_vehicle": inputs.get("nbr_vehicle"), "horizon_length": inputs.get("horizon_length"),
+        "phases": phases, "total": total, **stats,
+    }
+
+
+class RingBufferSink:
+    """
+    Keep the last records in memory
+    """
+
+    def __init__(self, maxlen: int = 1000):
+        self.records = deque(maxlen=maxlen)
+
+    def __call__(self, record: Dict) -> None:
+        self.records.append(record)
+
+
+class PrometheusSink:
+    """
+    Export records as Prometheus metrics: histogram of the phase times, counter of the plans by status and gauge of
+    the model size, labelled by formulation and backend. Requires prometheus_client.
+    """
+
+    def __init__(self, registry=None, prefix: str = "evcsp"):
+        from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+
+        registry = REGISTRY if registry is None else registry
+        labels = ["formulation", "backend"]
+        self.phase_seconds = Histogram(
+            f"{prefix}_phase_seconds", "Time of the planning phases", labels + ["phase"], registry=registry
+        )
+        self.plans = Counter(f"{prefix}_plans", "Planning calls", labels + ["status"], registry=registry)
+        self.variables = Gauge(f"{prefix}_model_variables", "Scalar variables of the model", labels,
+                               registry=registry)
+
+    def __call__(self, record: Dict) -> None:
+        labels = {"formulation": record["formulation"], "backend": record["backend"]}
+        for phase, elapsed in record["phases"].items():
+            self.phase_seconds.labels(**labels, phase=phase).observe(elapsed)
+        self.plans.labels(**labels, status=str(record.get("status"))).inc()
+        if record.get("variables") is not None:
+            self.variables.labels(**labels).set(record["variables"])
+
+
+_sinks: List[Callable[[Dict], None]] = []
+_sinks_lock = threading.Lock()
+
+
+def add_sink(sink: Callable[[Dict], None]) -> Callable[[Dict], None]:
+    """
+    Register a sink: a callable receiving the record of each planning call (see publish). Records are published in
+    the process of the planning call, so the sinks of the main process do not see the calls of process pools.
+
+    :param sink: callback, RingBufferSink, PrometheusSink or any callable taking a record
+    :return: the sink
+    """
+
+    with _sinks_lock:
+        _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink: Callable[[Dict], None]) -> None:
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+def publish(record: Dict) -> None:
+    """
+    Publish the record of a planning call to the registered sinks. A failing sink is logged and does not stop the
+    planning.
+
+    :param record: formulation, backend, nbr_vehicle, horizon_length, time of each phase ("phases") and the total
+        time [s], and the solver statistics (solver, status, iterations, gap, objective, model size) if known
+    """
+
+    logger.info(
+        f"Planning {record['formulation']}/{record['backend']}: "
+        + ", ".join(f"{phase} {elapsed:.4f} s" for phase, elapsed in record["phases"].items())
+        + f", total {record['total']:.4f} s"
+    )
+    with _sinks_lock:
+        sinks = list(_sinks)
+    for sink in sinks:
+        try:
+            sink(record)
+        except Exception as error:
+            logger.warning(f"Telemetry sink {sink} failed: {error}")
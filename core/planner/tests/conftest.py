@@ -0,0 +1,30 @@
+from typing import Dict
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def planning_inputs() -> Dict:
+
+    return {
+        "nbr_vehicle": 3,
+        "arrival_idx": [31, 38, 10],
+        "departure_idx": [41, 43, 30],
+        "power_nom": [7, 11, 22],
+        "required_energy": [16.59, 8.72, 30.],
+        "capacity_nom": [52., 100., 88.],
+        "soe_init": [10., 0., 20.],
+        "p_max_infra": 25.,
+        "horizon_length": 48,
+        "time_step": 900,
+    }
+
+
+@pytest.fixture
+def demand() -> pd.DataFrame:
+
+    # Charging demand data of the vehicles of planning_inputs (arrivalTime and departureTime as time step indices)
+    return pd.DataFrame({
+        "arrivalTime": [31, 38, 10], "departureTime": [41, 43, 30], "powerNom": [7, 11, 22],
+        "energyRequired": [16.59, 8.72, 30.], "energyMax": [52., 100., 88.], "arrivalSOE": [10., 0., 20.],
+    })
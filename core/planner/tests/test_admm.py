@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from core.planner.admm import evcsp_admm
+from core.planner.optimization import availability_masks
+from core.planner.sparse_backend import evcsp_sparse
+
+
+@pytest.mark.parametrize("p_max_infra, n_jobs", [(10., 1), (25., 1), (1000., 1), (25., 2)])
+def test_evcsp_admm_matches_lp(planning_inputs, p_max_infra, n_jobs):
+
+    planning_inputs = {**planning_inputs, "p_max_infra": p_max_infra}
+    activation_profile, power_profile, result = evcsp_admm(**planning_inputs, solver_options={"n_jobs": n_jobs})
+    _, _, lp_result = evcsp_sparse(**planning_inputs)
+    mask_parked, _ = availability_masks(
+        planning_inputs["arrival_idx"], planning_inputs["departure_idx"], planning_inputs["horizon_length"]
+    )
+
+    assert result["status"] == "optimal" and result["converged"]
+    assert len(result["residuals"]) == result["iterations"]
+    assert (power_profile[~mask_parked] == 0).all(), "Vehicle charged outside its parking window"
+    assert (power_profile <= np.array(planning_inputs["power_nom"])[None, :] + 1e-9).all()
+    assert (power_profile.sum(axis=1) <= p_max_infra + 1e-9).all()
+    assert (activation_profile == (power_profile > 0)).all()
+    assert result["objective"] == pytest.approx(lp_result.fun, rel=1e-3)
+
+
+def test_evcsp_admm_iteration_budget(planning_inputs):
+
+    planning_inputs = {**planning_inputs, "p_max_infra": 10.}
+    _, power_profile, result = evcsp_admm(**planning_inputs, solver_options={"max_iter": 3})
+
+    assert result["status"] == "max_iter" and not result["converged"]
+    assert result["iterations"] == 3
+    assert (power_profile.sum(axis=1) <= planning_inputs["p_max_infra"] + 1e-9).all()
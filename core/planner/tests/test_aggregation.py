@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from core.planner.aggregation import aggregation_quality, cluster_vehicles, disaggregate, evcsp_aggregate
+from core.planner.day_ahead_planner import demand_inputs, plan_vehicles
+from core.planner.optimization import evcsp_parameter_values
+from core.utility.data.data_processor import generate_demand_data, prepare_planning_data
+
+
+@pytest.fixture
+def fleet_inputs():
+
+    np.random.seed(0)
+    demand = prepare_planning_data(generate_demand_data(nbr_vehicles=60, horizon_length=96, time_step=900), 900)
+    return {"nbr_vehicle": 60, "horizon_length": 96, "time_step": 900, "p_max_infra": 60., **demand_inputs(demand)}
+
+
+def test_cluster_vehicles():
+
+    cluster = cluster_vehicles(
+        arrival_idx=[0, 0, 10, 11, 40], departure_idx=[20, 20, 30, 30, 48], power_nom=[7, 7, 7, 7, 22],
+        weight=[1., 1., 1., 1., 2.], n_clusters=3
+    )
+
+    assert cluster[0] == cluster[1]
+    assert cluster[2] == cluster[3]
+    assert sorted(set(cluster)) == [0, 1, 2]
+
+
+def test_aggregate_singletons(planning_inputs):
+
+    # One cluster per vehicle: the plan is the LP plan
+    _, power_profile, result = plan_vehicles(
+        formulation="aggregate", **planning_inputs, solver_options={"n_clusters": 3}
+    )
+    _, _, prob = plan_vehicles(formulation="lp", **planning_inputs)
+
+    assert result["n_clusters"] == 3
+    assert result["objective"] == pytest.approx(prob.objective, rel=1e-4)
+    assert set(result["telemetry"]) >= {"input", "solve", "disaggregation"}
+
+
+@pytest.mark.parametrize("allocator", ["llf", "edf", "proportional"])
+def test_aggregate_feasible(fleet_inputs, allocator):
+
+    _, power_profile, result = evcsp_aggregate(**fleet_inputs, solver_options={"n_clusters": 8, "allocator": allocator})
+    values = evcsp_parameter_values(**{k: v for k, v in fleet_inputs.items() if k != "nbr_vehicle"})
+
+    assert result["n_clusters"] == 8
+    assert (power_profile <= values["Power Max"] + 1e-6).all()
+    assert (power_profile.sum(axis=1) <= fleet_inputs["p_max_infra"] + 1e-6).all()
+    charged = values["Charging Factor"] * power_profile.sum(axis=0)
+    assert (charged <= np.asarray(fleet_inputs["required_energy"]) + 1e-6).all()
+
+
+def test_disaggregate_invalid_allocator():
+
+    with pytest.raises(ValueError):
+        disaggregate(np.zeros((4, 1)), np.zeros(2, dtype=int), np.ones((4, 2)), np.ones(2), [4, 4], 0.25, "random")
+
+
+def test_aggregation_quality(fleet_inputs):
+
+    report = aggregation_quality(**fleet_inputs, solver_options={"n_clusters": 8})
+
+    assert report["n_clusters"] == 8
+    assert -1e-4 <= report["gap"] <= 0.2
+    assert report["unserved_energy_aggregate"] >= report["unserved_energy_lp"] - 1e-4
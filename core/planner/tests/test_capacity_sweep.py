@@ -0,0 +1,46 @@
+import cvxpy as cp
+import numpy as np
+import pytest
+from core.planner.capacity_sweep import capacity_frontier, capacity_sweep, frontier_cache, frontier_plan
+from core.planner.optimization import evcsp_lp
+
+
+def test_capacity_sweep_matches_single_solves(planning_inputs):
+
+    solver_options = {"solver": cp.CLARABEL, "verbose": False}
+    inputs = {k: v for k, v in planning_inputs.items() if k != "p_max_infra"}
+    frontier = capacity_sweep([20., 5., 10.], formulation="lp", solver_options=solver_options, **inputs)
+
+    assert frontier["capacity"].tolist() == [5., 10., 20.]
+    assert frontier["power"].shape == (3, 48, 3)
+    for capacity, power_profile, objective in zip(frontier["capacity"], frontier["power"], frontier["objective"]):
+        _, _, prob = evcsp_lp(**inputs, p_max_infra=capacity, solver_options=solver_options)
+        assert objective == pytest.approx(prob.objective, rel=1e-4)
+        assert (power_profile.sum(axis=1) <= capacity + 1e-4).all()
+
+    # More capacity, lower cost
+    assert (np.diff(frontier["objective"]) <= 1e-6).all()
+
+
+def test_capacity_frontier_cache_and_lookup(demand):
+
+    frontier_cache.clear()
+    solver_options = {"solver": cp.CLARABEL, "verbose": False}
+    kwargs = {"capacities": [5., 10., 20.], "horizon_length": 48, "time_step": 900, "solver_options": solver_options}
+
+    frontier = capacity_frontier(demand, **kwargs)
+    assert len(frontier["kpi"]) == 3
+    assert capacity_frontier(demand.copy(), **kwargs) is frontier
+    assert frontier_cache.hits == 1
+
+    # Level of the frontier
+    _, power_profile, kpi = frontier_plan(frontier, 10.)
+    assert np.array_equal(power_profile, frontier["power"][1])
+    assert kpi == frontier["kpi"][1]
+
+    # Interpolation between two levels is feasible for the interpolated capacity
+    _, power_profile, kpi = frontier_plan(frontier, 15.)
+    assert (power_profile.sum(axis=1) <= 15. + 1e-4).all()
+    assert frontier["kpi"][1]["energykWh"] <= kpi["energykWh"] <= frontier["kpi"][2]["energykWh"]
+
+    assert frontier_plan(frontier, 50.) is None
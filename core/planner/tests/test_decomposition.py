@@ -0,0 +1,50 @@
+from functools import partial
+import cvxpy as cp
+import pytest
+from core.planner.day_ahead_planner import plan_vehicles
+from core.planner.decomposition import independent_blocks, solve_blocks
+from core.planner.optimization import evcsp_lp
+
+
+def test_independent_blocks():
+
+    blocks = independent_blocks(arrival_idx=[31, 38, 10, 43], departure_idx=[41, 43, 30, 50], horizon_length=48)
+
+    assert [vehicles.tolist() for vehicles, _, _ in blocks] == [[2], [0, 1], [3]]
+    assert [(start, end) for _, start, end in blocks] == [(10, 30), (31, 43), (43, 48)]
+
+
+@pytest.mark.parametrize("formulation, backend, n_jobs", [("lp", "cvxpy", 1), ("milp", "highs", 2)])
+def test_solve_blocks_matches_full_problem(planning_inputs, formulation, backend, n_jobs):
+
+    solver_options = {"solver": cp.CLARABEL, "verbose": False, "warm_start": False}
+    solve = partial(plan_vehicles, formulation=formulation, backend=backend)
+
+    activation_profile, power_profile, result = solve_blocks(
+        solve=solve, n_jobs=n_jobs, solver_options=solver_options, **planning_inputs
+    )
+    _, power_profile_full, result_full = solve(solver_options=solver_options, **planning_inputs)
+    objective_full = result_full.objective if backend == "cvxpy" else result_full.fun
+
+    assert result["status"] == "optimal"
+    assert len(result["blocks"]) == 2
+    assert power_profile.shape == power_profile_full.shape
+    assert (power_profile[activation_profile == 0] <= 1e-6).all()
+    assert result["objective"] == pytest.approx(objective_full, rel=1e-4)
+    assert power_profile.sum(axis=0) == pytest.approx(power_profile_full.sum(axis=0), rel=1e-3)
+
+
+def test_solve_blocks_keeps_full_horizon_problem(planning_inputs):
+
+    # A single block is solved as the full problem
+    planning_inputs = {**planning_inputs, "arrival_idx": [10, 20, 25], "departure_idx": [30, 35, 48]}
+    solver_options = {"solver": cp.CLARABEL, "verbose": False, "warm_start": False}
+
+    _, power_profile, result = solve_blocks(
+        solve=evcsp_lp, n_jobs=1, solver_options=solver_options, **planning_inputs
+    )
+    _, power_profile_full, prob = evcsp_lp(solver_options=solver_options, **planning_inputs)
+
+    assert len(result["blocks"]) == 1
+    assert result["objective"] == pytest.approx(prob.objective, rel=1e-6)
+    assert power_profile.sum(axis=0) == pytest.approx(power_profile_full.sum(axis=0), rel=1e-3)
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from core.planner.heuristics import evcsp_heuristic
+from core.planner.optimization import availability_masks
+
+
+@pytest.mark.parametrize("priority", ["edf", "llf", "weighted"])
+def test_evcsp_heuristic_feasible(planning_inputs, priority):
+
+    activation_profile, power_profile, result = evcsp_heuristic(
+        **planning_inputs, solver_options={"priority": priority, "compute_gap": True}
+    )
+    mask_parked, _ = availability_masks(
+        planning_inputs["arrival_idx"], planning_inputs["departure_idx"], planning_inputs["horizon_length"]
+    )
+
+    assert power_profile.shape == (planning_inputs["horizon_length"], planning_inputs["nbr_vehicle"])
+    assert (power_profile[~mask_parked] == 0).all(), "Vehicle charged outside its parking window"
+    assert (power_profile <= np.array(planning_inputs["power_nom"])[None, :] + 1e-9).all()
+    assert (power_profile.sum(axis=1) <= planning_inputs["p_max_infra"] + 1e-9).all()
+    assert (activation_profile == (power_profile > 0)).all()
+    assert result["objective"] >= result["lower_bound"] - 1e-6
+    assert result["gap"] == pytest.approx((result["objective"] - result["lower_bound"]) / result["lower_bound"])
+
+
+def test_evcsp_heuristic_meets_demand_without_congestion(planning_inputs):
+
+    planning_inputs = {**planning_inputs, "p_max_infra": 1000.}
+    _, power_profile, result = evcsp_heuristic(**planning_inputs, solver_options={"compute_gap": True})
+    factor = 0.9 * (planning_inputs["time_step"] / 3600)
+    energy_charged = factor * power_profile.sum(axis=0)
+    energy_reachable = factor * np.array(planning_inputs["power_nom"]) * (
+        np.array(planning_inputs["departure_idx"]) - np.array(planning_inputs["arrival_idx"])
+    )
+
+    assert energy_charged == pytest.approx(np.minimum(planning_inputs["required_energy"], energy_reachable))
+    assert result["gap"] == pytest.approx(0., abs=1e-6)
+
+
+def test_evcsp_heuristic_valley_filling_keeps_energy(planning_inputs):
+
+    _, power_greedy, _ = evcsp_heuristic(**planning_inputs, solver_options={"valley_filling": False})
+    _, power_filled, _ = evcsp_heuristic(**planning_inputs, solver_options={"valley_filling": True})
+
+    assert power_filled.sum(axis=0) == pytest.approx(power_greedy.sum(axis=0))
+    assert power_filled.sum(axis=1).max() <= power_greedy.sum(axis=1).max() + 1e-9
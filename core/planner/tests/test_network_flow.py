@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from core.planner.network_flow import evcsp_flow
+from core.planner.optimization import availability_masks
+from core.planner.sparse_backend import evcsp_sparse
+
+
+@pytest.mark.parametrize("p_max_infra", [10., 25., 1000.])
+def test_evcsp_flow_matches_lp(planning_inputs, p_max_infra):
+
+    planning_inputs = {**planning_inputs, "p_max_infra": p_max_infra}
+    activation_profile, power_profile, result = evcsp_flow(**planning_inputs)
+    _, _, lp_result = evcsp_sparse(**planning_inputs)
+    mask_parked, _ = availability_masks(
+        planning_inputs["arrival_idx"], planning_inputs["departure_idx"], planning_inputs["horizon_length"]
+    )
+
+    assert result["status"] == "optimal"
+    assert (power_profile[~mask_parked] == 0).all(), "Vehicle charged outside its parking window"
+    assert (power_profile <= np.array(planning_inputs["power_nom"])[None, :] + 1e-9).all()
+    assert (power_profile.sum(axis=1) <= p_max_infra + 1e-9).all()
+    assert (activation_profile == (power_profile > 0)).all()
+    assert result["objective"] == pytest.approx(lp_result.fun, rel=1e-9)
+
+
+def test_evcsp_flow_recovers_rounding(planning_inputs):
+
+    # Capacities and needs rounded down to 1 kW: the lost energy is charged afterwards
+    _, power_profile, result = evcsp_flow(**planning_inputs, solver_options={"resolution": 1.})
+    _, _, lp_result = evcsp_sparse(**planning_inputs)
+
+    assert (power_profile.sum(axis=1) <= planning_inputs["p_max_infra"] + 1e-9).all()
+    assert result["objective"] == pytest.approx(lp_result.fun, rel=1e-6)
+
+
+def test_evcsp_flow_falls_back_to_lp(planning_inputs):
+
+    prices = {"price_energy_buy": -0.05, "price_energy_sell": -0.05, "penalty_unsatisfied": 100}
+    _, _, result = evcsp_flow(**planning_inputs, prices=prices)
+    _, _, lp_result = evcsp_sparse(**planning_inputs, prices=prices)
+
+    assert result["status"] == "lp"
+    assert result["objective"] == pytest.approx(lp_result.fun)
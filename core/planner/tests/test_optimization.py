@@ -0,0 +1,129 @@
+import cvxpy as cp
+import numpy as np
+import pytest
+from core.planner.optimization import evcsp_lp, evcsp_milp, availability_masks, shift_matrices, build_evcsp_lp, \
+    build_evcsp_milp
+from core.planner.problem_cache import problem_cache, ProblemCache
+
+
+def evcsp_lp_per_vehicle(
+        nbr_vehicle, arrival_idx, departure_idx, power_nom, required_energy, capacity_nom, soe_init, p_max_infra,
+        horizon_length, time_step, efficiency_charging: float = 0.9
+) -> cp.Problem:
+    """
+    Reference per-vehicle formulation of the LP (the one before the matrix-form constraint builder)
+    """
+
+    delta_t = time_step / 3600
+    soe = cp.Variable(shape=(horizon_length, nbr_vehicle), nonneg=True)
+    soe_under = cp.Variable(shape=nbr_vehicle, nonneg=True)
+    soe_over = cp.Variable(shape=nbr_vehicle, nonneg=True)
+    power_charging = cp.Variable(shape=(horizon_length, nbr_vehicle), nonneg=True)
+    power_peak_over = cp.Variable(shape=1, nonneg=True)
+
+    ctrs = []
+    for v in range(nbr_vehicle):
+        ctrs.append(power_charging[0:arrival_idx[v], v] == 0)
+        ctrs.append(power_charging[departure_idx[v]::, v] == 0)
+        ctrs.append(power_charging[:, v] <= power_nom[v])
+        ctrs.append(soe[1:-1, v] == efficiency_charging * power_charging[0:-2, v] * delta_t + soe[0:-2, v])
+        ctrs.append(soe[0:arrival_idx[v], v] == soe_init[v])
+        ctrs.append(soe[:, v] <= capacity_nom[v])
+        ctrs.append(
+            soe_over[v] - soe_under[v] == (soe[departure_idx[v], v] - soe[arrival_idx[v], v]) - required_energy[v]
+        )
+    ctrs.append(required_energy >= soe_under)
+    ctrs.append(soe_over <= required_energy)
+    ctrs.append(cp.sum(power_charging, axis=1) <= p_max_infra + power_peak_over)
+
+    func_obj = 100 * cp.sum(soe_under / capacity_nom) + 0.13 * delta_t * cp.sum(power_charging) + 1e6 * power_peak_over
+    prob = cp.Problem(cp.Minimize(func_obj), ctrs)
+    prob.solve(solver=cp.CLARABEL)
+
+    return prob
+
+
+def test_availability_masks():
+
+    mask_parked, mask_before = availability_masks([1, 0], [3, 2], horizon_length=4)
+
+    assert mask_parked.shape == (4, 2)
+    assert (mask_parked[:, 0] == [False, True, True, False]).all()
+    assert (mask_parked[:, 1] == [True, True, False, False]).all()
+    assert (mask_before[:, 0] == [True, False, False, False]).all()
+    assert not mask_before[:, 1].any()
+
+
+def test_shift_matrices():
+
+    soe = np.arange(12, dtype=float).reshape(6, 2)
+    shift_next, shift_current = shift_matrices(horizon_length=6)
+
+    assert (shift_next @ soe == soe[1:-1]).all()
+    assert (shift_current @ soe == soe[0:-2]).all()
+
+
+def test_evcsp_lp_matches_per_vehicle_formulation(planning_inputs):
+
+    solver_options = {"solver": cp.CLARABEL, "time_limit": 60.0, "verbose": False, "warm_start": False}
+    _, power_profile, prob = evcsp_lp(**planning_inputs, solver_options=solver_options)
+    prob_reference = evcsp_lp_per_vehicle(**planning_inputs)
+
+    mask_parked, _ = availability_masks(
+        planning_inputs["arrival_idx"], planning_inputs["departure_idx"], planning_inputs["horizon_length"]
+    )
+
+    assert prob.status == cp.OPTIMAL
+    assert prob.objective == pytest.approx(prob_reference.value, rel=1e-6)
+    assert (power_profile[~mask_parked] == 0).all(), "Vehicle charged outside its parking window"
+    assert (power_profile.sum(axis=1) <= planning_inputs["p_max_infra"] + 1e-6).all()
+
+
+def test_evcsp_milp_respects_activation(planning_inputs):
+
+    solver_options = {"solver": cp.SCIPY, "time_limit": 60.0, "verbose": False, "warm_start": False}
+    activation_profile, power_profile, prob = evcsp_milp(**planning_inputs, solver_options=solver_options)
+
+    assert prob.status == cp.OPTIMAL
+    assert power_profile.shape == (planning_inputs["horizon_length"], planning_inputs["nbr_vehicle"])
+    assert (power_profile <= np.array(planning_inputs["power_nom"])[None, :] + 1e-6).all()
+    assert (power_profile[~activation_profile] == 0).all()
+
+
+def test_build_evcsp_is_dpp():
+
+    prob_lp, _ = build_evcsp_lp(nbr_vehicle=3, horizon_length=10)
+    prob_milp, _ = build_evcsp_milp(nbr_vehicle=3, horizon_length=10)
+
+    assert prob_lp.is_dcp(dpp=True)
+    assert prob_milp.is_dcp(dpp=True)
+
+
+def test_evcsp_lp_reuses_cached_problem(planning_inputs):
+
+    solver_options = {"solver": cp.CLARABEL, "time_limit": 60.0, "verbose": False, "warm_start": False}
+    problem_cache.clear()
+
+    _, _, prob_1 = evcsp_lp(**planning_inputs, solver_options=solver_options)
+    value_1 = prob_1.objective
+
+    # Same structure, different demand: the compiled problem is reused with new parameter values
+    planning_inputs_2 = {**planning_inputs, "required_energy": [5., 5., 5.], "p_max_infra": 40.}
+    _, power_profile_2, prob_2 = evcsp_lp(**planning_inputs_2, solver_options=solver_options)
+    prob_reference = evcsp_lp_per_vehicle(**planning_inputs_2)
+
+    assert problem_cache.hits == 1 and problem_cache.misses == 1
+    assert prob_2.objective == pytest.approx(prob_reference.value, rel=1e-6)
+    assert prob_2.objective != pytest.approx(value_1)
+    # The first result is a copy, it is not changed by the second solve of the cached problem
+    assert prob_1.objective == value_1 and prob_1.power is not power_profile_2
+
+
+def test_problem_cache_lru_eviction():
+
+    cache = ProblemCache(maxsize=2)
+    for key in ["a", "b", "a", "c"]:
+        cache.get(key=key, builder=lambda: build_evcsp_lp(nbr_vehicle=1, horizon_length=4))
+
+    assert len(cache) == 2
+    assert "a" in cache and "c" in cache and "b" not in cache
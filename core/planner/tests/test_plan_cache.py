@@ -0,0 +1,136 @@
+import socketserver
+import threading
+import time
+import numpy as np
+import pytest
+from core.planner.plan_cache import MemoryCache, RedisCache, cached_charging_plans, plan_cache_from_url, plan_key
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    # Stand-in of a Redis server: GET, SET (with PX), DEL and PING of the Redis protocol
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        store = self.server.store
+        while (args := self.read_command()) is not None:
+            command = args[0].upper()
+            if command == b"PING":
+                self.wfile.write(b"+PONG\r\n")
+            elif command == b"SET":
+                expiry = time.monotonic() + int(args[4]) / 1000 if len(args) > 4 else float("inf")
+                store[args[1]] = (expiry, args[2])
+                self.wfile.write(b"+OK\r\n")
+            elif command == b"GET":
+                expiry, value = store.get(args[1], (0., None))
+                if value is None or expiry < time.monotonic():
+                    self.wfile.write(b"$-1\r\n")
+                else:
+                    self.wfile.write(b"$%d\r\n%s\r\n" % (len(value), value))
+            elif command == b"DEL":
+                self.wfile.write(b":%d\r\n" % int(store.pop(args[1], None) is not None))
+            else:
+                self.wfile.write(b"-ERR unknown command\r\n")
+
+
+@pytest.fixture
+def redis_server():
+
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), RespHandler)
+    server.daemon_threads = True
+    server.store = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_plan_key(demand):
+
+    key = plan_key(data_demand=demand, capacity_grid=25, solver_options={"solver": "auto", "time_limit": 10})
+
+    # Same content, same key: records or data frame, integers or floats, any order of the dictionaries
+    assert key == plan_key(
+        solver_options={"time_limit": 10., "solver": "auto"}, capacity_grid=25., data_demand=demand.to_dict("records")
+    )
+    # Any change of the request changes the key
+    assert key != plan_key(data_demand=demand, capacity_grid=26, solver_options={"solver": "auto", "time_limit": 10})
+    assert key != plan_key(
+        data_demand=demand.iloc[::-1], capacity_grid=25, solver_options={"solver": "auto", "time_limit": 10}
+    )
+
+
+def test_memory_cache_lru_and_ttl(monkeypatch):
+
+    cache = MemoryCache(max_entries=2, ttl=10.)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    # "b" is the least recently used
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    assert (cache.hits, cache.misses) == (3, 1)
+
+    now = time.monotonic()
+    monkeypatch.setattr("core.planner.plan_cache.time.monotonic", lambda: now + 11.)
+    assert cache.get("a") is None and len(cache) == 1
+
+
+def test_redis_cache(redis_server):
+
+    cache = plan_cache_from_url(f"redis://127.0.0.1:{redis_server.server_address[1]}/0", ttl=0.2)
+    assert isinstance(cache, RedisCache)
+
+    plans = (np.ones((3, 4)), np.arange(12.).reshape(3, 4), {"status": "optimal"})
+    cache.set("key", plans)
+    cached = cache.get("key")
+    np.testing.assert_array_equal(cached[1], plans[1])
+    assert cached[2] == plans[2]
+    assert cache.command("PING") == "PONG"
+
+    time.sleep(0.3)
+    assert cache.get("key") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_redis_cache_invalid_entry(redis_server):
+
+    cache = RedisCache(port=redis_server.server_address[1])
+    redis_server.store[b"smartcharging:key"] = (float("inf"), b"not a pickle")
+
+    # A corrupt entry (or one written by another version) is a miss
+    assert cache.get("key") is None and cache.misses == 1
+
+
+def test_redis_cache_unavailable(redis_server):
+
+    cache = RedisCache(port=redis_server.server_address[1], timeout=0.2)
+    redis_server.shutdown()
+    redis_server.server_close()
+
+    # The planning does not fail because of the cache
+    cache.set("key", 1)
+    assert cache.get("key") is None
+
+
+def test_cached_charging_plans(demand, redis_server):
+
+    for cache in (MemoryCache(), RedisCache(port=redis_server.server_address[1])):
+        kwargs = {"horizon_length": 48, "time_step": 900, "nbr_vehicle": 3, "capacity_grid": 25., "formulation": "lp"}
+        _, power_profile, _ = cached_charging_plans(cache, demand, **kwargs)
+
+        start = time.perf_counter()
+        _, cached_power_profile, _ = cached_charging_plans(cache, demand, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        np.testing.assert_array_equal(cached_power_profile, power_profile)
+        assert cache.hits == 1 and elapsed < 0.05
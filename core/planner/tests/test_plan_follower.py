@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from core.planner.plan_follower import PlanFollower
+from core.planner.problem_cache import problem_cache
+
+
+def run_plan_follower(planning_inputs, **kwargs) -> tuple[PlanFollower, np.ndarray]:
+
+    follower = PlanFollower(
+        nbr_terminals=planning_inputs["nbr_vehicle"], horizon_length=16, p_max_infra=planning_inputs["p_max_infra"],
+        time_step=planning_inputs["time_step"], **kwargs
+    )
+    for _ in range(planning_inputs["horizon_length"]):
+        for v in np.flatnonzero(np.array(planning_inputs["arrival_idx"]) == follower.current_step):
+            follower.connect(
+                terminal=v, departure_idx=planning_inputs["departure_idx"][v],
+                power_nom=planning_inputs["power_nom"][v],
+                required_energy=planning_inputs["required_energy"][v], capacity_nom=planning_inputs["capacity_nom"][v],
+                soe=planning_inputs["soe_init"][v]
+            )
+        follower.step()
+
+    return follower, np.array(follower.applied)
+
+
+def test_plan_follower_feasible(planning_inputs):
+
+    problem_cache.clear()
+    follower, applied = run_plan_follower(planning_inputs)
+    time_idx = np.arange(planning_inputs["horizon_length"])[:, None]
+    mask_parked = (time_idx >= np.array(planning_inputs["arrival_idx"])) & (
+        time_idx < np.array(planning_inputs["departure_idx"])
+    )
+    factor = 0.9 * planning_inputs["time_step"] / 3600
+
+    assert applied.shape == (planning_inputs["horizon_length"], planning_inputs["nbr_vehicle"])
+    assert (applied[~mask_parked] == 0).all(), "Vehicle charged outside its parking window"
+    assert (applied <= np.array(planning_inputs["power_nom"])[None, :] + 1e-6).all()
+    assert (applied.sum(axis=1) <= planning_inputs["p_max_infra"] + 1e-6).all()
+    assert (factor * applied.sum(axis=0) <= np.array(planning_inputs["required_energy"]) + 1e-4).all()
+    assert not follower.connected.any()
+
+    # The compiled problem is built once and reused at every step
+    assert problem_cache.misses == 1
+    assert problem_cache.hits == sum(h["status"] != "idle" for h in follower.history) - 1
+
+
+def test_plan_follower_meets_demand_without_congestion(planning_inputs):
+
+    planning_inputs = {**planning_inputs, "p_max_infra": 1000.}
+    follower, applied = run_plan_follower(planning_inputs)
+    factor = 0.9 * planning_inputs["time_step"] / 3600
+    energy_reachable = factor * np.array(planning_inputs["power_nom"]) * (
+        np.array(planning_inputs["departure_idx"]) - np.array(planning_inputs["arrival_idx"])
+    )
+
+    assert factor * applied.sum(axis=0) == pytest.approx(
+        np.minimum(planning_inputs["required_energy"], energy_reachable), rel=1e-3
+    )
+
+
+def test_plan_follower_measured_soe(planning_inputs):
+
+    follower = PlanFollower(nbr_terminals=1, horizon_length=8, p_max_infra=50.)
+    follower.connect(terminal=0, departure_idx=4, power_nom=11., required_energy=10., capacity_nom=50., soe=20.)
+    follower.step()
+    follower.measure_soe(terminal=0, soe=25.)
+
+    assert follower.required_energy[0] == pytest.approx(5.)
+    with pytest.raises(ValueError):
+        follower.connect(terminal=0, departure_idx=6, power_nom=7., required_energy=5., capacity_nom=50., soe=0.)
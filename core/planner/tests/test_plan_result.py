@@ -0,0 +1,52 @@
+import pickle
+import cvxpy as cp
+import numpy as np
+import pytest
+from core.planner.day_ahead_planner import plan_vehicles
+from core.planner.optimization import evcsp_lp, evcsp_objective, evcsp_parameter_values
+from core.planner.plan_result import PlanResult
+
+
+def test_evcsp_lp_returns_plan_result(planning_inputs):
+
+    _, power_profile, result = evcsp_lp(**planning_inputs)
+
+    assert isinstance(result, PlanResult)
+    assert not hasattr(result, "__dict__")
+    assert not any(isinstance(getattr(result, name), cp.Problem) for name in PlanResult.__slots__)
+    assert result.status == cp.OPTIMAL
+    np.testing.assert_array_equal(result.power, power_profile)
+    assert result.soe.shape == power_profile.shape
+    assert sum(result.objective_terms.values()) == pytest.approx(result.objective, rel=1e-5)
+    assert result.variables > 0 and result.constraints > 0
+
+
+def test_plan_result_pickle_and_dtype(planning_inputs):
+
+    _, power_profile, result = evcsp_lp(**planning_inputs, solver_options={"result_dtype": np.float32})
+    restored = pickle.loads(pickle.dumps(result))
+
+    assert result.power.dtype == np.float32 and result.soe.dtype == np.float32
+    np.testing.assert_allclose(result.power, power_profile, rtol=1e-6)
+    np.testing.assert_array_equal(restored.power, result.power)
+    assert restored.summary() == result.summary()
+
+
+def test_presolved_plan_result_covers_all_vehicles(planning_inputs):
+
+    inputs = {
+        **planning_inputs, "nbr_vehicle": 6,
+        **{k: 2 * planning_inputs[k] for k in (
+            "arrival_idx", "departure_idx", "power_nom", "required_energy", "capacity_nom", "soe_init"
+        )},
+    }
+    _, power_profile, result = plan_vehicles(formulation="lp", presolve=True, **inputs)
+    values = evcsp_parameter_values(**{k: v for k, v in inputs.items() if k != "nbr_vehicle"})
+
+    assert result.power.shape == result.soe.shape == (inputs["horizon_length"], 6)
+    np.testing.assert_allclose(result.power, power_profile)
+    # SOE dynamics of each vehicle from its initial SOE (the last time step is not constrained by the dynamics)
+    delivered = values["Charging Factor"] * (np.cumsum(power_profile, axis=0) - power_profile)
+    np.testing.assert_allclose(result.soe[:-1], np.array(inputs["soe_init"]) + delivered[:-1], atol=1e-4)
+    assert result.objective == pytest.approx(evcsp_objective(power_profile, values), rel=1e-4)
+    assert sum(result.objective_terms.values()) == pytest.approx(result.objective, rel=1e-4)
@@ -0,0 +1,55 @@
+import json
+import cvxpy as cp
+import numpy as np
+import pytest
+from core.planner.day_ahead_planner import demand_inputs, plan_vehicles
+from core.planner.optimization import evcsp_lp
+from core.planner.portfolio import accept_report, evcsp_race, race_history
+from core.utility.data.data_processor import generate_demand_data, prepare_planning_data
+
+
+def test_accept_report():
+
+    assert accept_report({"status": cp.OPTIMAL, "gap": 0.}, tolerance=1e-4)
+    assert accept_report({"status": cp.OPTIMAL, "gap": None}, tolerance=1e-4)
+    assert not accept_report({"status": cp.OPTIMAL, "gap": 1e-2}, tolerance=1e-4)
+    assert not accept_report({"status": cp.USER_LIMIT, "gap": 0.}, tolerance=1e-4)
+
+
+@pytest.mark.parametrize("formulation", ["lp", "milp"])
+def test_race(planning_inputs, formulation, tmp_path):
+
+    race_log = tmp_path / "race.jsonl"
+    activation_profile, power_profile, result = plan_vehicles(
+        formulation=formulation, **planning_inputs,
+        solver_options={"solver": "race", "time_limit": 60., "race_log": str(race_log)}
+    )
+    _, _, prob = evcsp_lp(**planning_inputs, solver_options={"solver": cp.HIGHS})
+
+    assert result["status"] == cp.OPTIMAL
+    assert result["winner"] in result["timings"]
+    assert result["timings"][result["winner"]] is not None
+    assert result["objective"] == pytest.approx(prob.objective, rel=1e-4)
+    assert power_profile.shape == (48, 3)
+    assert race_history[-1] is result
+    assert json.loads(race_log.read_text().splitlines()[-1])["winner"] == result["winner"]
+
+
+def test_lp_race_large_fleet():
+
+    # At 250 vehicles, the constraint matrix of the LP densified by the QP path of CVXPY for HiGHS takes 13 GiB
+    np.random.seed(0)
+    demand = prepare_planning_data(generate_demand_data(nbr_vehicles=250, horizon_length=96, time_step=900), 900)
+    _, power_profile, result = evcsp_race(
+        formulation="lp", nbr_vehicle=250, p_max_infra=1250., horizon_length=96, time_step=900,
+        **demand_inputs(demand), solver_options={"solver": "race", "time_limit": 60.}
+    )
+
+    assert cp.HIGHS not in result["timings"]
+    assert result["status"] == cp.OPTIMAL and power_profile.shape == (96, 250)
+
+
+def test_race_invalid_formulation(planning_inputs):
+
+    with pytest.raises(ValueError):
+        evcsp_race(formulation="heuristic", **planning_inputs)
@@ -0,0 +1,100 @@
+from typing import Dict
+import cvxpy as cp
+import numpy as np
+import pytest
+from core.planner.day_ahead_planner import plan_vehicles
+from core.planner.decomposition import result_summary
+from core.planner.optimization import evcsp_objective, evcsp_parameter_values
+from core.planner.plan_result import PlanResult
+from core.planner.presolve import evcsp_presolved, postsolve, presolve
+
+
+@pytest.fixture
+def duplicated_inputs() -> Dict:
+
+    # Vehicles 0, 1, 2 are identical, vehicle 3 needs no energy, vehicle 4 has an empty window, vehicle 5 is alone
+    # at the station (fully charged at nominal power), vehicles 6, 7 compete with the cohort
+    return {
+        "nbr_vehicle": 8,
+        "arrival_idx": [10, 10, 10, 12, 20, 40, 11, 14],
+        "departure_idx": [20, 20, 20, 30, 20, 46, 18, 25],
+        "power_nom": [7, 7, 7, 11, 22, 22, 11, 22],
+        "required_energy": [12., 12., 12., 0., 10., 20., 15., 30.],
+        "capacity_nom": [52., 52., 52., 60., 60., 60., 60., 88.],
+        "soe_init": [10., 10., 10., 5., 5., 5., 5., 20.],
+        "p_max_infra": 30.,
+        "horizon_length": 48,
+        "time_step": 900,
+    }
+
+
+def full_objective(power_profile: np.ndarray, inputs: Dict) -> float:
+
+    values = evcsp_parameter_values(**{k: v for k, v in inputs.items() if k != "nbr_vehicle"})
+    return evcsp_objective(power_profile, values)
+
+
+def test_presolve_reduction(duplicated_inputs):
+
+    reduced_inputs, presolve_info = presolve(**duplicated_inputs)
+
+    stats = presolve_info["stats"]
+    assert (stats["vehicles"], stats["fixed_zero"], stats["fixed_asap"], stats["cohorts"]) == (8, 2, 1, 3)
+    assert reduced_inputs["nbr_vehicle"] == 3
+    assert sorted(presolve_info["cohort_size"]) == [1, 1, 3]
+    assert presolve_info["fixed_plan"][:, [3, 4]].sum() == 0
+    assert presolve_info["fixed_plan"][:, 5].sum() * 0.9 * 0.25 == pytest.approx(20.)
+
+    _, power_profile = postsolve(np.zeros((48, 3)), presolve_info)
+    np.testing.assert_allclose(power_profile, presolve_info["fixed_plan"])
+
+
+@pytest.mark.parametrize("formulation, backend", [("lp", "cvxpy"), ("milp", "cvxpy"), ("lp", "highs")])
+def test_presolve_optimal(duplicated_inputs, formulation, backend):
+
+    solver_options = {"solver": cp.HIGHS}
+    _, power_full, _ = plan_vehicles(
+        formulation=formulation, backend=backend, **duplicated_inputs, solver_options=solver_options
+    )
+    activation_profile, power_profile, result = plan_vehicles(
+        formulation=formulation, backend=backend, presolve=True, **duplicated_inputs, solver_options=solver_options
+    )
+
+    assert power_profile.shape == (48, 8)
+    assert (power_profile.sum(axis=1) <= duplicated_inputs["p_max_infra"] + 1e-6).all()
+    assert full_objective(power_profile, duplicated_inputs) == pytest.approx(
+        full_objective(power_full, duplicated_inputs), rel=1e-4
+    )
+    np.testing.assert_allclose(power_profile[:, 0], power_profile[:, 1])
+    if formulation == "lp":
+        assert result_summary(result)["objective"] == pytest.approx(
+            full_objective(power_profile, duplicated_inputs), rel=1e-4
+        )
+    presolve_stats = result.presolve if isinstance(result, PlanResult) else result["presolve"]
+    assert presolve_stats["cohorts"] == 3
+
+
+def test_presolve_all_fixed(planning_inputs):
+
+    planning_inputs["p_max_infra"] = 100.
+    activation_profile, power_profile, result = evcsp_presolved(plan_vehicles, **planning_inputs)
+
+    assert isinstance(result, PlanResult) and result.presolve["cohorts"] == 0
+    assert result.status == cp.OPTIMAL
+    assert result.objective == pytest.approx(full_objective(power_profile, planning_inputs))
+    assert sum(result.objective_terms.values()) == pytest.approx(result.objective)
+    np.testing.assert_array_equal(result.power, power_profile)
+    assert result.soe.shape == power_profile.shape
+    # Vehicle 0 cannot be fully charged in its window: charged at nominal power during the whole window
+    energy = power_profile.sum(axis=0) * 0.9 * 0.25
+    np.testing.assert_allclose(energy, [7 * 10 * 0.9 * 0.25, 8.72, 30.])
+
+
+def test_presolve_warm_start(duplicated_inputs):
+
+    initial_power = np.ones((48, 8))
+    reduced_inputs, presolve_info = presolve(**duplicated_inputs, solver_options={"initial_power": initial_power})
+
+    cohort_initial_power = reduced_inputs["solver_options"]["initial_power"]
+    assert cohort_initial_power.shape == (48, 3)
+    np.testing.assert_allclose(np.sort(cohort_initial_power[0]), [1., 1., 3.])
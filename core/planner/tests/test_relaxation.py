@@ -0,0 +1,36 @@
+import cvxpy as cp
+import numpy as np
+import pytest
+from core.planner.optimization import evcsp_milp, evcsp_parameter_values
+from core.planner.relaxation import evcsp_milp_relaxed, round_activation
+
+
+@pytest.mark.parametrize("polish", [False, True])
+def test_evcsp_milp_relaxed_matches_milp(planning_inputs, polish):
+
+    activation_profile, power_profile, result = evcsp_milp_relaxed(
+        **planning_inputs, solver_options={"solver": cp.CLARABEL, "polish": polish}
+    )
+    _, _, prob = evcsp_milp(**planning_inputs, solver_options={"solver": cp.HIGHS})
+
+    assert result["status"] == cp.OPTIMAL
+    assert (power_profile <= np.array(planning_inputs["power_nom"])[None, :] * activation_profile + 1e-9).all()
+    assert (power_profile.sum(axis=1) <= planning_inputs["p_max_infra"] + 1e-9).all()
+    assert result["objective"] == pytest.approx(prob.objective, rel=1e-5)
+    assert 0. <= result["gap"] <= 1e-5
+    assert (result["polished_cells"] > 0) == polish
+
+
+def test_round_activation(planning_inputs):
+
+    parameter_values = evcsp_parameter_values(
+        **{k: v for k, v in planning_inputs.items() if k != "nbr_vehicle"}
+    )
+    power_relaxed = parameter_values["Power Max"] * 0.9
+    power_relaxed[15, 2] = 1e-6     # residual power of an interior point solver
+
+    activation_profile, power_profile = round_activation(power_relaxed, parameter_values, threshold=1e-3)
+
+    assert not activation_profile[15, 2] and power_profile[15, 2] == 0.
+    assert (activation_profile == (power_profile > 0)).all()
+    assert (power_profile.sum(axis=1) <= planning_inputs["p_max_infra"] + 1e-9).all()
@@ -0,0 +1,42 @@
+import cvxpy as cp
+import numpy as np
+import pytest
+from core.planner.optimization import evcsp_lp, evcsp_milp, evcsp_parameter_values
+from core.planner.scaling import condition_diagnostics, exact_violation_price, problem_scales, \
+    scale_parameter_values
+
+
+@pytest.mark.parametrize("planner, solver", [(evcsp_lp, cp.CLARABEL), (evcsp_milp, cp.HIGHS)])
+def test_scaled_solution_matches_unscaled(planning_inputs, planner, solver):
+
+    _, power_unscaled, unscaled = planner(**planning_inputs, solver_options={"solver": solver, "scaling": None})
+    _, power_scaled, scaled = planner(**planning_inputs, solver_options={"solver": solver, "scaling": "auto"})
+
+    assert scaled.status == unscaled.status == cp.OPTIMAL
+    assert scaled.objective == pytest.approx(unscaled.objective, rel=1e-6)
+    np.testing.assert_allclose(power_scaled.sum(axis=0), power_unscaled.sum(axis=0), atol=1e-4)
+    assert "scaling" in scaled.solve_report and "scaling" not in unscaled.solve_report
+
+
+def test_scaling_reduces_objective_range(planning_inputs):
+
+    values = evcsp_parameter_values(**{k: v for k, v in planning_inputs.items() if k != "nbr_vehicle"})
+    scales = problem_scales(values)
+    scaled_values = scale_parameter_values(values, scales)
+
+    # Powers of 2: scaling and unscaling are exact
+    assert all(np.log2(scale) == np.round(np.log2(scale)) for scale in scales.values())
+    assert scaled_values["Violation Price"] * scales["objective"] / scales["power"] == exact_violation_price(values)
+    assert condition_diagnostics(scaled_values)["objective"]["orders"] \
+        < condition_diagnostics(values)["objective"]["orders"] - 2
+
+
+def test_violation_price_kept_for_negative_limit(planning_inputs):
+
+    values = evcsp_parameter_values(**{k: v for k, v in planning_inputs.items() if k != "nbr_vehicle"})
+    values["Peak Power Capacity"][0] = -1.
+    scales = problem_scales(values)
+
+    scaled_values = scale_parameter_values(values, scales)
+
+    assert scaled_values["Violation Price"] == values["Violation Price"] * scales["power"] / scales["objective"]
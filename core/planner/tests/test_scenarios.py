@@ -0,0 +1,59 @@
+from functools import partial
+import cvxpy as cp
+import numpy as np
+import pandas as pd
+import pytest
+from core.planner.day_ahead_planner import create_charging_plans, plan_vehicles
+from core.planner.decomposition import result_summary
+from core.planner.scenarios import perturb_demand, solve_scenarios
+
+
+def test_perturb_demand(demand):
+
+    scenarios = perturb_demand(demand, n_scenarios=20, horizon_length=48, seed=0)
+
+    assert len(scenarios) == 20
+    pd.testing.assert_frame_equal(scenarios[0], demand)
+    for scenario in scenarios:
+        assert (scenario["arrivalTime"] >= 0).all()
+        assert (scenario["departureTime"] > scenario["arrivalTime"]).all()
+        assert (scenario["departureTime"] <= 48).all()
+        assert (scenario["energyRequired"] >= 0).all()
+    assert any(not scenario.equals(demand) for scenario in scenarios[1:])
+
+    # Same seed, same scenarios
+    again = perturb_demand(demand, n_scenarios=20, horizon_length=48, seed=0)
+    assert all(a.equals(b) for a, b in zip(scenarios, again))
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_create_charging_plans_scenarios(demand, n_jobs):
+
+    solver_options = {"solver": cp.CLARABEL, "verbose": False, "warm_start": False}
+    activation_profiles, power_profiles, result = create_charging_plans(
+        demand, horizon_length=48, time_step=900, nbr_vehicle=3, capacity_grid=25., n_sols=4, formulation="lp",
+        solver_options=solver_options, n_jobs=n_jobs, perturbation={"seed": 1}
+    )
+
+    assert power_profiles.shape == activation_profiles.shape == (4, 48, 3)
+    assert result["status"] == "optimal"
+    assert len(result["scenarios"]) == 4
+
+    # The first scenario is the nominal demand
+    _, power_profile, prob = create_charging_plans(
+        demand, horizon_length=48, time_step=900, nbr_vehicle=3, capacity_grid=25., n_sols=1, formulation="lp",
+        solver_options=solver_options
+    )
+    assert power_profile.shape == (48, 3)
+    assert result["objective"][0] == pytest.approx(result_summary(prob)["objective"], rel=1e-4)
+
+
+def test_solve_scenarios_shape_mismatch(planning_inputs):
+
+    solve = partial(plan_vehicles, formulation="heuristic")
+    with pytest.raises(ValueError):
+        solve_scenarios(solve, [planning_inputs, {**planning_inputs, "horizon_length": 96}])
+
+    activation_profiles, power_profiles, result = solve_scenarios(solve, [planning_inputs] * 3)
+    assert power_profiles.shape == (3, 48, 3)
+    assert np.allclose(power_profiles[0], power_profiles[2])
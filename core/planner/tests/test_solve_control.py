@@ -0,0 +1,98 @@
+import cvxpy as cp
+import numpy as np
+import pytest
+from core.planner.optimization import evcsp_lp, evcsp_milp, evcsp_parameter_values, feasible_power_profile, \
+    power_violation
+from core.planner.solve_control import solver_kwargs
+
+
+def test_solver_kwargs_translation():
+
+    options = {"time_limit": 30., "mip_gap": 1e-3, "threads": 2, "verbose": False, "warm_start": True}
+
+    assert solver_kwargs({"solver": cp.HIGHS, **options}) == {
+        "solver": cp.HIGHS, "verbose": False, "warm_start": True, "time_limit": 30., "mip_rel_gap": 1e-3,
+        "threads": 2
+    }
+    assert solver_kwargs({"solver": cp.SCIPY, **options})["scipy_options"] == {
+        "method": "highs", "time_limit": 30., "mip_rel_gap": 1e-3
+    }
+    kwargs = solver_kwargs({"solver": cp.CLARABEL, **options, "max_iter": 50})
+    assert kwargs["time_limit"] == 30. and kwargs["max_threads"] == 2 and kwargs["max_iter"] == 50
+    assert "mip_gap" not in kwargs and "mip_rel_gap" not in kwargs
+
+
+@pytest.mark.parametrize("solver", [cp.CLARABEL, cp.HIGHS, cp.SCIPY])
+def test_evcsp_lp_solve_report(planning_inputs, solver):
+
+    _, power_profile, prob = evcsp_lp(
+        **planning_inputs, solver_options={"solver": solver, "time_limit": 60., "verbose": False}
+    )
+
+    assert prob.solve_report["status"] == cp.OPTIMAL
+    assert prob.solve_report["incumbent"]
+    assert prob.solve_report["gap"] == 0.
+    assert prob.solve_report["objective"] == pytest.approx(prob.objective)
+    assert prob.solve_report["elapsed"] >= 0.
+
+
+def test_evcsp_milp_gap_and_warm_start(planning_inputs):
+
+    solver_options = {"solver": cp.HIGHS, "time_limit": 60., "mip_gap": 1e-4, "threads": 1}
+    _, power_profile, prob = evcsp_milp(**planning_inputs, solver_options=solver_options)
+    assert prob.solve_report["status"] == cp.OPTIMAL
+    assert prob.solve_report["gap"] <= 1e-4
+
+    # Warm start from the previous plan
+    _, power_profile_warm, prob = evcsp_milp(
+        **planning_inputs, solver_options={**solver_options, "warm_start": True, "initial_power": power_profile}
+    )
+    assert prob.solve_report["status"] == cp.OPTIMAL
+    assert power_profile_warm.sum() == pytest.approx(power_profile.sum(), rel=1e-4)
+
+
+def test_feasible_power_profile(planning_inputs):
+
+    planning_inputs = {**planning_inputs, "p_max_infra": 15.}
+    parameter_values = evcsp_parameter_values(
+        **{k: v for k, v in planning_inputs.items() if k != "nbr_vehicle"}
+    )
+    power_profile = feasible_power_profile(np.full((48, 3), 30.), parameter_values)
+
+    assert (power_profile <= parameter_values["Power Max"] + 1e-9).all()
+    assert (power_profile.sum(axis=1) <= planning_inputs["p_max_infra"] + 1e-9).all()
+    overloaded = parameter_values["Power Max"].sum(axis=1) > planning_inputs["p_max_infra"]
+    assert overloaded.any()
+    assert power_profile.sum(axis=1)[overloaded] == pytest.approx(planning_inputs["p_max_infra"])
+
+
+def test_optimal_plan_not_repaired(planning_inputs, monkeypatch):
+
+    repaired = []
+    monkeypatch.setattr(
+        "core.planner.optimization.feasible_power_profile", lambda power, values: repaired.append(power) or power
+    )
+    _, power_profile, result = evcsp_lp(**planning_inputs, solver_options={"solver": cp.CLARABEL})
+
+    # The plan and its objective are the ones found by the solver
+    assert result.status == cp.OPTIMAL and not repaired
+    parameter_values = evcsp_parameter_values(**{k: v for k, v in planning_inputs.items() if k != "nbr_vehicle"})
+    assert power_violation(power_profile, parameter_values) <= 1e-6
+
+    # A plan above the bounds and the station limit (e.g. an incumbent at the time limit) is repaired
+    assert power_violation(np.full((48, 3), 30.), parameter_values) > 1e-6
+    assert power_violation(feasible_power_profile(np.full((48, 3), 30.), parameter_values), parameter_values) <= 1e-9
+
+
+@pytest.mark.parametrize("error", [MemoryError("Unable to allocate 13.1 GiB"), cp.error.DPPError("not DPP")])
+def test_canonicalization_error_report(planning_inputs, monkeypatch, error):
+
+    def failing_solve(prob, **kwargs):
+        raise error
+
+    monkeypatch.setattr(cp.Problem, "solve", failing_solve)
+    activation_profile, power_profile, result = evcsp_lp(**planning_inputs, solver_options={"solver": cp.HIGHS})
+
+    # Reported as a solver error, with an empty plan
+    assert result.status == cp.SOLVER_ERROR and not result.solve_report["incumbent"]
+    assert result.objective is None and not power_profile.any() and not activation_profile.any()
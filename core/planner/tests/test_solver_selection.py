@@ -0,0 +1,88 @@
+import cvxpy as cp
+import numpy as np
+import pytest
+from core.planner.day_ahead_planner import create_charging_plans
+from core.planner.solver_selection import fit_cost_model, instance_features, predict_solve_time, resolve_auto, \
+    select_candidate, split_blocks
+
+
+def test_instance_features():
+
+    features = instance_features(nbr_vehicle=2, arrival_idx=[0, 10], departure_idx=[4, 50], horizon_length=48)
+
+    assert features["log_cells"] == pytest.approx(np.log(42))
+    assert features["density"] == pytest.approx(42 / 96)
+
+
+def test_fit_cost_model_and_select():
+
+    # Synthetic runs: "cvxpy_clarabel_lp" is faster on small instances, "highs_lp" on large ones
+    records = []
+    for nbr_vehicle in [10, 30, 100, 300, 1000]:
+        for horizon_length in [48, 96]:
+            features = instance_features(nbr_vehicle, [0] * nbr_vehicle, [horizon_length // 4] * nbr_vehicle,
+                                         horizon_length)
+            records.append({"candidate": "cvxpy_clarabel_lp", "features": features, "solve_time": 1e-4 * nbr_vehicle})
+            records.append({"candidate": "highs_lp", "features": features, "solve_time": 1e-3 * nbr_vehicle ** 0.5})
+    model = fit_cost_model(records)
+
+    small = instance_features(20, [0] * 20, [24] * 20, 96)
+    large = instance_features(2000, [0] * 2000, [24] * 2000, 96)
+    assert select_candidate(small, binaries=False, model=model) == "cvxpy_clarabel_lp"
+    assert select_candidate(large, binaries=False, model=model) == "highs_lp"
+    assert select_candidate(large, binaries=False, cvxpy_only=True, model=model) == "cvxpy_clarabel_lp"
+
+
+def test_decomposition_only_for_independent_blocks():
+
+    # Synthetic runs: the decomposition is the fastest, and its time decreases with the horizon
+    records = []
+    for nbr_vehicle in [10, 100]:
+        for horizon_length in [48, 96]:
+            arrival_idx, departure_idx = split_blocks([0] * nbr_vehicle, [horizon_length] * nbr_vehicle,
+                                                      horizon_length, n_blocks=4)
+            features = instance_features(nbr_vehicle, arrival_idx, departure_idx, horizon_length)
+            records.append({"candidate": "highs_lp", "features": features, "solve_time": 1e-3 * nbr_vehicle})
+            records.append({"candidate": "decomposition_lp", "features": features,
+                            "solve_time": 1e-4 * nbr_vehicle * 48 / horizon_length})
+    model = fit_cost_model(records)
+
+    one_block = instance_features(100, [0] * 100, [96] * 100, 96)
+    four_blocks = instance_features(100, *split_blocks([0] * 100, [96] * 100, 96, n_blocks=4), 96)
+    assert one_block["blocks"] == 1 and four_blocks["blocks"] == 4
+    assert select_candidate(one_block, binaries=False, model=model) == "highs_lp"
+    assert select_candidate(four_blocks, binaries=False, model=model) == "decomposition_lp"
+
+    # Predictions are not extrapolated beyond the fitted range (here, the fitted time decreases with the horizon)
+    long_horizon = instance_features(100, *split_blocks([0] * 100, [288] * 100, 288, n_blocks=4), 288)
+    assert predict_solve_time(model, "decomposition_lp", long_horizon) == pytest.approx(
+        predict_solve_time(model, "decomposition_lp", {**long_horizon, "log_horizon": np.log(96)})
+    )
+
+
+def test_resolve_auto():
+
+    features = instance_features(20, [0] * 20, [24] * 20, 96)
+    formulation, backend, solver_options, n_jobs = resolve_auto(
+        "milp", "cvxpy", {"solver": "auto", "time_limit": 10.}, features
+    )
+
+    assert formulation == "milp" and backend == "cvxpy"
+    assert solver_options["solver"] in (cp.HIGHS, cp.SCIPY) and solver_options["time_limit"] == 10.
+    with pytest.raises(ValueError):
+        resolve_auto("flow", "auto", {}, features)
+
+
+@pytest.mark.parametrize("formulation", ["lp", "milp"])
+def test_create_charging_plans_auto(demand, formulation):
+
+    _, power_profile, _ = create_charging_plans(
+        demand, horizon_length=48, time_step=900, nbr_vehicle=3, capacity_grid=25., formulation=formulation,
+        backend="auto"
+    )
+    _, power_profile_lp, _ = create_charging_plans(
+        demand, horizon_length=48, time_step=900, nbr_vehicle=3, capacity_grid=25., formulation="lp",
+        backend="highs"
+    )
+
+    assert power_profile.sum() == pytest.approx(power_profile_lp.sum(), rel=1e-4)
@@ -0,0 +1,49 @@
+import cvxpy as cp
+import numpy as np
+import pytest
+from core.planner.optimization import evcsp_lp, evcsp_milp
+from core.planner.sparse_backend import evcsp_sparse, evcsp_matrices
+
+
+def test_evcsp_matrices_shapes(planning_inputs):
+
+    matrices = evcsp_matrices(**planning_inputs, integral=True)
+    n_tv = planning_inputs["horizon_length"] * planning_inputs["nbr_vehicle"]
+
+    assert matrices["A_eq"].shape[1] == len(matrices["c"]) == 3 * n_tv + 2 * planning_inputs["nbr_vehicle"]
+    assert matrices["integrality"].sum() == n_tv
+    assert matrices["sizes"]["peak_over"] == 0, "MILP has a hard station power limit"
+
+
+@pytest.mark.parametrize("layout", ["dense", "window"])
+@pytest.mark.parametrize("integral", [False, True])
+def test_evcsp_sparse_matches_cvxpy(planning_inputs, integral, layout):
+
+    if integral:
+        solver_options = {"solver": cp.SCIPY, "time_limit": 60.0, "verbose": False, "warm_start": False}
+        _, power_cvxpy, prob = evcsp_milp(**planning_inputs, solver_options=solver_options)
+    else:
+        solver_options = {"solver": cp.CLARABEL, "time_limit": 60.0, "verbose": False, "warm_start": False}
+        _, power_cvxpy, prob = evcsp_lp(**planning_inputs, solver_options=solver_options)
+
+    activation_profile, power_profile, result = evcsp_sparse(
+        **planning_inputs, solver_options=solver_options, integral=integral, layout=layout
+    )
+
+    assert result.success
+    assert result.fun == pytest.approx(prob.objective, rel=1e-6)
+    assert power_profile.shape == power_cvxpy.shape
+    assert power_profile.sum() == pytest.approx(power_cvxpy.sum(), rel=1e-6)
+    assert (power_profile[~activation_profile] == 0).all()
+    assert (power_profile <= np.array(planning_inputs["power_nom"])[None, :] + 1e-6).all()
+
+
+def test_evcsp_matrices_window_layout_is_smaller(planning_inputs):
+
+    dense = evcsp_matrices(**planning_inputs, integral=True, layout="dense")
+    window = evcsp_matrices(**planning_inputs, integral=True, layout="window")
+    n_parked = sum(d - a for a, d in zip(planning_inputs["arrival_idx"], planning_inputs["departure_idx"]))
+
+    assert window["sizes"]["power"] == window["sizes"]["activation"] == n_parked
+    assert len(window["c"]) < len(dense["c"]) / 3
+    assert window["A_eq"].shape[0] + window["A_ub"].shape[0] < (dense["A_eq"].shape[0] + dense["A_ub"].shape[0]) / 3
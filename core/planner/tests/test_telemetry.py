@@ -0,0 +1,69 @@
+import cvxpy as cp
+import pytest
+from core.planner.day_ahead_planner import plan_vehicles
+from core.planner.telemetry import PHASES, PhaseTimer, RingBufferSink, add_sink, remove_sink
+
+
+@pytest.fixture
+def ring_buffer():
+
+    sink = add_sink(RingBufferSink(maxlen=10))
+    yield sink
+    remove_sink(sink)
+
+
+def test_phase_timer():
+
+    timer = PhaseTimer()
+    with timer.phase("build"):
+        pass
+    timer.add("build", 1.)
+    timer.add("solve", 2.)
+
+    assert timer.phases["build"] >= 1.
+    assert timer.phases["solve"] == 2.
+
+
+@pytest.mark.parametrize("formulation, backend", [("lp", "cvxpy"), ("milp", "cvxpy"), ("lp", "highs")])
+def test_planning_telemetry(planning_inputs, ring_buffer, formulation, backend):
+
+    plan_vehicles(formulation=formulation, backend=backend, **planning_inputs, solver_options={"solver": cp.HIGHS})
+    record = ring_buffer.records[-1]
+
+    assert (record["formulation"], record["backend"]) == (formulation, backend)
+    assert record["nbr_vehicle"] == 3 and record["horizon_length"] == 48
+    assert record["variables"] > 0 and record["constraints"] > 0
+    assert record["objective"] is not None
+    phases = PHASES if backend == "cvxpy" else ("build", "solve", "extraction")
+    assert set(phases) <= set(record["phases"])
+    assert sum(record["phases"].values()) <= record["total"] + 1e-6
+
+
+def test_failing_sink(planning_inputs, ring_buffer):
+
+    def failing_sink(record):
+        raise RuntimeError("sink down")
+
+    add_sink(failing_sink)
+    try:
+        activation_profile, power_profile, _ = plan_vehicles(formulation="lp", **planning_inputs)
+    finally:
+        remove_sink(failing_sink)
+
+    assert power_profile.shape == (48, 3)
+    assert len(ring_buffer.records) == 1
+
+
+def test_prometheus_sink():
+
+    prometheus_client = pytest.importorskip("prometheus_client")
+    from core.planner.telemetry import PrometheusSink
+
+    registry = prometheus_client.CollectorRegistry()
+    sink = PrometheusSink(registry=registry)
+    sink({"formulation": "lp", "backend": "highs", "phases": {"solve": 0.5}, "total": 0.6, "status": "optimal",
+          "variables": 10})
+
+    labels = {"formulation": "lp", "backend": "highs"}
+    assert registry.get_sample_value("evcsp_phase_seconds_count", {**labels, "phase": "solve"}) == 1
+    assert registry.get_sample_value("evcsp_model_variables", labels) == 10
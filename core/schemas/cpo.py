@@ -1,4 +1,4 @@
-from typing import Dict, List, Optional
+from typing import Dict, List, Literal, Optional
 from pydantic import BaseModel
 
 
@@ -24,6 +24,24 @@ class PlanningParameters(BaseModel):
     pmax_infrastructure: float
 
 
+class PlanningJobRequest(BaseModel):
+    algorithm: Literal["milp", "lp"] = "milp"
+    depot: str = "default"
+    demand: DemandData
+    planning_params: PlanningParameters
+
+
+class PlanningJob(BaseModel):
+    job_id: str
+    depot: str
+    status: Literal["queued", "running", "done", "failed", "cancelled"]
+    created: float
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    error: Optional[str] = None
+    result: Optional[ChargingPlanData] = None
+
+
 class Station(BaseModel):
     nbr_terminals: int
     transformer_capacity: float
@@ -88,7 +88,7 @@ def prepare_planning_data(
     else:
         converted_time = indexing_arrival_departure_time(
             data_mobility_idx[[arrival_column, departure_column]],
-            horizon_start=horizon_start
+            time_step=time_step, horizon_start=horizon_start
         )
         data_mobility_idx[fields2convert] = converted_time
 
@@ -1,7 +1,7 @@
 from typing import Dict
 import numpy as np
 import pandas as pd
-import cvxpy as cp
+from core.planner.plan_result import PlanResult
 
 _SIGNIFICANT_NUMBER_ = 2
 
@@ -49,12 +49,12 @@ def compute_financial_kpi():
 def compute_other_optim_kpi(
         data_planning: pd.DataFrame,
         horizon_length: int,
-        evcsp: cp.Problem,
+        evcsp: PlanResult,
 ) -> pd.DataFrame:
 
     # Compute SOC (%) from SOE
     df_soc = pd.DataFrame(
-        100 * evcsp.var_dict["SOE"].value / np.tile(data_planning.energyMax.values, (horizon_length, 1))
+        100 * evcsp.soe / np.tile(data_planning.energyMax.values, (horizon_length, 1))
     ).round(1)
 
     return df_soc
\ No newline at end of file
@@ -2,11 +2,11 @@
 import numpy as np
 from dash import Dash, html, dash_table, dcc
 import pandas as pd
-import cvxpy as cp
 import plotly.express as px
 import dash_bootstrap_components as dbc
 
 from core.planner.day_ahead_planner import create_charging_plans
+from core.planner.solver_selection import DEFAULT_SOLVER_OPTIONS
 from core.utility.data.data_processor import generate_demand_data, prepare_planning_data
 import plotly.graph_objects as go
 
@@ -18,11 +18,9 @@ nVE = 40
 time_step = 900  # [Seconds]
 horizon_length = 96  # [Time Step]
 capacity = 200  # [kW] grid capacity
-n_sols = 250
+n_sols = 1
 capacity_grid = np.array([100] * horizon_length)
 capacity_grid[40:57] = 80
-solver_options_1 = {"solver": cp.CLARABEL, "time_limit": 60.0, "verbose": False, "warm_start": False}
-solver_options_2 = {"solver": cp.SCIPY, "time_limit": 60.0, "verbose": False, "warm_start": False}
 
 data_planning_raw = generate_demand_data(nbr_vehicles=nVE, horizon_length=horizon_length, time_step=time_step)
 data_planning = prepare_planning_data(data_demand=data_planning_raw, time_step=time_step)
@@ -33,7 +31,7 @@ data_planning_displayed = data_planning[["powerNom", "energyRequired", "energyMa
 _, powerProfiles, evcsp = create_charging_plans(
     data_planning, horizon_length=horizon_length, time_step=time_step,
     nbr_vehicle=nVE, capacity_grid=capacity_grid, n_sols=n_sols,
-    formulation="milp", solver_options=solver_options_2
+    formulation="milp", backend="auto", solver_options=DEFAULT_SOLVER_OPTIONS
 )
 
 kpi_station, kpi_per_ev = compute_energetic_kpi(